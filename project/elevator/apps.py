@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ElevatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'elevator'
+
+    def ready(self):
+        from . import database, registry
+        database.install()
+        registry.install()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import ingestion
+from .destinations import astore_call
+from .events import aelevator_state, afleet_changed, publisher
+from .models import ElevatorsModel
+from .responses import acached_response
+from .state import aget_elevator, aget_run_state, aset_run_state
+from .traffic import arecord_call
+
+# Async versions of the read heavy and ingestion APIs, served by the ASGI
+# application (project/asgi.py) with the async cache and the async ORM.
+# They answer exactly like the DRF actions of the same name in views.py, the
+# ingestion APIs run the same code (ingestion.py) off the event loop.
+
+KEEPALIVE_SECONDS = 15
+# Django 4.2 doesn't tell a streaming view that its client went away, streams
+# end after this long and EventSource clients reconnect by themselves
+STREAM_SECONDS = 300
+
+
+def api(*methods):
+    """
+    Marks an async view as csrf exempt (like the DRF views) and rejects the
+    other HTTP methods, the Django 4.2 decorators only wrap sync views
+    """
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                data = json.loads(request.body) if request.body else request.GET.dict()
+            except ValueError:
+                return JsonResponse({"detail": "JSON parse error"}, status=400)
+            return await view(request, data, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        wrapper.__name__ = view.__name__
+        return wrapper
+    return decorator
+
+
+# Logic for get all user request
+@api('GET')
+async def fetch_all_requests(request, data):
+    elevator_name = data.get('elevator_name')
+
+    async def build():
+        return {"success": True, "requests": await astore_call('members', elevator_name)}
+    return JsonResponse(await acached_response('fetch_all_requests', elevator_name, build))
+
+
+# Logic for get elevator direction
+@api('GET')
+async def get_elevator_direction(request, data):
+    direction = await aget_run_state(data.get('elevator_name'), 'direction')
+    return JsonResponse({"success": True, "direction": "stand_by" if direction is None else direction})
+
+
+def payload_response(payload):
+    return JsonResponse(payload, status=200 if payload["success"] else 400)
+
+
+# Logic for get current floor
+@api('GET')
+async def get_current_floor(request, data):
+    elevator_name = data.get('elevator_name')
+
+    async def build():
+        elevator = await aget_elevator(elevator_name)
+        if elevator is None:
+            return {"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}
+        return {"success": True, "current_floor": elevator.current_floor}
+    return payload_response(await acached_response('get_current_floor', elevator_name, build))
+
+
+# to check the status of the elevator under maintenance or not
+@api('GET')
+async def check_maintenance_status(request, data):
+    await arecord_call('Maintenance.check_maintenance_status', data)
+    elevator_name = data.get('elevator_name')
+
+    async def build():
+        elevator = await aget_elevator(elevator_name)
+        if elevator is None:
+            return {"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}
+
+        if elevator.maintenance is False:
+            status = "Elevator is working"
+        else:
+            await aset_run_state(elevator, direction='stand_by')
+            await afleet_changed()
+            status = "Elevator is under maintenance"
+        return {"success": True, "message": status}
+    return payload_response(await acached_response('check_maintenance_status', elevator_name, build))
+
+
+# Logic for save user request
+@api('POST')
+async def save_user_request(request, data):
+    await arecord_call('UserRequests.save_user_request', data, request.META)
+    response, status = await sync_to_async(ingestion.save_user_request)(request, data)
+    return JsonResponse(response, status=status)
+
+
+# Logic for save many user requests in one call
+@api('POST')
+async def save_user_requests(request, data):
+    await arecord_call('UserRequests.save_user_requests', data)
+    response, status = await sync_to_async(ingestion.save_user_requests)(request, data)
+    return JsonResponse(response, status=status)
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Logic for streaming the state of the elevators to the displays
+@api('GET')
+async def stream(request, data):
+    elevators = data.get('elevators') if isinstance(data, dict) else None
+    if isinstance(elevators, str):
+        elevators = [elevator_name for elevator_name in elevators.split(',') if elevator_name]
+
+    # subscribe before reading the snapshot so no change in between is lost
+    subscription = publisher.subscribe(elevators)
+    queryset = ElevatorsModel.objects.filter(elevator_name__in=elevators) if elevators else ElevatorsModel.objects.all()
+    snapshot = [await aelevator_state(elevator) async for elevator in queryset]
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_SECONDS
+        try:
+            yield "retry: 1000\n\n"
+            for state in snapshot:
+                yield server_sent_event('state', state)
+            while loop.time() < deadline:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), min(KEEPALIVE_SECONDS, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                for state in subscription.drain():
+                    yield server_sent_event('state', state)
+        finally:
+            publisher.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
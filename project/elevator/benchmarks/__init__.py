@@ -0,0 +1,168 @@
+"""
+Benchmarks for the elevator APIs, run them with ``python manage.py benchmark``.
+
+Every suite runs against a throw-away test database and an empty cache, so the
+numbers are reproducible and the real db.sqlite3 is never touched.
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from ..destinations import reset_destination_store
+from ..idempotency import reset_recent_keys
+from ..responses import reset_response_cache
+from ..scheduler import reset_schedulers
+from ..traffic import reset_traffic_log
+
+SUITES = {}
+ALLOCATION_SAMPLES = 20
+# the metrics compared against a baseline and whether a higher value is better
+GATED_METRICS = {
+    "ops_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "queries_per_call": False,
+    "alloc_peak_kb": False,
+}
+
+
+def register(name, on_disk=False):
+    """
+    Registers a suite, on_disk ones run against a test database in a file
+    (see isolated_database)
+    """
+    def decorator(suite):
+        suite.on_disk = on_disk
+        SUITES[name] = suite
+        return suite
+    return decorator
+
+
+@contextmanager
+def isolated_database(on_disk=False):
+    """
+    A throw-away test database and an empty cache. SQLite test databases live
+    in memory and lock whole tables between connections, on_disk puts it in a
+    file so suites with threads can write concurrently. Calls made on it are
+    never appended to the traffic log.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'elevator_benchmark.sqlite3') if on_disk else ''
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    cache.clear()
+    reset_schedulers()
+    reset_destination_store()
+    reset_recent_keys()
+    reset_response_cache()
+    reset_traffic_log()
+    try:
+        with override_settings(ELEVATOR_TRAFFIC_LOG=''):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        cache.clear()
+        reset_schedulers()
+        reset_destination_store()
+        reset_recent_keys()
+        reset_response_cache()
+
+
+class Client(APIClient):
+    """
+    Test client sending JSON bodies on every method, the GET actions of the
+    elevator APIs read their arguments from the body
+    """
+
+    def call(self, method, path, body):
+        response = self.generic(method, f'/api/{path}', json.dumps(body), content_type='application/json')
+        if response.status_code >= 500:
+            raise RuntimeError(f"{method} {path} failed with {response.status_code}")
+        return response
+
+
+def install_elevators(client, count, first_floor=0, last_floor=10, prefix='e'):
+    elevators = [{"elevator_name": f"{prefix}{index}", "current_floor": first_floor, "first_floor": first_floor,
+                  "last_floor": last_floor, "door": "CLOSE"} for index in range(count)]
+    client.call('POST', 'install/install_elevator/', elevators)
+    return [elevator['elevator_name'] for elevator in elevators]
+
+
+def summarize(durations, queries, ops_per_call=1, allocations=None):
+    total = sum(durations) or 1e-9
+    ordered = sorted(durations)
+    summary = {
+        "calls": len(durations),
+        "ops_per_sec": round(len(durations) * ops_per_call / total, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+        "queries_per_call": round(queries / len(durations), 2),
+    }
+    if allocations:
+        summary["alloc_peak_kb"] = round(statistics.median(allocations) / 1024, 1)
+    return summary
+
+
+def measure(operation, calls, ops_per_call=1):
+    """
+    Runs ``operation(*args)`` for every args in calls and returns the
+    throughput, latency percentiles, SQL queries per call and the peak memory
+    allocated by a call. Allocations are traced on the first quarter of the
+    calls (at most ALLOCATION_SAMPLES) only, those calls are left out of the
+    timings since tracing slows them down.
+    """
+    calls = list(calls)
+    traced = min(ALLOCATION_SAMPLES, len(calls) // 4)
+    durations, allocations = [], []
+    with CaptureQueriesContext(connection) as captured:
+        for index, args in enumerate(calls):
+            if index < traced:
+                tracemalloc.start()
+                start = tracemalloc.get_traced_memory()[0]
+                operation(*args)
+                allocations.append(tracemalloc.get_traced_memory()[1] - start)
+                tracemalloc.stop()
+                continue
+            start = time.perf_counter()
+            operation(*args)
+            durations.append(time.perf_counter() - start)
+    return summarize(durations, len(captured) * len(durations) / len(calls), ops_per_call, allocations)
+
+
+def regressions(baseline, results, threshold=0.2, path=()):
+    """
+    Walks the results next to the baseline and yields (path, metric, baseline,
+    result, change) for every gated metric which got worse by more than the
+    threshold (0.2 is 20%), suites or metrics missing on one side are skipped
+    """
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            yield from regressions(baseline[key], value, threshold, path + (key,))
+        elif key in GATED_METRICS and isinstance(value, (int, float)) and isinstance(baseline[key], (int, float)):
+            before = baseline[key]
+            if before == 0:
+                change = 0.0 if value == 0 else float('inf')
+            else:
+                change = (value - before) / before
+            if GATED_METRICS[key]:
+                change = -change
+            if change > threshold:
+                yield '.'.join(path), key, before, value, change
+
+
+from . import actions, async_views, concurrency, database, dispatch, engine, fleet, request_queries, responses, scaling, scheduling, serialization, traffic, user_requests  # noqa: E402,F401  registers the suites
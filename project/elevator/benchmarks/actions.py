@@ -0,0 +1,68 @@
+import itertools
+import random
+
+from . import Client, install_elevators, measure, register
+from ..destinations import get_destination_store
+
+
+@register('actions')
+def actions(size=200, elevators=10, floors=20, seed=0):
+    """
+    Latency, SQL queries and allocations per call of every InitializeElevators,
+    ElevatorFunctions, UserRequests, Maintenance and Door action
+    """
+    client = Client()
+    names = install_elevators(client, elevators, last_floor=floors)
+    rng = random.Random(seed)
+    cycle = list(itertools.islice(itertools.cycle(names), size))
+
+    def post(path):
+        return lambda body: client.call('POST', path, body)
+
+    def get(path):
+        return lambda body: client.call('GET', path, body)
+
+    results = {}
+    results['install_elevator'] = measure(post('install/install_elevator/'), [
+        ({"elevator_name": f"i{index}", "current_floor": 0, "first_floor": 0, "last_floor": floors, "door": "CLOSE"},)
+        for index in range(size)])
+    results['save_user_request'] = measure(post('userrequests/save_user_request/'),
+                                           [({"elevator_name": name, "floor": rng.randint(0, floors)},) for name in cycle])
+    results['fetch_all_requests'] = measure(get('userrequests/fetch_all_requests/'), [({"elevator_name": name},) for name in cycle])
+    results['get_elevator_direction'] = measure(get('userrequests/get_elevator_direction/'), [({"elevator_name": name},) for name in cycle])
+    results['next_destinations'] = measure(post('elevator/next_destinations/'), [({"elevator_name": name},) for name in cycle])
+    results['reach_next_destination'] = measure(post('elevator/reach_next_destination/'), [({"elevator_name": name},) for name in cycle])
+
+    store = get_destination_store()
+    reached = [({"elevator_name": name, "current_floor": floor},) for name in names for floor in store.members(name)]
+    if reached:
+        results['destination_reached'] = measure(post('elevator/destination_reached/'), reached)
+
+    results['get_current_floor'] = measure(get('elevator/get_current_floor/'), [({"elevator_name": name},) for name in cycle])
+    results['check_maintenance_status'] = measure(get('maintenance/check_maintenance_status/'), [({"elevator_name": name},) for name in cycle])
+    results['set_maintenance'] = measure(lambda body: client.call('PATCH', 'maintenance/set_maintenance/', body),
+                                         [({"elevator_name": name, "maintenance": False},) for name in cycle])
+    results['open_or_close_door'] = measure(lambda body: client.call('PATCH', 'door/open_or_close_door/', body),
+                                            [({"elevator_name": name, "door": rng.choice(("OPEN", "CLOSE"))},) for name in cycle])
+    return results
+
+
+@register('arrivals')
+def arrivals(size=200, fleets=(10, 100, 1000)):
+    """
+    destination_reached latency as the number of installed elevators grows,
+    an arrival only writes its own elevator so it should stay flat
+    """
+    client = Client()
+    installed = 0
+    results = {}
+    for fleet in fleets:
+        install_elevators(client, fleet - installed, last_floor=size, prefix=f'f{fleet}_')
+        installed = fleet
+        name = f'f{fleet}_0'
+        calls = list(range(1, size + 1))
+        client.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": name, "floor": floor} for floor in calls])
+        results[f'{fleet}_elevators'] = measure(
+            lambda floor: client.call('POST', 'elevator/destination_reached/', {"elevator_name": name, "current_floor": floor}),
+            [(floor,) for floor in calls])
+    return results
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from ..handlers import get_application
+from . import Client, install_elevators, measure, register, summarize
+
+READS = ('userrequests/get_elevator_direction/', 'elevator/get_current_floor/', 'userrequests/fetch_all_requests/')
+
+
+class QueryCounter:
+    """
+    Counts the SQL queries of the async views, the async ORM runs them on the
+    connections of its worker threads rather than the one of this thread
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+async def asgi_get(application, path, body):
+    """
+    Sends one GET request with a JSON body to the ASGI application the way a
+    server does, returns the status code
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+async def load(application, names, size, concurrency):
+    """
+    Sends size GET requests to the async views with concurrency requests in
+    flight, returns the latency of every request and the queries they made
+    """
+    counter = QueryCounter()
+    # the connection of the thread the async ORM already uses, and the ones it opens from now on
+    await sync_to_async(counter.install)()
+    connection_created.connect(counter.install)
+    durations = []
+    queue = asyncio.Queue()
+    for index in range(size):
+        queue.put_nowait((READS[index % len(READS)], names[index % len(names)]))
+
+    async def worker():
+        while not queue.empty():
+            path, name = queue.get_nowait()
+            start = time.perf_counter()
+            status = await asgi_get(application, f'/api/async/{path}', json.dumps({"elevator_name": name}).encode())
+            durations.append(time.perf_counter() - start)
+            if status >= 500:
+                raise RuntimeError(f"GET {path} failed with {status}")
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        connection_created.disconnect(counter.install)
+        await sync_to_async(counter.uninstall)()
+    return durations, time.perf_counter() - start, counter.count
+
+
+@register('async_views')
+def async_views(size=1000, elevators=10, concurrency=50):
+    """
+    Polling of the read APIs through the WSGI handler (DRF views) against the
+    ASGI application of project/asgi.py (async views), one request at a time
+    then with many requests in flight. The latency with many requests in
+    flight includes their wait on the event loop, compare the throughputs.
+    """
+    client = Client()
+    names = install_elevators(client, elevators)
+    for name in names:
+        client.call('POST', 'userrequests/save_user_request/', {"elevator_name": name, "floor": 5})
+
+    results = {"wsgi": measure(lambda path, name: client.call('GET', path, {"elevator_name": name}),
+                               [(READS[index % len(READS)], names[index % len(names)]) for index in range(size)])}
+
+    application = get_application()
+    for label, in_flight in (("asgi", 1), (f"asgi_concurrency_{concurrency}", concurrency)):
+        durations, total, queries = asyncio.run(load(application, names, size, in_flight))
+        results[label] = summarize(durations, queries)
+        results[label]["ops_per_sec"] = round(size / total, 1)
+    return results
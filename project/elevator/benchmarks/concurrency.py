@@ -0,0 +1,74 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+from . import Client, install_elevators, register
+from ..models import ElevatorsModel, UserRequestModels
+
+
+def ride(name, attempts):
+    """
+    Drives one elevator through next_destinations and reach_next_destination
+    until its requests are served, returns the outcome of every call
+    """
+    client = Client()
+    outcomes = Counter()
+    try:
+        for _ in range(attempts):
+            planned = client.call('POST', 'elevator/next_destinations/', {"elevator_name": name})
+            outcomes[f'next_destinations_{planned.status_code}'] += 1
+
+            reached = client.call('POST', 'elevator/reach_next_destination/', {"elevator_name": name})
+            outcomes[f'reach_next_destination_{reached.status_code}'] += 1
+            if reached.data.get("success"):
+                outcomes['served'] += 1
+            elif not UserRequestModels.objects.filter(elevator__elevator_name=name).exists():
+                break
+    finally:
+        connection.close()
+    return outcomes
+
+
+def race(names, floors, threads):
+    client = Client()
+    client.call('POST', 'userrequests/save_user_requests/',
+                [{"elevator_name": name, "floor": floor} for name in set(names) for floor in range(1, floors + 1)])
+    versions = dict(ElevatorsModel.objects.filter(elevator_name__in=names).values_list('elevator_name', 'version'))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda name: ride(name, floors * 4), names))
+    elapsed = time.perf_counter() - start
+
+    outcomes = sum(results, Counter())
+    transitions = sum(count for outcome, count in outcomes.items() if outcome.endswith('_200'))
+    bumps = sum(version - versions[name] for name, version in
+                ElevatorsModel.objects.filter(elevator_name__in=names).values_list('elevator_name', 'version'))
+    pending = UserRequestModels.objects.filter(elevator__elevator_name__in=names).count()
+
+    return {
+        "threads": threads,
+        "elevators": len(set(names)),
+        "calls_per_sec": round(sum(count for outcome, count in outcomes.items() if outcome != 'served') / elapsed, 1),
+        "outcomes": dict(sorted(outcomes.items())),
+        # every floor served exactly once, nothing left behind and every
+        # committed transition accounted for by one version bump
+        "served_once": outcomes['served'] == floors * len(set(names)) and pending == 0,
+        "lost_updates": transitions - bumps,
+    }
+
+
+@register('concurrency', on_disk=True)
+def concurrency(size=50, threads=8):
+    """
+    Threads racing next_destinations and reach_next_destination on one
+    elevator, then on one elevator each, checks that no floor is served twice
+    or lost and that no committed transition is lost
+    """
+    names = install_elevators(Client(), threads + 1, last_floor=size, prefix='c')
+    return {
+        'one_elevator': race([names[0]] * threads, size, threads),
+        'elevator_per_thread': race(names[1:], size, threads),
+    }
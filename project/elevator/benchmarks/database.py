@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings
+
+from . import Client, install_elevators, measure, register, summarize
+
+# the SQLite defaults the tuned pragmas are compared against
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def press(name, floors):
+    """
+    One panel saving every floor of its elevator through save_user_request,
+    returns the duration of every call and the number of failed ones
+    """
+    client = Client()
+    durations, failed = [], 0
+    try:
+        for floor in floors:
+            start = time.perf_counter()
+            try:
+                response = client.call('POST', 'userrequests/save_user_request/', {"elevator_name": name, "floor": floor})
+            except Exception:  # "database is locked" once the busy timeout ran out
+                failed += 1
+                continue
+            durations.append(time.perf_counter() - start)
+            failed += response.status_code != 200
+    finally:
+        connection.close()
+    return durations, failed
+
+
+def concurrent_writes(size, threads, prefix):
+    names = install_elevators(Client(), threads, last_floor=size, prefix=prefix)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda name: press(name, range(1, size + 1)), names))
+    elapsed = time.perf_counter() - start
+
+    durations = [duration for thread_durations, _ in results for duration in thread_durations]
+    summary = summarize(durations, 0)
+    del summary["queries_per_call"]
+    summary["ops_per_sec"] = round(len(durations) / elapsed, 1)
+    summary["failed"] = sum(failed for _, failed in results)
+    return summary
+
+
+@register('database', on_disk=True)
+def database(size=300, threads=(1, 4, 8)):
+    """
+    save_user_request throughput with threads writing concurrently (one
+    elevator each, every call inserts a request) and the cost of opening a
+    connection, paid by every request when CONN_MAX_AGE is 0. On SQLite with
+    its default journal against the pragmas of ELEVATOR_SQLITE_PRAGMAS.
+    """
+    profiles = {'tuned': settings.ELEVATOR_SQLITE_PRAGMAS}
+    if connection.vendor == 'sqlite':
+        profiles = {'default': DEFAULT_PRAGMAS, **profiles}
+
+    results = {}
+    for profile, pragmas in profiles.items():
+        with override_settings(ELEVATOR_SQLITE_PRAGMAS=pragmas):
+            connection.close()  # the next connection runs the pragmas
+            results[profile] = {f'{count}_threads': concurrent_writes(size, count, f'{profile}{count}_') for count in threads}
+            results[profile]['new_connection'] = measure(lambda: (connection.close(), connection.ensure_connection()),
+                                                         [()] * size)
+    return results
@@ -0,0 +1,124 @@
+import random
+import time
+
+from . import register
+from ..dispatch import FLOOR_TRAVEL_TIME, STOP_TIME, Car, choose_car
+
+DWELL_TICKS = int(STOP_TIME / FLOOR_TRAVEL_TIME)
+
+
+class SimulatedCar:
+    """
+    Car of the dispatch simulation, moves one floor per tick with LOOK order
+    """
+
+    def __init__(self, name, floor, last_floor):
+        self.name = name
+        self.floor = floor
+        self.last_floor = last_floor
+        self.direction = 0
+        self.stops = set()
+        self.dwell = 0
+
+    def snapshot(self):
+        lowest = min(self.stops | {self.floor})
+        highest = max(self.stops | {self.floor})
+        return Car(self.name, self.floor, self.direction, lowest, highest, len(self.stops), 0, self.last_floor, False)
+
+    def tick(self):
+        if self.dwell:
+            self.dwell -= 1
+            return None
+        if not self.stops:
+            self.direction = 0
+            return None
+        if self.direction == 0 or not any((stop - self.floor) * self.direction > 0 for stop in self.stops):
+            self.direction = 1 if max(self.stops) > self.floor else -1
+        self.floor += self.direction
+        if self.floor in self.stops:
+            self.stops.discard(self.floor)
+            self.dwell = DWELL_TICKS
+            return self.floor
+        return None
+
+
+def simulate(assign, cars=8, floors=30, calls=2000, rate=0.3, seed=0):
+    """
+    Average wait (seconds) of hall calls arriving as a Poisson process, every
+    call is assigned with ``assign(cars, floor, direction)``
+    """
+    rng = random.Random(seed)
+    fleet = [SimulatedCar(f"e{index}", 0, floors) for index in range(cars)]
+    arrivals, clock = [], 0.0
+    for _ in range(calls):
+        clock += rng.expovariate(rate)
+        floor = rng.randint(0, floors)
+        direction = 'down' if floor == floors or (floor and rng.random() < 0.5) else 'up'
+        arrivals.append((int(clock), floor, direction))
+
+    waiting = {car.name: {} for car in fleet}
+    waits = []
+    tick = 0
+    index = 0
+    while index < len(arrivals) or any(waiting[car.name] for car in fleet):
+        while index < len(arrivals) and arrivals[index][0] <= tick:
+            _, floor, direction = arrivals[index]
+            car = fleet[assign(fleet, floor, direction)]
+            if floor == car.floor:
+                waits.append(0)
+            else:
+                car.stops.add(floor)
+                waiting[car.name].setdefault(floor, []).append(tick)
+            index += 1
+        for car in fleet:
+            served = car.tick()
+            if served is not None:
+                waits.extend(tick + 1 - arrived for arrived in waiting[car.name].pop(served, ()))
+        tick += 1
+
+    return round(sum(waits) / len(waits) * FLOOR_TRAVEL_TIME, 2)
+
+
+def round_robin():
+    state = {'next': 0}
+
+    def assign(fleet, floor, direction):
+        chosen = state['next'] % len(fleet)
+        state['next'] += 1
+        return chosen
+    return assign
+
+
+def strategy(name):
+    def assign(fleet, floor, direction):
+        cars = [car.snapshot() for car in fleet]
+        return cars.index(choose_car(cars, floor, direction, name))
+    return assign
+
+
+@register('dispatch')
+def dispatch(size=2000, cars=8, floors=30, group=500):
+    """
+    Average wait of round-robin against the dispatch strategies and the cost
+    of one dispatch decision for a large group of cars
+    """
+    results = {
+        "average_wait_seconds": {
+            "round_robin": simulate(round_robin(), cars, floors, size),
+            "nearest": simulate(strategy('nearest'), cars, floors, size),
+            "eta": simulate(strategy('eta'), cars, floors, size),
+        },
+    }
+
+    rng = random.Random(0)
+    fleet = [Car(f"e{index}", rng.randint(0, floors), rng.choice((-1, 0, 1)), 0, floors,
+                 rng.randint(0, 10), 0, floors, False) for index in range(group)]
+    decisions = {}
+    for name in ('nearest', 'eta'):
+        start = time.perf_counter()
+        for _ in range(200):
+            choose_car(fleet, rng.randint(0, floors), 'up', name)
+        decisions[name] = round((time.perf_counter() - start) / 200 * 1e6, 1)
+    results[f"decision_us_for_{group}_cars"] = decisions
+
+    return results
@@ -0,0 +1,21 @@
+from . import Client, install_elevators, measure, register
+from ..engine import TickEngine
+
+
+@register('engine')
+def engine(size=20, fleets=(10, 100, 1000, 5000), floors=1000):
+    """
+    One tick of the engine for growing fleets, every elevator is moving and
+    one in ten serves a stop on every tick
+    """
+    client = Client()
+    tick_engine = TickEngine()
+    names = []
+    results = {}
+    for count in fleets:
+        names += install_elevators(client, count - len(names), last_floor=floors, prefix=f'k{count}_')
+        client.call('POST', 'userrequests/save_user_requests/',
+                    [{"elevator_name": name, "floor": floor} for index, name in enumerate(names)
+                     for floor in (floors, index % 10 + 1)])
+        results[f'{count}_elevators'] = measure(tick_engine.tick, [()] * size, count)
+    return results
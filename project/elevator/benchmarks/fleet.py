@@ -0,0 +1,20 @@
+from . import Client, install_elevators, measure, register
+
+
+@register('fleet')
+def fleet(size=100, fleets=(10, 100, 1000)):
+    """
+    The fleet snapshot for growing fleets, a full download and a revalidation
+    answered with 304 Not Modified
+    """
+    client = Client()
+    names = []
+    results = {}
+    for count in fleets:
+        names += install_elevators(client, count - len(names), last_floor=20, prefix=f'f{count}_')
+        client.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": name, "floor": 5} for name in names[::3]])
+        etag = client.get('/api/fleet/snapshot/')['ETag']
+        results[f'{count}_elevators'] = measure(lambda: client.get('/api/fleet/snapshot/'), [()] * size)
+        results[f'{count}_elevators_not_modified'] = measure(lambda: client.get('/api/fleet/snapshot/', HTTP_IF_NONE_MATCH=etag),
+                                                             [()] * size)
+    return results
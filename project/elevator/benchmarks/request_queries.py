@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.db import connection
+from django.utils import timezone
+
+from . import register
+from ..history import compact_requests
+from ..models import ElevatorsModel, UserRequestModels
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}' if connection.vendor == 'sqlite' else f'EXPLAIN {sql}', params)
+        return ' | '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def timed(operation, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    return round((time.perf_counter() - start) / repeat * 1000, 4)
+
+
+@register('request_queries')
+def request_queries(size=100000, elevators=100, repeat=200, seed=0):
+    """
+    Latency of the hot UserRequestModels queries (scan by elevator, serve by
+    elevator and floor, upsert) with size pending rows in the table, then the
+    compaction of the served ones into the archive
+    """
+    rng = random.Random(seed)
+    floors = max(size // elevators, 1)
+    cars = ElevatorsModel.objects.bulk_create(
+        ElevatorsModel(elevator_name=f"e{index}", current_floor=0, first_floor=0, last_floor=floors, door="CLOSE")
+        for index in range(elevators))
+    UserRequestModels.objects.bulk_create(
+        (UserRequestModels(elevator_id=car.id, destination_floor=floor) for car in cars for floor in range(floors)),
+        batch_size=10000)
+
+    scan = lambda: list(UserRequestModels.objects.filter(elevator_id=rng.choice(cars).id).values_list('destination_floor', flat=True))
+
+    def serve_and_upsert():
+        car, floor = rng.choice(cars), rng.randrange(floors)
+        UserRequestModels.objects.filter(elevator_id=car.id, destination_floor=floor).update(served_at=timezone.now())
+        UserRequestModels.objects.bulk_create([UserRequestModels(elevator_id=car.id, destination_floor=floor)], ignore_conflicts=True)
+
+    duplicate = lambda: UserRequestModels.objects.bulk_create(
+        [UserRequestModels(elevator_id=rng.choice(cars).id, destination_floor=rng.randrange(floors))], ignore_conflicts=True)
+
+    results = {
+        "rows": UserRequestModels.objects.count(),
+        "scan_by_elevator_ms": timed(scan, repeat),
+        "serve_and_upsert_ms": timed(serve_and_upsert, repeat),
+        "duplicate_upsert_ms": timed(duplicate, repeat),
+        "scan_plan": explain(UserRequestModels.objects.filter(elevator_id=cars[0].id)),
+        "serve_plan": explain(UserRequestModels.objects.filter(elevator_id=cars[0].id, destination_floor=0)),
+    }
+
+    # serve a tenth of the requests and move them to the archive
+    served = UserRequestModels.objects.filter(destination_floor__lt=max(floors // 10, 1)).update(served_at=timezone.now())
+    start = time.perf_counter()
+    archived = compact_requests()
+    elapsed = time.perf_counter() - start
+    results["compaction"] = {
+        "archived": archived,
+        "archived_per_sec": round(archived / elapsed, 1) if elapsed else None,
+        "served_before": served,
+        "rows_after": UserRequestModels.history.count(),
+    }
+    return results
@@ -0,0 +1,46 @@
+import itertools
+
+from django.test.utils import override_settings
+
+from . import Client, install_elevators, measure, register
+from ..responses import reset_response_cache
+
+POLLED_ACTIONS = {
+    'get_current_floor': 'elevator/get_current_floor/',
+    'check_maintenance_status': 'maintenance/check_maintenance_status/',
+    'fetch_all_requests': 'userrequests/fetch_all_requests/',
+}
+
+
+@register('responses')
+def responses(size=1000, elevators=10, floors=20):
+    """
+    Panels polling the GET actions with the response cache turned off and on,
+    and polls with a save_user_request of the same elevator every tenth call
+    (every write drops the responses of its elevator)
+    """
+    client = Client()
+    names = install_elevators(client, elevators, last_floor=floors)
+    for name in names:
+        client.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": name, "floor": floor} for floor in (3, 7)])
+    cycle = [({"elevator_name": name},) for name in itertools.islice(itertools.cycle(names), size)]
+
+    def poll(path):
+        return lambda body: client.call('GET', path, body)
+
+    floors_cycle = itertools.cycle(range(1, floors + 1))
+
+    def poll_and_write(index):
+        name = names[index % len(names)]
+        if index % 10 == 0:
+            client.call('POST', 'userrequests/save_user_request/', {"elevator_name": name, "floor": next(floors_cycle)})
+        return client.call('GET', 'userrequests/fetch_all_requests/', {"elevator_name": name})
+
+    results = {}
+    for profile, seconds in (('uncached', 0.0), ('cached', 60.0)):
+        with override_settings(ELEVATOR_RESPONSE_CACHE_SECONDS=seconds):
+            reset_response_cache()
+            results[profile] = {action: measure(poll(path), cycle) for action, path in POLLED_ACTIONS.items()}
+            results[profile]['poll_with_writes'] = measure(poll_and_write, [(index,) for index in range(size)])
+    reset_response_cache()
+    return results
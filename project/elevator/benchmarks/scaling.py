@@ -0,0 +1,54 @@
+import random
+
+from . import Client, install_elevators, measure, register
+from ..destinations import get_destination_store
+
+
+def measure_point(client, names, floors, size, rng):
+    # the actions on the hot path of a ride, measured on the given elevators
+    calls = [rng.choice(names) for _ in range(size)]
+
+    def post(path):
+        return lambda body: client.call('POST', path, body)
+
+    results = {
+        'save_user_request': measure(post('userrequests/save_user_request/'),
+                                     [({"elevator_name": name, "floor": rng.choice(floors)},) for name in calls]),
+        'next_destinations': measure(post('elevator/next_destinations/'), [({"elevator_name": name},) for name in calls]),
+        'fetch_all_requests': measure(lambda body: client.call('GET', 'userrequests/fetch_all_requests/', body),
+                                      [({"elevator_name": name},) for name in calls]),
+    }
+
+    store = get_destination_store()
+    reached = [({"elevator_name": name, "current_floor": floor},) for name in names for floor in store.members(name)]
+    if reached:
+        results['destination_reached'] = measure(post('elevator/destination_reached/'), reached[:size])
+    return results
+
+
+@register('scaling')
+def scaling(size=100, points=(10, 100, 1000), seed=0):
+    """
+    The hot path actions as the elevator count, the floor span
+    (first_floor..last_floor) and the pending requests of an elevator grow
+    """
+    client = Client()
+    rng = random.Random(seed)
+    results = {'elevators': {}, 'floor_span': {}, 'pending_requests': {}}
+
+    names = []
+    for count in points:
+        names += install_elevators(client, count - len(names), last_floor=20, prefix=f'e{count}_')
+        results['elevators'][str(count)] = measure_point(client, names, list(range(21)), size, rng)
+
+    for span in points:
+        name, = install_elevators(client, 1, first_floor=-(span // 2), last_floor=span - span // 2, prefix=f'span{span}_')
+        results['floor_span'][str(span)] = measure_point(client, [name], list(range(-(span // 2), span - span // 2 + 1)), size, rng)
+
+    for pending in points:
+        name, = install_elevators(client, 1, last_floor=max(points), prefix=f'pending{pending}_')
+        floors = rng.sample(range(max(points) + 1), pending)
+        client.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": name, "floor": floor} for floor in floors])
+        # saving floors which are already pending keeps the pending count steady
+        results['pending_requests'][str(pending)] = measure_point(client, [name], floors, size, rng)
+    return results
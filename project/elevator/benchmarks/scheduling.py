@@ -0,0 +1,80 @@
+import random
+import statistics
+from collections import defaultdict
+
+from . import measure, register
+from ..policies import POLICIES
+from ..scheduler import ElevatorScheduler
+
+
+def drive(policy, floors, requests):
+    """
+    Drives one car with the policy through the (time, floor) requests, the
+    car travels one floor per time unit and picks up the requests which
+    arrived on its way at every stop, so new stops land mid run. Returns the
+    floors travelled and the time every request waited
+    """
+    scheduler = ElevatorScheduler()
+    waiting = defaultdict(list)  # floor -> arrival time of every request for it
+    waits = []
+    clock, travelled, current_floor, direction = 0.0, 0, 0, 'stand_by'
+    arrivals = iter(requests)
+    arrival = next(arrivals, None)
+
+    while arrival is not None or waiting:
+        while arrival is not None and arrival[0] <= clock:
+            if arrival[1] == current_floor:
+                waits.append(clock - arrival[0])
+            else:
+                waiting[arrival[1]].append(arrival[0])
+                scheduler.add_stop(arrival[1])
+            arrival = next(arrivals, None)
+
+        plan = scheduler.plan(current_floor, direction, 0, floors, policy)
+        if plan.next_destination is None:  # idle until the next request
+            clock = max(clock, arrival[0])
+            continue
+
+        clock += abs(plan.next_destination - current_floor)
+        travelled += abs(plan.next_destination - current_floor)
+        current_floor, direction = plan.next_destination, plan.current_direction
+        scheduler.remove_stop(current_floor)
+        waits.extend(clock - arrived for arrived in waiting.pop(current_floor, ()))
+
+    return {
+        "floors_travelled": travelled,
+        "average_wait": round(statistics.fmean(waits), 1),
+        "p95_wait": round(sorted(waits)[int(len(waits) * 0.95)], 1),
+        "max_wait": round(max(waits), 1),
+    }
+
+
+@register('scheduling')
+def scheduling(size=2000, floors=50, rate=0.2, seed=0, stops=(10, 100, 1000)):
+    """
+    Travel distance and waits of every scheduling policy on the same random
+    requests (rate requests per floor travelled) and the compute time of one
+    decision (plan) for growing numbers of stops
+    """
+    rng = random.Random(seed)
+    clock = 0.0
+    requests = []
+    for _ in range(size):
+        clock += rng.expovariate(rate)
+        requests.append((clock, rng.randint(0, floors)))
+
+    results = {}
+    for policy in POLICIES:
+        results[policy] = {"travel": drive(policy, floors, requests)}
+        for count in stops:
+            rng = random.Random(seed)
+            shaft = count * 2
+            scheduler = ElevatorScheduler(rng.sample(range(shaft + 1), count))
+            decisions = [(rng.randint(0, shaft), rng.choice(('moving up', 'moving down', 'stand_by'))) for _ in range(size)]
+            results[policy][f'decision_{count}_stops'] = measure(
+                lambda current_floor, direction: scheduler.plan(current_floor, direction, 0, shaft, policy), decisions)
+
+    rng = random.Random(seed)
+    scheduler = ElevatorScheduler(range(0, 2 * max(stops), 2))
+    results['add_stop'] = measure(scheduler.add_stop, [(rng.randrange(1, 2 * max(stops), 2),) for _ in range(size)])
+    return results
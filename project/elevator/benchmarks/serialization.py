@@ -0,0 +1,45 @@
+import pickle
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from . import Client, install_elevators, measure, register
+from ..models import ElevatorsModel
+from ..serializers import ElevatorSerializer
+from ..state import elevator_values, get_elevator
+
+
+@register('serialization')
+def serialization(size=500, elevators=100):
+    """
+    Cost of turning elevators into responses: building the dicts, rendering
+    them to JSON with DRF's renderer and with the configured one, the cache
+    round trip of an elevator and the read and status endpoints end to end
+    """
+    client = Client()
+    names = install_elevators(client, elevators, last_floor=20, prefix='s')
+    instances = list(ElevatorsModel.objects.all())
+    cached = [get_elevator(name) for name in names]
+    status = {"success": True, "data": [elevator_values(elevator) for elevator in cached[:1]]}
+    fleet = ElevatorSerializer(instances, many=True).data
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    cycle = [(names[index % len(names)],) for index in range(size)]
+
+    return {
+        'serializer_one': measure(lambda: ElevatorSerializer(instances[0]).data, [()] * size),
+        'serializer_many': measure(lambda: ElevatorSerializer(instances, many=True).data, [()] * size, elevators),
+        'elevator_values': measure(lambda: [elevator_values(elevator) for elevator in cached], [()] * size, elevators),
+        'render_status_drf': measure(lambda: JSONRenderer().render(status), [()] * size),
+        'render_status': measure(lambda: renderer.render(status), [()] * size),
+        'render_fleet_drf': measure(lambda: JSONRenderer().render(fleet), [()] * size, elevators),
+        'render_fleet': measure(lambda: renderer.render(fleet), [()] * size, elevators),
+        'cache_round_trip': measure(lambda: [pickle.loads(pickle.dumps(elevator)) for elevator in cached], [()] * size,
+                                    elevators),
+        'list_elevators': measure(lambda: client.call('GET', 'install/', {}), [()] * (size // 10), elevators),
+        'get_current_floor': measure(lambda name: client.call('GET', 'elevator/get_current_floor/', {"elevator_name": name}),
+                                     cycle),
+        'set_maintenance': measure(lambda name: client.call('PATCH', 'maintenance/set_maintenance/',
+                                                            {"elevator_name": name, "maintenance": False}), cycle),
+        'open_or_close_door': measure(lambda name: client.call('PATCH', 'door/open_or_close_door/',
+                                                               {"elevator_name": name, "door": "OPEN"}), cycle),
+    }
@@ -0,0 +1,47 @@
+import os
+import random
+import tempfile
+
+from django.test.utils import override_settings
+
+from . import Client, install_elevators, measure, register
+from ..traffic import get_traffic_log, reset_traffic_log
+
+
+@register('traffic')
+def traffic(size=1000, elevators=10, floors=20, seed=0):
+    """
+    What the traffic log adds to a call: appending a record to the buffer,
+    and save_user_request with the log off and on (on elevators of their
+    own, so both write the same floors)
+    """
+    client = Client()
+    rng = random.Random(seed)
+    presses = [(rng.randrange(elevators), rng.randint(0, floors)) for _ in range(size)]
+
+    def calls(prefix):
+        names = install_elevators(client, elevators, last_floor=floors, prefix=prefix)
+        return [({"elevator_name": names[index], "floor": floor},) for index, floor in presses]
+
+    def press(body):
+        return client.call('POST', 'userrequests/save_user_request/', body)
+
+    results = {'log_off': measure(press, calls('off'))}
+    path = os.path.join(tempfile.gettempdir(), f'elevator_benchmark_traffic_{os.getpid()}.log')
+    try:
+        with override_settings(ELEVATOR_TRAFFIC_LOG=path):
+            log = get_traffic_log()
+            appended = calls('append')
+            results['append'] = measure(lambda body: log.append('UserRequests.save_user_request', body), appended)
+            log.buffer.clear()
+            logged = calls('on')
+            log.flush()
+            size_before = os.path.getsize(path)
+            results['log_on'] = measure(press, logged)
+            reset_traffic_log()
+        results['log_on']['log_bytes_per_call'] = round((os.path.getsize(path) - size_before) / len(logged), 1)
+    finally:
+        reset_traffic_log()
+        if os.path.exists(path):
+            os.remove(path)
+    return results
@@ -0,0 +1,37 @@
+import random
+
+from . import Client, install_elevators, measure, register
+
+
+@register('user_requests')
+def user_requests(size=500, elevators=10, seed=0):
+    """
+    Per-call save_user_request against one save_user_requests batch carrying
+    the same (elevator_name, floor) pairs. Then save_user_request pressing
+    the same floors again, retrying with a request key, and rejecting floors
+    out of range and unknown elevators
+    """
+    client = Client()
+    names = install_elevators(client, elevators, last_floor=50)
+    rng = random.Random(seed)
+    pairs = [{"elevator_name": rng.choice(names), "floor": rng.randint(0, 50)} for _ in range(size)]
+
+    per_call = measure(lambda pair: client.call('POST', 'userrequests/save_user_request/', pair),
+                       [(pair,) for pair in pairs])
+
+    batch = measure(lambda batch: client.call('POST', 'userrequests/save_user_requests/', batch),
+                    [(pairs,)], ops_per_call=size)
+
+    # the floors are pending already, nothing is written
+    repeated = measure(lambda pair: client.call('POST', 'userrequests/save_user_request/', pair), [(pair,) for pair in pairs])
+    retried = measure(lambda pair: client.call('POST', 'userrequests/save_user_request/', pair),
+                      [({**pair, "request_key": "retried"},) for pair in pairs])
+
+    # rejected by the registry without reading the elevator
+    rejected = measure(lambda pair: client.call('POST', 'userrequests/save_user_request/', pair),
+                       [({"elevator_name": rng.choice(names), "floor": rng.randint(51, 100)},) for _ in range(size)])
+    unknown = measure(lambda pair: client.call('POST', 'userrequests/save_user_request/', pair),
+                      [({"elevator_name": f"unknown{index}", "floor": 1},) for index in range(size)])
+
+    return {"save_user_request": per_call, "save_user_requests": batch, "repeated_press": repeated, "retried_request_key": retried,
+            "out_of_range_floor": rejected, "unknown_elevator": unknown}
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# SQLite connections of Django 4.2 take no init command, the pragmas of
+# settings.ELEVATOR_SQLITE_PRAGMAS are run on every new connection instead.
+# With WAL the readers no longer block the writer (and the other way round),
+# only the writes are serialised. The journal mode is the one pragma stored
+# in the database file, it is only switched when it differs so a database in
+# WAL mode already is never written by a new connection.
+
+
+def apply_pragmas(connection, pragmas):
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            if pragma == 'journal_mode':
+                cursor.execute('PRAGMA journal_mode')
+                if cursor.fetchone()[0].lower() == str(value).lower():
+                    continue
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    pragmas = getattr(settings, 'ELEVATOR_SQLITE_PRAGMAS', None)
+    if connection.vendor == 'sqlite' and pragmas:
+        apply_pragmas(connection, pragmas)
+
+
+def install():
+    connection_created.connect(configure_connection, dispatch_uid='elevator_sqlite_pragmas')
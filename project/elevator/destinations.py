@@ -0,0 +1,220 @@
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .instrumentation import record_cache
+
+
+# floors can be negative (basements), they are mapped to bit offsets with
+# zigzag encoding 0, -1, 1, -2, 2 ... -> 0, 1, 2, 3, 4 ... so the bitmap stays
+# compact for floors around the ground floor and never depends on first_floor
+def floor_to_offset(floor):
+    return floor * 2 if floor >= 0 else -floor * 2 - 1
+
+
+def offset_to_floor(offset):
+    return offset // 2 if offset % 2 == 0 else -(offset + 1) // 2
+
+
+def destinations_key(elevator_name):
+    return f'destinations_{elevator_name}'
+
+
+def bitmap_floors(bitmap):
+    """
+    The floors of an integer bitmap
+    """
+    floors = []
+    while bitmap:
+        lowest = bitmap & -bitmap
+        floors.append(offset_to_floor(lowest.bit_length() - 1))
+        bitmap ^= lowest
+    return sorted(floors)
+
+
+def redis_bitmap_floors(bitmap):
+    """
+    The floors of a Redis bitmap, redis numbers the bits from the most
+    significant one
+    """
+    floors = []
+    for index, byte in enumerate(bitmap):
+        for bit in range(8):
+            if byte & (0x80 >> bit):
+                floors.append(offset_to_floor(index * 8 + bit))
+    return sorted(floors)
+
+
+class LocalDestinationStore:
+    """
+    Destinations of every elevator as an integer bitmap kept in this process,
+    the counterpart of LocMemCache which is also per process
+    """
+
+    def __init__(self):
+        self.bitmaps = {}
+        self.lock = Lock()
+
+    def add(self, elevator_name, floor):
+        bit = 1 << floor_to_offset(floor)
+        with self.lock:
+            bitmap = self.bitmaps.get(elevator_name, 0)
+            self.bitmaps[elevator_name] = bitmap | bit
+        record_cache(destinations_key(elevator_name), 'set')
+        return not bitmap & bit
+
+    def add_many(self, elevator_name, floors):
+        bits = 0
+        for floor in floors:
+            bits |= 1 << floor_to_offset(floor)
+        with self.lock:
+            self.bitmaps[elevator_name] = self.bitmaps.get(elevator_name, 0) | bits
+        record_cache(destinations_key(elevator_name), 'set')
+
+    def remove(self, elevator_name, floor):
+        bit = 1 << floor_to_offset(floor)
+        with self.lock:
+            bitmap = self.bitmaps.get(elevator_name, 0)
+            if bitmap & bit:
+                self.bitmaps[elevator_name] = bitmap & ~bit
+        record_cache(destinations_key(elevator_name), 'set')
+        return bool(bitmap & bit)
+
+    def contains(self, elevator_name, floor):
+        found = bool(self.bitmaps.get(elevator_name, 0) >> floor_to_offset(floor) & 1)
+        record_cache(destinations_key(elevator_name), 'get', found)
+        return found
+
+    def members(self, elevator_name):
+        bitmap = self.bitmaps.get(elevator_name, 0)
+        record_cache(destinations_key(elevator_name), 'get', bitmap != 0)
+        return bitmap_floors(bitmap)
+
+    def members_many(self, elevator_names):
+        """
+        {elevator_name: destinations} of many elevators
+        """
+        destinations = {}
+        for elevator_name in elevator_names:
+            bitmap = self.bitmaps.get(elevator_name, 0)
+            record_cache(destinations_key(elevator_name), 'get', bitmap != 0)
+            destinations[elevator_name] = bitmap_floors(bitmap)
+        return destinations
+
+    def replace(self, elevator_name, floors):
+        bits = 0
+        for floor in floors:
+            bits |= 1 << floor_to_offset(floor)
+        with self.lock:
+            self.bitmaps[elevator_name] = bits
+        record_cache(destinations_key(elevator_name), 'set')
+
+    def clear(self, elevator_name):
+        with self.lock:
+            self.bitmaps.pop(elevator_name, None)
+        record_cache(destinations_key(elevator_name), 'delete')
+
+
+class RedisDestinationStore:
+    """
+    Destinations of every elevator as a Redis bitmap, SETBIT/GETBIT are atomic
+    on the server so concurrent requests never overwrite each other
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def key(self, elevator_name):
+        return cache.make_key(destinations_key(elevator_name))
+
+    def add(self, elevator_name, floor):
+        record_cache(destinations_key(elevator_name), 'set')
+        return not self.client.setbit(self.key(elevator_name), floor_to_offset(floor), 1)
+
+    def add_many(self, elevator_name, floors):
+        pipeline = self.client.pipeline()
+        for floor in floors:
+            pipeline.setbit(self.key(elevator_name), floor_to_offset(floor), 1)
+        pipeline.execute()
+        record_cache(destinations_key(elevator_name), 'set')
+
+    def remove(self, elevator_name, floor):
+        record_cache(destinations_key(elevator_name), 'set')
+        return bool(self.client.setbit(self.key(elevator_name), floor_to_offset(floor), 0))
+
+    def contains(self, elevator_name, floor):
+        found = bool(self.client.getbit(self.key(elevator_name), floor_to_offset(floor)))
+        record_cache(destinations_key(elevator_name), 'get', found)
+        return found
+
+    def members(self, elevator_name):
+        bitmap = self.client.get(self.key(elevator_name)) or b''
+        record_cache(destinations_key(elevator_name), 'get', bitmap != b'')
+        return redis_bitmap_floors(bitmap)
+
+    def members_many(self, elevator_names):
+        """
+        {elevator_name: destinations} of many elevators with one MGET
+        """
+        elevator_names = list(elevator_names)
+        bitmaps = self.client.mget([self.key(elevator_name) for elevator_name in elevator_names]) if elevator_names else []
+        destinations = {}
+        for elevator_name, bitmap in zip(elevator_names, bitmaps):
+            record_cache(destinations_key(elevator_name), 'get', bool(bitmap))
+            destinations[elevator_name] = redis_bitmap_floors(bitmap or b'')
+        return destinations
+
+    def replace(self, elevator_name, floors):
+        offsets = [floor_to_offset(floor) for floor in floors]
+        bitmap = bytearray(max(offsets) // 8 + 1 if offsets else 0)
+        for offset in offsets:
+            bitmap[offset // 8] |= 0x80 >> (offset % 8)
+        if bitmap:
+            self.client.set(self.key(elevator_name), bytes(bitmap))
+        else:
+            self.client.delete(self.key(elevator_name))
+        record_cache(destinations_key(elevator_name), 'set')
+
+    def clear(self, elevator_name):
+        self.client.delete(self.key(elevator_name))
+        record_cache(destinations_key(elevator_name), 'delete')
+
+
+_store = None
+
+
+def get_destination_store():
+    """
+    Returns the destination store matching the default cache backend, Redis
+    bitmaps for django-redis and Django's RedisCache, in process bitmaps otherwise
+    """
+    global _store
+    if _store is None:
+        backend = settings.CACHES['default']['BACKEND']
+        if backend.startswith('django_redis'):
+            from django_redis import get_redis_connection
+            _store = RedisDestinationStore(get_redis_connection('default'))
+        elif backend == 'django.core.cache.backends.redis.RedisCache':
+            _store = RedisDestinationStore(cache._cache.get_client(write=True))
+        else:
+            _store = LocalDestinationStore()
+    return _store
+
+
+def reset_destination_store():
+    global _store
+    _store = None
+
+
+async def astore_call(method_name, *args):
+    """
+    Calls a method of the destination store from the async views, the in
+    process bitmaps never block, the Redis ones run off the event loop
+    """
+    store = get_destination_store()
+    method = getattr(store, method_name)
+    if isinstance(store, LocalDestinationStore):
+        return method(*args)
+    return await sync_to_async(method, thread_sensitive=False)(*args)
@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the costs are computed in pure python without it
+    numpy = None
+
+
+FLOOR_TRAVEL_TIME = 2.0  # seconds to travel one floor
+STOP_TIME = 10.0  # seconds spent at every stop (doors, boarding)
+
+DIRECTIONS = {'moving up': 1, 'moving down': -1, 'stand_by': 0}
+CALL_DIRECTIONS = {'up': 1, 'down': -1}
+
+Car = namedtuple('Car', ['name', 'current_floor', 'direction', 'lowest_stop', 'highest_stop', 'pending',
+                         'first_floor', 'last_floor', 'maintenance'])
+
+
+def build_car(elevator, direction, scheduler):
+    """
+    Snapshot of an elevator used for scoring hall calls
+    """
+    stops = scheduler.stops
+    current_floor = elevator.current_floor
+    return Car(elevator.elevator_name, current_floor, DIRECTIONS.get(direction, 0),
+               min(stops[0], current_floor) if stops else current_floor,
+               max(stops[-1], current_floor) if stops else current_floor,
+               len(stops), elevator.first_floor, elevator.last_floor, elevator.maintenance)
+
+
+# Logic for nearest car, only the distance to the calling floor counts
+def nearest_car_costs(cars, floor, call_direction):
+    if numpy is not None:
+        current = numpy.fromiter((car.current_floor for car in cars), dtype=float, count=len(cars))
+        return numpy.abs(current - floor)
+    return [abs(car.current_floor - floor) for car in cars]
+
+
+def _eta(car, floor, call_direction):
+    distance = floor - car.current_floor
+
+    # a car moving away from the call (or passing it in the wrong direction)
+    # has to serve its last stop in that direction before turning around
+    if car.direction == 1 and (distance < 0 or (call_direction == -1 and car.highest_stop > floor)):
+        travel = (car.highest_stop - car.current_floor) + (car.highest_stop - floor)
+    elif car.direction == -1 and (distance > 0 or (call_direction == 1 and car.lowest_stop < floor)):
+        travel = (car.current_floor - car.lowest_stop) + (floor - car.lowest_stop)
+    else:
+        travel = abs(distance)
+
+    return travel * FLOOR_TRAVEL_TIME + car.pending * STOP_TIME
+
+
+# Logic for estimated time to arrival, direction and pending stops of the car count
+def eta_costs(cars, floor, call_direction):
+    if numpy is None:
+        return [_eta(car, floor, call_direction) for car in cars]
+
+    count = len(cars)
+    current = numpy.fromiter((car.current_floor for car in cars), dtype=float, count=count)
+    direction = numpy.fromiter((car.direction for car in cars), dtype=float, count=count)
+    lowest = numpy.fromiter((car.lowest_stop for car in cars), dtype=float, count=count)
+    highest = numpy.fromiter((car.highest_stop for car in cars), dtype=float, count=count)
+    pending = numpy.fromiter((car.pending for car in cars), dtype=float, count=count)
+
+    distance = floor - current
+    travel = numpy.abs(distance)
+
+    turn_at_top = (direction == 1) & ((distance < 0) | ((call_direction == -1) & (highest > floor)))
+    turn_at_bottom = (direction == -1) & ((distance > 0) | ((call_direction == 1) & (lowest < floor)))
+    travel = numpy.where(turn_at_top, (highest - current) + (highest - floor), travel)
+    travel = numpy.where(turn_at_bottom, (current - lowest) + (floor - lowest), travel)
+
+    return travel * FLOOR_TRAVEL_TIME + pending * STOP_TIME
+
+
+STRATEGIES = {
+    'nearest': nearest_car_costs,
+    'eta': eta_costs,
+}
+
+
+def choose_car(cars, floor, call_direction, strategy='eta'):
+    """
+    Returns the car which should serve a hall call on floor, cars under
+    maintenance or not serving the floor are never chosen (None if no car can)
+    """
+    candidates = [car for car in cars if not car.maintenance and car.first_floor <= floor <= car.last_floor]
+    if not candidates:
+        return None
+
+    costs = STRATEGIES[strategy](candidates, floor, CALL_DIRECTIONS.get(call_direction, 0))
+    if numpy is not None and not isinstance(costs, list):
+        return candidates[int(numpy.argmin(costs))]
+    return candidates[min(range(len(candidates)), key=costs.__getitem__)]
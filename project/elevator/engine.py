@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .destinations import get_destination_store
+from .events import publish_state
+from .history import compact_requests
+from .instrumentation import cache
+from .models import ElevatorsModel, ElevatorStateModels, UserRequestModels
+from .scheduler import ElevatorScheduler, new_version, stops_version_key
+from .state import ELEVATOR_COLUMNS, RUN_STATE_FIELDS, Elevator, elevator_key, run_state_key
+
+# The tick engine moves the elevators by itself instead of waiting for
+# clients to call next_destinations and reach_next_destination: every tick
+# each elevator with pending requests (and not under maintenance) travels one
+# floor along the route of its policy and serves the stop it reaches. A tick
+# is one transaction for the whole fleet with a fixed number of queries, the
+# caches are updated and the new states published once it committed. Every
+# ELEVATOR_COMPACTION_SECONDS the engine also moves the requests it served
+# to the archive (see history.py).
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def advance(elevator, stops, direction):
+    """
+    One tick of one elevator with the pending stops (a set or dict of
+    floors), returns its new floor, direction, route and the floors it
+    served. A request for the floor the car stands at is served on the spot,
+    a floor of the route without a request (the end of the shaft SCAN drives
+    to) is passed without serving anything.
+    """
+    current_floor = elevator.current_floor
+    served = [current_floor] if current_floor in stops else []
+    plan = ElevatorScheduler(stops).plan(current_floor, direction, elevator.first_floor, elevator.last_floor, elevator.policy)
+    if plan.next_destination is None:
+        return current_floor, 'stand_by', [], served
+
+    current_floor += 1 if plan.next_destination > current_floor else -1
+    route = plan.destinations
+    if current_floor == plan.next_destination:
+        if current_floor in stops:
+            served.append(current_floor)
+        route = route[1:]
+    return current_floor, plan.current_direction if route else 'stand_by', route, served
+
+
+class TickEngine:
+
+    def __init__(self, compaction_seconds=None):
+        self.compaction_seconds = settings.ELEVATOR_COMPACTION_SECONDS if compaction_seconds is None else compaction_seconds
+        self.compacted_at = time.monotonic()
+
+    def tick(self):
+        """
+        Advances every elevator with pending requests by one floor, returns
+        the number of elevators advanced, moved and of requests served
+        """
+        with transaction.atomic():
+            elevators, moved, served = self.advance_fleet()
+        return {"elevators": elevators, "moved": moved, "served": served}
+
+    def advance_fleet(self):
+        elevator_ids = list(UserRequestModels.objects.filter(elevator__maintenance=False)
+                            .values_list('elevator_id', flat=True).distinct().order_by())
+        if not elevator_ids:
+            return 0, 0, 0
+
+        # bumping the versions claims the elevators like claim_elevator does,
+        # the rows are read again once nobody else can change them
+        ElevatorsModel.objects.filter(pk__in=elevator_ids, maintenance=False).update(version=F('version') + 1)
+        elevators = [Elevator(*row) for row in
+                     ElevatorsModel.objects.filter(pk__in=elevator_ids, maintenance=False).values_list(*ELEVATOR_COLUMNS)]
+
+        requests = defaultdict(dict)  # elevator id -> {floor: request id}
+        for request_id, elevator_id, floor in (UserRequestModels.objects.filter(elevator_id__in=elevator_ids)
+                                               .values_list('id', 'elevator_id', 'destination_floor')):
+            requests[elevator_id][floor] = request_id
+        states = {state[0]: state[1:] for state in
+                  ElevatorStateModels.objects.filter(elevator_id__in=elevator_ids).values_list('elevator_id', *RUN_STATE_FIELDS)}
+
+        # every car moves one floor, so two UPDATEs move the whole fleet
+        moved = {1: [], -1: []}
+        changed, served_requests, served_floors = {}, [], {}
+        for elevator in elevators:
+            stops = requests[elevator.id]
+            state = states.get(elevator.id, (None,) * len(RUN_STATE_FIELDS))
+            try:
+                current_floor, direction, route, served = advance(elevator, stops, state[0])
+            except Exception:
+                # one car the engine can't move waits, the rest of the fleet doesn't
+                logger.exception("elevator %s not advanced", elevator.elevator_name)
+                continue
+            if current_floor != elevator.current_floor:
+                moved[current_floor - elevator.current_floor].append(elevator.id)
+                elevator.current_floor = current_floor
+            if served:
+                served_requests += [stops[floor] for floor in served]
+                served_floors[elevator] = served
+            # the state only changes when the car reaches a stop or turns
+            new_state = (direction, route[0] if route else None, route)
+            if new_state != state:
+                changed[elevator] = new_state
+
+        for step, moved_ids in moved.items():
+            for start in range(0, len(moved_ids), BATCH_SIZE):
+                ElevatorsModel.objects.filter(pk__in=moved_ids[start:start + BATCH_SIZE]).update(current_floor=F('current_floor') + step)
+        ElevatorStateModels.objects.bulk_create(
+            [ElevatorStateModels(elevator_id=elevator.id, **dict(zip(RUN_STATE_FIELDS, state))) for elevator, state in changed.items()],
+            batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['elevator'], update_fields=list(RUN_STATE_FIELDS))
+        served_at = timezone.now()
+        for start in range(0, len(served_requests), BATCH_SIZE):
+            UserRequestModels.objects.filter(id__in=served_requests[start:start + BATCH_SIZE]).update(served_at=served_at)
+
+        transaction.on_commit(lambda: self.committed(elevators, changed, served_floors))
+        return len(elevators), len(moved[1]) + len(moved[-1]), len(served_requests)
+
+    def committed(self, elevators, changed, served_floors):
+        values = {elevator_key(elevator.elevator_name): elevator for elevator in elevators}
+        for elevator, state in changed.items():
+            for field, value in zip(RUN_STATE_FIELDS, state):
+                values[run_state_key(field, elevator.elevator_name)] = value
+        # the schedulers of every process reload the stops of the served elevators
+        values.update({stops_version_key(elevator.id): new_version() for elevator in served_floors})
+        cache.set_many(values, timeout=None)
+
+        store = get_destination_store()
+        for elevator, floors in served_floors.items():
+            for floor in floors:
+                store.remove(elevator.elevator_name, floor)
+        for elevator in elevators:
+            publish_state(elevator)
+
+    def run(self, interval=1.0, ticks=None, stop=None, report=None):
+        """
+        Ticks every interval seconds until stop (a threading.Event) is set or
+        after the given number of ticks, report(result, seconds) is called
+        after every tick (result has the requests compacted after the ticks
+        which compacted). A tick which takes longer than the interval is
+        followed by the next one straight away, returns the number of ticks.
+        """
+        count = 0
+        while (ticks is None or count < ticks) and not (stop is not None and stop.is_set()):
+            started = time.monotonic()
+            close_old_connections()
+            try:
+                result = self.tick()
+                if self.compaction_seconds > 0 and started - self.compacted_at >= self.compaction_seconds:
+                    self.compacted_at = started
+                    result["compacted"] = compact_requests()
+            except Exception:
+                logger.exception("elevator tick failed")
+            else:
+                if report is not None:
+                    report(result, time.monotonic() - started)
+            count += 1
+            delay = interval - (time.monotonic() - started)
+            if delay > 0 and (ticks is None or count < ticks):
+                if stop is not None:
+                    stop.wait(delay)
+                else:
+                    time.sleep(delay)
+        return count
+
+
+def start_engine(interval):
+    """
+    Runs the tick engine in a daemon thread of this process, so the states
+    it publishes reach the stream subscribers of this process. Returns the
+    event which stops it.
+    """
+    stop = threading.Event()
+    thread = threading.Thread(target=TickEngine().run, kwargs={"interval": interval, "stop": stop},
+                              name='elevator-tick-engine', daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,137 @@
+import asyncio
+from threading import Lock
+
+from .destinations import astore_call, get_destination_store
+from .instrumentation import cache
+from .responses import invalidate_responses
+from .scheduler import new_version
+from .state import aget_run_state, get_run_state
+
+# bumped by every published state, the version of the fleet snapshot (see
+# views.Fleet) together with the registry version of the installs and deletes
+FLEET_VERSION_KEY = 'elevator_fleet_version'
+
+
+class Subscription:
+    """
+    One stream client, it only keeps the latest state of every elevator it
+    follows so a slow client skips intermediate states instead of queueing them
+    """
+
+    def __init__(self, elevators, loop):
+        self.elevators = elevators
+        self.loop = loop
+        self.pending = {}
+        self.lock = Lock()
+        self.ready = asyncio.Event()
+
+    def wants(self, elevator_name):
+        return self.elevators is None or elevator_name in self.elevators
+
+    def push(self, elevator_name, state):
+        with self.lock:
+            self.pending[elevator_name] = state
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    def drain(self):
+        self.ready.clear()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return list(pending.values())
+
+
+class Publisher:
+    """
+    In process fan out of elevator state changes to the stream subscribers
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = Lock()
+
+    def subscribe(self, elevators=None):
+        subscription = Subscription(set(elevators) if elevators else None, asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, elevator_name, state):
+        with self.lock:
+            subscribers = [subscription for subscription in self.subscribers if subscription.wants(elevator_name)]
+        for subscription in subscribers:
+            try:
+                subscription.push(elevator_name, state)
+            except RuntimeError:  # the event loop of the client is already closed
+                self.unsubscribe(subscription)
+
+
+publisher = Publisher()
+
+
+def elevator_state(elevator, direction=None, destinations=None):
+    if direction is None:
+        direction = get_run_state(elevator.elevator_name, 'direction')
+    if destinations is None:
+        destinations = get_destination_store().members(elevator.elevator_name)
+    return {
+        "elevator_name": elevator.elevator_name,
+        "current_floor": elevator.current_floor,
+        "direction": direction or 'stand_by',
+        "door": elevator.door,
+        "maintenance": elevator.maintenance,
+        "destinations": destinations,
+    }
+
+
+async def aelevator_state(elevator):
+    """
+    Async version of elevator_state, the direction may have to be read from
+    the state table and the destinations from Redis
+    """
+    return elevator_state(elevator, await aget_run_state(elevator.elevator_name, 'direction'),
+                          await astore_call('members', elevator.elevator_name))
+
+
+def publish_state(elevator):
+    """
+    Pushes the state of the elevator to the stream subscribers following it,
+    nothing is read when nobody is listening. Every write to an elevator
+    publishes it, so it also drops the cached responses of the elevator.
+    """
+    invalidate_responses(elevator.elevator_name)
+    fleet_changed()
+    if publisher.subscribers:
+        publisher.publish(elevator.elevator_name, elevator_state(elevator))
+
+
+
+def fleet_changed():
+    try:
+        cache.incr(FLEET_VERSION_KEY)
+    except ValueError:  # a cold cache (or an eviction) starts from a new version
+        cache.add(FLEET_VERSION_KEY, new_version(), timeout=None)
+
+
+async def afleet_changed():
+    """
+    Async version of fleet_changed
+    """
+    try:
+        await cache.aincr(FLEET_VERSION_KEY)
+    except ValueError:
+        await cache.aadd(FLEET_VERSION_KEY, new_version(), timeout=None)
+
+
+def fleet_version():
+    """
+    The version of the fleet snapshot, a cold cache gets a new one
+    """
+    version = cache.get(FLEET_VERSION_KEY)
+    if version is None:
+        cache.add(FLEET_VERSION_KEY, new_version(), timeout=None)
+        version = cache.get(FLEET_VERSION_KEY)
+    return version
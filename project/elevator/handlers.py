@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+# The async APIs (async_views.py) answer JSON to panels and displays, they use
+# none of the sessions, messages, CSRF and authentication of
+# settings.MIDDLEWARE. Under ASGI a middleware which isn't async native costs
+# two hops to the single thread of the sync code per request, every request
+# queues behind the others there, so /api/async/ gets a handler of its own
+# running only the async native middleware of ELEVATOR_ASYNC_MIDDLEWARE.
+
+ASYNC_API_PREFIX = '/api/async/'
+
+
+class AsyncAPIHandler(ASGIHandler):
+    """
+    ASGI handler with the middleware of settings.ELEVATOR_ASYNC_MIDDLEWARE
+    instead of settings.MIDDLEWARE, they should be async capable and have no
+    process_view, process_exception or process_template_response
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response_async)
+        for middleware_path in reversed(settings.ELEVATOR_ASYNC_MIDDLEWARE):
+            handler = convert_exception_to_response(import_string(middleware_path)(handler))
+        self._middleware_chain = handler
+
+
+def get_application():
+    """
+    The ASGI application of the project, the async APIs go through
+    AsyncAPIHandler and everything else through Django's handler
+    """
+    django_application = get_asgi_application()
+    async_api = AsyncAPIHandler()
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(ASYNC_API_PREFIX):
+            return await async_api(scope, receive, send)
+        return await django_application(scope, receive, send)
+    return application
@@ -0,0 +1,45 @@
+from django.db import transaction
+
+from .models import RequestArchiveModels, UserRequestModels
+
+# Served requests are only marked (served_at) by the actions, which costs the
+# same single statement as deleting them did. compact_requests moves them to
+# RequestArchiveModels in batches, so the requests table only ever holds the
+# pending requests and the ones served since the last compaction.
+
+COMPACTION_BATCH_SIZE = 5000
+
+
+def compact_requests(batch_size=COMPACTION_BATCH_SIZE, elevator_ids=None):
+    """
+    Moves the served requests to the archive, one transaction (a read, one
+    INSERT and one DELETE) per batch, returns the number of requests moved
+    """
+    served = UserRequestModels.history.filter(served_at__isnull=False)
+    if elevator_ids is not None:
+        served = served.filter(elevator_id__in=elevator_ids)
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            # a compaction running at the same time skips the batch this one locked (SQLite runs one writer anyway)
+            rows = list(served.select_for_update(skip_locked=True, of=('self',)).order_by('id')
+                        .values_list('id', 'elevator_id', 'elevator__elevator_name', 'destination_floor', 'created_at',
+                                     'served_at')[:batch_size])
+            if not rows:
+                return moved
+            RequestArchiveModels.objects.bulk_create([
+                RequestArchiveModels(elevator_id=elevator_id, elevator_name=elevator_name, destination_floor=floor,
+                                     created_at=created_at, served_at=served_at, day=served_at.date())
+                for _, elevator_id, elevator_name, floor, created_at, served_at in rows])
+            UserRequestModels.history.filter(id__in=[row[0] for row in rows]).delete()
+        moved += len(rows)
+
+
+def drop_archive(before_day):
+    """
+    Deletes the archived days before before_day, returns the number of
+    requests deleted
+    """
+    deleted, _ = RequestArchiveModels.objects.filter(day__lt=before_day).delete()
+    return deleted
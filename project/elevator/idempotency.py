@@ -0,0 +1,112 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+from .instrumentation import cache
+
+# Panels retry a request which timed out. Sent with the same request key (the
+# Idempotency-Key header or "request_key" in the body) the retry gets the
+# response of the first call back instead of saving the floor once more, even
+# when the elevator served it in between. The keys of every elevator are kept
+# in a bounded LRU map with a TTL in this process, and in the cache with the
+# same TTL for the retries landing on another process. They belong to the id
+# of the elevator, which a renamed elevator keeps and a new one never reuses.
+
+REQUEST_KEY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_REQUEST_KEY_LENGTH = 100
+
+
+def request_key_key(elevator_id, key):
+    return f'request_key_{elevator_id}_{key}'
+
+
+class RecentKeys:
+    """
+    The responses to the last max_keys request keys of every elevator, each
+    for ttl seconds, the least recently used key is dropped first
+    """
+
+    def __init__(self, max_keys, ttl, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.clock = clock
+        self.keys = {}  # elevator id -> OrderedDict(key -> (expires, response))
+        self.lock = Lock()
+
+    def get(self, elevator_id, key):
+        now = self.clock()
+        with self.lock:
+            keys = self.keys.get(elevator_id)
+            entry = keys.get(key) if keys else None
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del keys[key]
+                return None
+            keys.move_to_end(key)
+            return entry[1]
+
+    def put(self, elevator_id, key, response):
+        with self.lock:
+            keys = self.keys.setdefault(elevator_id, OrderedDict())
+            keys[key] = (self.clock() + self.ttl, response)
+            keys.move_to_end(key)
+            while len(keys) > self.max_keys:
+                keys.popitem(last=False)
+
+    def forget(self, elevator_id):
+        with self.lock:
+            self.keys.pop(elevator_id, None)
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+
+_recent = None
+
+
+def get_recent_keys():
+    global _recent
+    if _recent is None:
+        _recent = RecentKeys(settings.ELEVATOR_REQUEST_KEYS_PER_ELEVATOR, settings.ELEVATOR_REQUEST_KEY_SECONDS)
+    return _recent
+
+
+def reset_recent_keys():
+    global _recent
+    _recent = None
+
+
+def request_key(meta, data):
+    """
+    The request key of a request, None without one
+    """
+    key = meta.get(REQUEST_KEY_HEADER) or (data.get('request_key') if isinstance(data, dict) else None)
+    if not isinstance(key, (str, int)) or isinstance(key, bool) or key == '':
+        return None
+    return str(key)[:MAX_REQUEST_KEY_LENGTH]
+
+
+def replayed(elevator_id, key):
+    """
+    The response already sent for the request key, None for a new key
+    """
+    recent = get_recent_keys()
+    response = recent.get(elevator_id, key)
+    if response is None:
+        response = cache.get(request_key_key(elevator_id, key))
+        if response is not None:
+            recent.put(elevator_id, key, response)
+    return response
+
+
+def remember(elevator_id, key, response):
+    get_recent_keys().put(elevator_id, key, response)
+    cache.set(request_key_key(elevator_id, key), response, timeout=settings.ELEVATOR_REQUEST_KEY_SECONDS)
+
+
+def forget_request_keys(elevator_id):
+    # the cached keys expire by themselves, no elevator gets the id again
+    get_recent_keys().forget(elevator_id)
@@ -0,0 +1,165 @@
+from rest_framework import status
+
+from .destinations import get_destination_store
+from .events import publish_state
+from .idempotency import request_key, replayed, remember
+from .instrumentation import action_name, metrics
+from .models import ElevatorsModel, UserRequestModels
+from .registry import get_registry, lookup_elevator
+from .scheduler import add_stops
+from .state import get_elevator
+
+# Validation and writes of the user requests, shared by the DRF actions
+# (views.py) and the async views (async_views.py, which run them off the
+# event loop). They return the response payload and its status code.
+
+
+def requested_elevators(data):
+    return {item.get('elevator_name') for item in data if isinstance(item, dict) and isinstance(item.get('elevator_name'), str)}
+
+
+def request_error(record, elevator_name, user_request):
+    """
+    Why the elevator (its registry record) can't take the request, None when
+    it can
+    """
+    if record is None:
+        return f"elevator {elevator_name} doesn't exists"
+    if record.maintenance:
+        return f"elevator {elevator_name} is under maintenance"
+    if not record.serves(user_request):
+        return f"user selected floor {user_request} is out of elevator floors"
+    return None
+
+
+def validate_user_requests(data, records):
+    """
+    Validates a batch of (elevator_name, floor) requests against the registry
+    records of the elevators, returns the result of every item and the new
+    floors of every elevator
+    """
+    results = []
+    new_destinations = {}
+    for item in data:
+        elevator_name = item.get('elevator_name') if isinstance(item, dict) else None
+        user_request = item.get('floor') if isinstance(item, dict) else None
+
+        error = request_error(records.get(elevator_name) if isinstance(elevator_name, str) else None, elevator_name, user_request)
+        if error is not None:
+            results.append({"success": False, "err_message": error})
+        else:
+            new_destinations.setdefault(elevator_name, set()).add(user_request)
+            results.append({"success": True, "data": item})
+    return results, new_destinations
+
+
+def add_destination(elevator, floor):
+    """
+    Saves the floor as a destination of the elevator, returns the
+    destinations and whether the floor is new. A floor which is pending
+    already (the button is lit) is neither written nor planned again.
+    """
+    store = get_destination_store()
+    if not store.add(elevator.elevator_name, floor):
+        return store.members(elevator.elevator_name), False
+    try:
+        UserRequestModels.objects.bulk_create([UserRequestModels(elevator_id=elevator.id, destination_floor=floor)], ignore_conflicts=True)
+    except Exception:
+        # the next press of the floor writes it
+        store.remove(elevator.elevator_name, floor)
+        raise
+    add_stops(elevator, [floor])
+    publish_state(elevator)
+    return store.members(elevator.elevator_name), True
+
+
+def save_user_request(request, data):
+    """
+    Saves the floor of one request as a destination of its elevator
+    """
+    if not isinstance(data, dict):
+        return {"success": False, "err_message": "body should be a dict"}, status.HTTP_400_BAD_REQUEST
+    elevator_name = data.get('elevator_name')
+    user_request = data.get('floor')
+
+    record = lookup_elevator(elevator_name)
+
+    # the retry of a request which timed out gets the first response again
+    key = request_key(request.META, data)
+    if key is not None and record is not None:
+        response = replayed(record.id, key)
+        if response is not None:
+            metrics.count_user_requests(action_name(request), 'request_key')
+            return response, status.HTTP_200_OK
+
+    # validated against the registry, bad requests never reach the cache or the database
+    error = request_error(record, elevator_name, user_request)
+    if error is not None:
+        return {"success": False, "err_message": error}, status.HTTP_400_BAD_REQUEST
+
+    elevator = get_elevator(elevator_name, request)
+    if elevator is None:  # deleted since the registry was loaded
+        return {"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status.HTTP_400_BAD_REQUEST
+
+    destinations, added = add_destination(elevator, user_request)
+    metrics.count_user_requests(action_name(request), 'written' if added else 'pending_floor')
+    response = {"success": True, "data": data, "destinations": destinations}
+    if key is not None:
+        remember(elevator.id, key, response)
+    return response, status.HTTP_200_OK
+
+
+def save_user_requests(request, data):
+    """
+    Saves a batch of requests with one INSERT, invalid items are reported
+    without aborting the rest. An item with a request_key saved before gets
+    its first result again.
+    """
+    if isinstance(data, dict):
+        data = data.get('requests')
+
+    if not isinstance(data, list):
+        return {"success": False, "err_message": "body should be a list of requests"}, status.HTTP_400_BAD_REQUEST
+
+    records = get_registry().get_many(requested_elevators(data))
+    replays = {}
+    for index, item in enumerate(data):
+        key = request_key({}, item)
+        if key is not None and item.get('elevator_name') in records:
+            result = replayed(records[item['elevator_name']].id, key)
+            if result is not None:
+                replays[index] = result
+    new_items = [item for index, item in enumerate(data) if index not in replays]
+    results, new_destinations = validate_user_requests(new_items, records)
+
+    # the floors pending already are neither written nor planned again
+    store = get_destination_store()
+    destinations = store.members_many(new_destinations)
+    added = {elevator_name: floors.difference(destinations[elevator_name]) for elevator_name, floors in new_destinations.items()}
+    added = {elevator_name: floors for elevator_name, floors in added.items() if floors}
+
+    elevators = {elevator.elevator_name: elevator for elevator in ElevatorsModel.objects.filter(elevator_name__in=added)} if added else {}
+    # deleted since the registry was loaded
+    added = {elevator_name: floors for elevator_name, floors in added.items() if elevator_name in elevators}
+    new_requests = [UserRequestModels(elevator_id=elevators[elevator_name].id, destination_floor=floor)
+                    for elevator_name, floors in added.items() for floor in floors]
+    UserRequestModels.objects.bulk_create(new_requests, ignore_conflicts=True)
+
+    for elevator_name, floors in added.items():
+        store.add_many(elevator_name, floors)
+        add_stops(elevators[elevator_name], floors)
+        publish_state(elevators[elevator_name])
+    destinations.update(store.members_many(added))
+
+    for item, result in zip(new_items, results):
+        key = request_key({}, item)
+        if key is not None and result["success"]:
+            remember(records[item['elevator_name']].id, key, result)
+    for index, result in sorted(replays.items()):
+        results.insert(index, result)
+
+    requested = sum(len(floors) for floors in new_destinations.values())
+    metrics.count_user_requests(action_name(request), 'written', len(new_requests))
+    metrics.count_user_requests(action_name(request), 'pending_floor', requested - len(new_requests))
+    metrics.count_user_requests(action_name(request), 'request_key', len(replays))
+    return {"success": True, "results": results, "destinations": destinations}, status.HTTP_200_OK
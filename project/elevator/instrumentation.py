@@ -0,0 +1,364 @@
+import json
+import logging
+import random
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .renderers import ORJSONRenderer
+
+# Instrumentation of the elevator APIs. A sampled request records its wall
+# time, SQL queries, cache gets/sets per key family and the time spent
+# serializing the response, the totals are exposed as Prometheus text on
+# /api/metrics/ and every sampled request is logged as one JSON line on the
+# "elevator.metrics" logger. Requests which are not sampled only pay for a
+# context variable lookup on every cache call.
+
+logger = logging.getLogger('elevator.metrics')
+
+# the longest family first, next_destinations_ also starts with next_destination
+KEY_FAMILIES = ('next_destinations_', 'next_destination_', 'current_floor_', 'destinations_', 'direction_', 'elevator_',
+                'stops_version_', 'request_key_')
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+current_sample = ContextVar('elevator_metrics_sample', default=None)
+
+
+def key_family(key):
+    for family in KEY_FAMILIES:
+        if key.startswith(family):
+            return family
+    return 'other'
+
+
+class Sample:
+    """
+    What one sampled request did
+    """
+    __slots__ = ('start', 'queries', 'query_seconds', 'serialize_seconds', 'cache')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.cache = {}  # (family, operation, result) -> count
+
+    def count_cache(self, family, operation, result, count=1):
+        key = (family, operation, result)
+        self.cache[key] = self.cache.get(key, 0) + count
+
+
+def record_cache(key, operation, hit=None, count=1):
+    """
+    Counts a cache operation of the sampled request, hit is None for writes
+    """
+    sample = current_sample.get()
+    if sample is not None:
+        result = '' if hit is None else 'hit' if hit else 'miss'
+        sample.count_cache(key_family(key), operation, result, count)
+
+
+class InstrumentedCache:
+    """
+    The default cache, counting the gets, hits, misses and sets of the sampled
+    requests per key family. The async calls of the in process cache run
+    inline, it never blocks, the base class sends them to a thread
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    @property
+    def inline(self):
+        return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def get(self, key, default=None, version=None):
+        value = self.cache.get(key, default, version)
+        record_cache(key, 'get', value is not default)
+        return value
+
+    async def aget(self, key, default=None, version=None):
+        if self.inline:
+            return self.get(key, default, version)
+        value = await self.cache.aget(key, default, version)
+        record_cache(key, 'get', value is not default)
+        return value
+
+    def get_many(self, keys, version=None):
+        values = self.cache.get_many(keys, version)
+        if current_sample.get() is not None:
+            for key in keys:
+                record_cache(key, 'get', key in values)
+        return values
+
+    def set(self, key, value, timeout=None, version=None):
+        self.cache.set(key, value, timeout, version)
+        record_cache(key, 'set')
+
+    async def aset(self, key, value, timeout=None, version=None):
+        if self.inline:
+            return self.set(key, value, timeout, version)
+        await self.cache.aset(key, value, timeout, version)
+        record_cache(key, 'set')
+
+    def set_many(self, data, timeout=None, version=None):
+        failed = self.cache.set_many(data, timeout, version)
+        if current_sample.get() is not None:
+            for key in data:
+                record_cache(key, 'set')
+        return failed
+
+    async def aset_many(self, data, timeout=None, version=None):
+        if self.inline:
+            return self.set_many(data, timeout, version)
+        failed = await self.cache.aset_many(data, timeout, version)
+        if current_sample.get() is not None:
+            for key in data:
+                record_cache(key, 'set')
+        return failed
+
+    async def aadd(self, key, value, timeout=None, version=None):
+        if self.inline:
+            return self.cache.add(key, value, timeout, version)
+        return await self.cache.aadd(key, value, timeout, version)
+
+    async def aincr(self, key, delta=1, version=None):
+        if self.inline:
+            return self.cache.incr(key, delta, version)
+        return await self.cache.aincr(key, delta, version)
+
+    def delete_many(self, keys, version=None):
+        self.cache.delete_many(keys, version)
+        if current_sample.get() is not None:
+            for key in keys:
+                record_cache(key, 'delete')
+
+
+cache = InstrumentedCache(default_cache)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.query_seconds += time.perf_counter() - start
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+class InstrumentedJSONRenderer(ORJSONRenderer):
+    """
+    ORJSONRenderer timing the serialization of the sampled responses
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        sample = current_sample.get()
+        if sample is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            sample.serialize_seconds += time.perf_counter() - start
+
+
+class Metrics:
+    """
+    Totals of the sampled requests per action, kept in this process
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}  # (action, status) -> count
+        self.buckets = {}  # action -> count per bucket, the last one is +Inf
+        self.seconds = {}
+        self.queries = {}
+        self.query_seconds = {}
+        self.serialize_seconds = {}
+        self.cache = {}  # (action, family, operation, result) -> count
+        self.user_requests = {}  # (action, outcome) -> count, of every request
+
+    def count_user_requests(self, action, outcome, count=1):
+        """
+        Counts the floors of the user requests by outcome, written ones and
+        the duplicates which were not (pending_floor: the floor was pending
+        already, request_key: the retry of a request key), not only the
+        sampled requests
+        """
+        key = (action, outcome)
+        with self.lock:
+            self.user_requests[key] = self.user_requests.get(key, 0) + count
+
+    def record(self, action, status_code, seconds, sample):
+        with self.lock:
+            key = (action, status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            buckets = self.buckets.setdefault(action, [0] * (len(BUCKETS) + 1))
+            buckets[bisect_left(BUCKETS, seconds)] += 1
+            self.seconds[action] = self.seconds.get(action, 0.0) + seconds
+            self.queries[action] = self.queries.get(action, 0) + sample.queries
+            self.query_seconds[action] = self.query_seconds.get(action, 0.0) + sample.query_seconds
+            self.serialize_seconds[action] = self.serialize_seconds.get(action, 0.0) + sample.serialize_seconds
+            for (family, operation, result), count in sample.cache.items():
+                key = (action, family, operation, result)
+                self.cache[key] = self.cache.get(key, 0) + count
+
+    def render(self):
+        """
+        The totals in the Prometheus text exposition format
+        """
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(**values):
+            return '{' + ','.join(f'{name}="{value}"' for name, value in values.items()) + '}'
+
+        with self.lock:
+            metric('elevator_requests_total', 'counter', "Sampled requests per action and status code")
+            for (action, status_code), count in sorted(self.requests.items()):
+                lines.append(f"elevator_requests_total{labels(action=action, status=status_code)} {count}")
+
+            metric('elevator_request_seconds', 'histogram', "Wall time of the sampled requests")
+            for action, buckets in sorted(self.buckets.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), buckets):
+                    cumulative += count
+                    lines.append(f"elevator_request_seconds_bucket{labels(action=action, le=bound)} {cumulative}")
+                lines.append(f"elevator_request_seconds_sum{labels(action=action)} {self.seconds[action]:.6f}")
+                lines.append(f"elevator_request_seconds_count{labels(action=action)} {cumulative}")
+
+            for name, values, help_text in (
+                ('elevator_queries_total', self.queries, "SQL queries of the sampled requests"),
+                ('elevator_query_seconds_total', self.query_seconds, "Time spent in SQL queries"),
+                ('elevator_serialize_seconds_total', self.serialize_seconds, "Time spent serializing the responses"),
+            ):
+                metric(name, 'counter', help_text)
+                for action, value in sorted(values.items()):
+                    lines.append(f"{name}{labels(action=action)} {value if isinstance(value, int) else f'{value:.6f}'}")
+
+            metric('elevator_cache_operations_total', 'counter', "Cache gets (hit or miss), sets and deletes per key family")
+            for (action, family, operation, result), count in sorted(self.cache.items()):
+                lines.append(f"elevator_cache_operations_total"
+                             f"{labels(action=action, family=family, operation=operation, result=result)} {count}")
+
+            metric('elevator_user_requests_total', 'counter', "Requested floors written and duplicates not written per outcome")
+            for (action, outcome), count in sorted(self.user_requests.items()):
+                lines.append(f"elevator_user_requests_total{labels(action=action, outcome=outcome)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def action_name(request):
+    """
+    ViewSet.action for the DRF views, module.view for the async ones, None
+    outside of the elevator app
+    """
+    match = getattr(request, 'resolver_match', None)
+    view = match.func if match is not None else None
+    if view is None or not view.__module__.startswith('elevator.'):
+        return None
+    actions = getattr(view, 'actions', None)
+    if actions:
+        method = request.method.lower()
+        return f"{view.cls.__name__}.{actions.get(method, method)}"
+    return f"{view.__module__.rsplit('.', 1)[-1]}.{view.__name__}"
+
+
+class InstrumentationMiddleware:
+    """
+    Samples ELEVATOR_METRICS_SAMPLE_RATE of the requests (0 turns it off,
+    1 records every request)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'ELEVATOR_METRICS_SAMPLE_RATE', 0)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+        if self.sample_rate > 0:
+            connection_created.connect(instrument_connection, dispatch_uid='elevator_instrumentation')
+            for connection in connections.all(initialized_only=True):
+                instrument_connection(None, connection)
+
+    def sampled(self):
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        sample = Sample()
+        token = current_sample.set(sample)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        self.finish(request, response, sample)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        sample = Sample()
+        token = current_sample.set(sample)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        self.finish(request, response, sample)
+        return response
+
+    def finish(self, request, response, sample):
+        seconds = time.perf_counter() - sample.start
+        action = action_name(request)
+        if action is None:
+            return
+        metrics.record(action, response.status_code, seconds, sample)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "action": action,
+                "status": response.status_code,
+                "ms": round(seconds * 1000, 3),
+                "queries": sample.queries,
+                "query_ms": round(sample.query_seconds * 1000, 3),
+                "serialize_ms": round(sample.serialize_seconds * 1000, 3),
+                "cache": {f"{family}{operation}{'_' + result if result else ''}": count
+                          for (family, operation, result), count in sorted(sample.cache.items())},
+            }))
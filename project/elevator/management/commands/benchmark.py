@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from elevator.benchmarks import SUITES, isolated_database, regressions
+
+
+class Command(BaseCommand):
+    help = "Runs the elevator API benchmarks on a throw-away database and prints the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', help=f"suites to run, one of {', '.join(sorted(SUITES))} (default all)")
+        parser.add_argument('--size', type=int, default=None, help="number of operations per suite")
+        parser.add_argument('--save-baseline', metavar='PATH', help="write the results to this JSON file")
+        parser.add_argument('--compare', metavar='PATH', help="fail when the results regressed against this baseline")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="allowed regression against the baseline, 0.2 is 20%% (default)")
+
+    def handle(self, *args, **options):
+        names = options['suites'] or sorted(SUITES)
+        unknown = set(names) - set(SUITES)
+        if unknown:
+            raise CommandError(f"unknown benchmark suites: {', '.join(sorted(unknown))}")
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"can't read the baseline {options['compare']}: {error}")
+
+        results = {}
+        for name in names:
+            kwargs = {} if options['size'] is None else {'size': options['size']}
+            with isolated_database(on_disk=SUITES[name].on_disk):
+                results[name] = SUITES[name](**kwargs)
+
+        self.stdout.write(json.dumps(results, indent=4))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=4)
+
+        if baseline is not None:
+            found = list(regressions(baseline, results, options['threshold']))
+            for path, metric, before, after, change in found:
+                self.stderr.write(f"{path} {metric}: {before} -> {after} ({change:+.0%} worse)")
+            if found:
+                raise CommandError(f"{len(found)} metrics regressed more than {options['threshold']:.0%} against {options['compare']}")
+            self.stderr.write(f"no regression against {options['compare']}")
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from elevator.history import COMPACTION_BATCH_SIZE, compact_requests, drop_archive
+
+
+class Command(BaseCommand):
+    help = "Moves the served user requests to the request archive and drops archived days past the retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=COMPACTION_BATCH_SIZE, help="requests moved per transaction")
+        parser.add_argument('--keep-days', type=int, default=None, help="drop the archived days older than this (default keep all)")
+
+    def handle(self, *args, **options):
+        moved = compact_requests(options['batch_size'])
+        self.stdout.write(f"moved {moved} served requests to the archive")
+
+        if options['keep_days'] is not None:
+            dropped = drop_archive(timezone.now().date() - timedelta(days=options['keep_days']))
+            self.stdout.write(f"dropped {dropped} archived requests older than {options['keep_days']} days")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from elevator.recovery import rebuild_state
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the cached elevator state, destinations and schedulers from the database"
+
+    def handle(self, *args, **options):
+        elevators, requests = rebuild_state()
+        self.stdout.write(f"rebuilt the state of {elevators} elevators with {requests} pending requests")
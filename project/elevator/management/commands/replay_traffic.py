@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from elevator.benchmarks import isolated_database
+from elevator.policies import POLICIES
+from elevator.replay import Replay
+from elevator.traffic import read_logs
+
+
+class Command(BaseCommand):
+    help = "Replays traffic logs (ELEVATOR_TRAFFIC_LOG) through the APIs on a throw-away database and reports latency per action"
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='+', help="traffic logs, the logs of several workers are merged by time")
+        parser.add_argument('--speed', type=float, default=0.0,
+                            help="0 replays as fast as possible (default), 1 at the recorded timing, 2 twice as fast")
+        parser.add_argument('--policy', choices=sorted(POLICIES), default=None,
+                            help="scheduling policy of every elevator (default the recorded ones)")
+        parser.add_argument('--tick-seconds', type=float, default=0.0,
+                            help="run a tick of the engine every that many recorded seconds (default none)")
+        parser.add_argument('--slowest', type=int, default=10, help="slowest calls listed in the report")
+        parser.add_argument('--on-disk', action='store_true', help="SQLite database in a file instead of in memory")
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0:
+            raise CommandError("--speed can't be negative")
+        with isolated_database(on_disk=options['on_disk']):
+            replay = Replay(speed=options['speed'], policy=options['policy'], tick_seconds=options['tick_seconds'],
+                            slowest=options['slowest'])
+            try:
+                report = replay.run(read_logs(options['logs']))
+            except (OSError, ValueError) as error:
+                raise CommandError(error)
+
+        self.stdout.write(json.dumps(report, indent=4))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from elevator.engine import TickEngine
+
+
+class Command(BaseCommand):
+    help = "Moves the elevators with pending requests one floor every tick, without clients calling the APIs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help="seconds between two ticks (default 1)")
+        parser.add_argument('--ticks', type=int, default=None, help="stop after this many ticks (default run forever)")
+
+    def handle(self, *args, **options):
+        def report(result, seconds):
+            self.stdout.write(f"{result['elevators']} elevators advanced, {result['moved']} moved, "
+                              f"{result['served']} requests served in {seconds * 1000:.1f} ms")
+            if 'compacted' in result:
+                self.stdout.write(f"moved {result['compacted']} served requests to the archive")
+
+        started = time.monotonic()
+        ticks = TickEngine().run(options['interval'], options['ticks'], report=report if options['verbosity'] > 1 else None)
+        self.stdout.write(f"{ticks} ticks in {time.monotonic() - started:.1f} s")
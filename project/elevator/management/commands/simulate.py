@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from elevator.benchmarks import isolated_database
+from elevator.policies import DEFAULT_POLICY, POLICIES
+from elevator.simulation import PATTERNS, HttpTransport, InProcessTransport, Simulation
+
+
+class Command(BaseCommand):
+    help = "Simulates passengers using the elevator APIs and reports wait and trip times with API throughput and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--passengers', type=int, default=1000)
+        parser.add_argument('--elevators', type=int, default=8)
+        parser.add_argument('--floors', type=int, default=30, help="floors above the ground floor")
+        parser.add_argument('--pattern', choices=PATTERNS, default='mixed')
+        parser.add_argument('--policy', choices=sorted(POLICIES), default=DEFAULT_POLICY, help="scheduling policy of the elevators")
+        parser.add_argument('--rate', type=float, default=1.0, help="passengers arriving per simulated second")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--server', default=None,
+                            help="base URL of a running server (e.g. http://127.0.0.1:8000), in process on a throw-away database otherwise")
+        parser.add_argument('--prefix', default='sim', help="prefix of the simulated elevator names")
+
+    def handle(self, *args, **options):
+        def simulate(transport):
+            return Simulation(transport, elevators=options['elevators'], floors=options['floors'], pattern=options['pattern'],
+                              rate=options['rate'], count=options['passengers'], seed=options['seed'],
+                              prefix=options['prefix'], policy=options['policy']).run()
+
+        if options['server']:
+            report = simulate(HttpTransport(options['server']))
+        else:
+            with isolated_database():
+                report = simulate(InProcessTransport())
+
+        self.stdout.write(json.dumps(report, indent=4))
+        if report['stalls']:
+            stalled = sorted({stall['elevator_name'] for stall in report['stalls']})
+            raise CommandError(f"{len(report['stalls'])} stalls, the APIs gave no stop to {', '.join(stalled)} with passengers to serve")
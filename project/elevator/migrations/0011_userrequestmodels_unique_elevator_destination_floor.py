@@ -0,0 +1,25 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:44
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_requests(apps, schema_editor):
+    UserRequestModels = apps.get_model('elevator', 'UserRequestModels')
+    keep = UserRequestModels.objects.values('elevator_id', 'destination_floor').annotate(keep_id=Min('id')).values('keep_id')
+    UserRequestModels.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elevator', '0010_alter_userrequestmodels_destination_floor'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_requests, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userrequestmodels',
+            constraint=models.UniqueConstraint(fields=('elevator', 'destination_floor'), name='unique_elevator_destination_floor'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elevator', '0011_userrequestmodels_unique_elevator_destination_floor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElevatorStateModels',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(blank=True, max_length=20, null=True)),
+                ('next_destination', models.IntegerField(blank=True, null=True)),
+                ('next_destinations', models.JSONField(blank=True, null=True)),
+                ('elevator', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='state', to='elevator.elevatorsmodel')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elevator', '0012_elevatorstatemodels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='elevatorsmodel',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elevator', '0013_elevatorsmodel_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='elevatorsmodel',
+            name='policy',
+            field=models.CharField(choices=[('look', 'LOOK'), ('scan', 'SCAN'), ('c_look', 'C-LOOK'), ('sstf', 'shortest seek first')], default='look', max_length=10),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elevator', '0014_elevatorsmodel_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestArchiveModels',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('elevator_id', models.IntegerField()),
+                ('elevator_name', models.CharField(max_length=100)),
+                ('destination_floor', models.IntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('served_at', models.DateTimeField()),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='userrequestmodels',
+            name='unique_elevator_destination_floor',
+        ),
+        migrations.AddField(
+            model_name='userrequestmodels',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='userrequestmodels',
+            name='served_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='userrequestmodels',
+            index=models.Index(condition=models.Q(('served_at__isnull', False)), fields=['served_at'], name='served_requests'),
+        ),
+        migrations.AddConstraint(
+            model_name='userrequestmodels',
+            constraint=models.UniqueConstraint(condition=models.Q(('served_at__isnull', True)), fields=('elevator', 'destination_floor'), name='unique_pending_elevator_destination_floor'),
+        ),
+        migrations.AddIndex(
+            model_name='requestarchivemodels',
+            index=models.Index(fields=['day', 'elevator_id'], name='archive_day_elevator'),
+        ),
+    ]
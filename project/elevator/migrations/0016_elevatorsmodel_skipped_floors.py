@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elevator', '0015_request_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='elevatorsmodel',
+            name='skipped_floors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
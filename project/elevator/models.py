@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -17,6 +18,13 @@ class ElevatorsModel(models.Model):
         ("OPEN", "opened"),
         ("CLOSE", "closed")
     )
+    # how the pending stops are ordered, see policies.py
+    SCHEDULING_POLICIES = (
+        ("look", "LOOK"),
+        ("scan", "SCAN"),
+        ("c_look", "C-LOOK"),
+        ("sstf", "shortest seek first"),
+    )
 
     elevator_name = models.CharField(max_length=100, unique=True)
     maintenance = models.BooleanField(default=False)
@@ -24,6 +32,21 @@ class ElevatorsModel(models.Model):
     first_floor = models.IntegerField()
     last_floor = models.IntegerField()
     door = models.CharField(max_length=10, choices=DOOR_STATUS)
+    policy = models.CharField(max_length=10, choices=SCHEDULING_POLICIES, default="look")
+    # floors between first_floor and last_floor the elevator doesn't stop at (express cars)
+    skipped_floors = models.JSONField(default=list, blank=True)
+    # bumped by every state transition, see state.claim_elevator
+    version = models.PositiveIntegerField(default=0)
+
+
+class PendingRequestManager(models.Manager):
+    """
+    Only the requests which are still waiting, served ones stay in the table
+    until compact_requests moves them to the archive
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(served_at__isnull=True)
 
 
 class UserRequestModels(models.Model):
@@ -33,4 +56,48 @@ class UserRequestModels(models.Model):
 
     elevator = models.ForeignKey(ElevatorsModel, on_delete=models.CASCADE)
     destination_floor = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    served_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PendingRequestManager()
+    history = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['elevator', 'destination_floor'], condition=models.Q(served_at__isnull=True),
+                                    name='unique_pending_elevator_destination_floor'),
+        ]
+        indexes = [
+            models.Index(fields=['served_at'], condition=models.Q(served_at__isnull=False), name='served_requests'),
+        ]
+
+
+class RequestArchiveModels(models.Model):
+    """
+    Append only log of the served requests, partitioned by the day they were
+    served. The elevator is not a foreign key so the history outlives it.
+    """
+
+    elevator_id = models.IntegerField()
+    elevator_name = models.CharField(max_length=100)
+    destination_floor = models.IntegerField()
+    created_at = models.DateTimeField()
+    served_at = models.DateTimeField()
+    day = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'elevator_id'], name='archive_day_elevator'),
+        ]
+
+
+class ElevatorStateModels(models.Model):
+    """
+    Model for the run time state of an elevator (direction and next stops),
+    the cache only keeps a copy of it
+    """
 
+    elevator = models.OneToOneField(ElevatorsModel, on_delete=models.CASCADE, related_name='state')
+    direction = models.CharField(max_length=20, null=True, blank=True)
+    next_destination = models.IntegerField(null=True, blank=True)
+    next_destinations = models.JSONField(null=True, blank=True)
@@ -0,0 +1,94 @@
+import bisect
+
+# Scheduling policies, they order the pending stops of one elevator into the
+# route it drives. Every policy gets the stops below and above the current
+# floor (sorted, a stop at the current floor is served already) and returns
+# the direction, the route and the floor where the car turns around.
+
+UP, DOWN, STAND_BY = 'moving up', 'moving down', 'stand_by'
+
+
+def split(stops, current_floor):
+    """
+    The sorted stops below and above the current floor, found with two binary
+    searches
+    """
+    return stops[:bisect.bisect_left(stops, current_floor)], stops[bisect.bisect_right(stops, current_floor):]
+
+
+def toward_nearest(current_floor, below, above):
+    # ties go up
+    if not below:
+        return UP
+    if not above:
+        return DOWN
+    return UP if above[0] - current_floor <= current_floor - below[-1] else DOWN
+
+
+# Logic for LOOK, serve every stop ahead and turn around at the last one
+def look(current_floor, direction, below, above, first_floor, last_floor):
+    if direction not in (UP, DOWN) or not (above if direction == UP else below):
+        direction = toward_nearest(current_floor, below, above)
+    if direction == UP:
+        return direction, above + below[::-1], above[-1]
+    return direction, below[::-1] + above, below[0]
+
+
+# Logic for SCAN, like LOOK but the car keeps going to the end of the shaft
+# before turning around for the stops behind it
+def scan(current_floor, direction, below, above, first_floor, last_floor):
+    if direction not in (UP, DOWN):
+        direction = toward_nearest(current_floor, below, above)
+    if direction == UP and current_floor >= last_floor:
+        direction = DOWN
+    elif direction == DOWN and current_floor <= first_floor:
+        direction = UP
+
+    if direction == UP:
+        ahead, behind, end = above, below[::-1], last_floor
+    else:
+        ahead, behind, end = below[::-1], above, first_floor
+    if behind and (not ahead or ahead[-1] != end):
+        ahead = ahead + [end]
+    return direction, ahead + behind, ahead[-1]
+
+
+# Logic for C-LOOK, serve the stops ahead then jump back to the farthest stop
+# behind and sweep in the same direction again
+def c_look(current_floor, direction, below, above, first_floor, last_floor):
+    if direction not in (UP, DOWN):
+        direction = toward_nearest(current_floor, below, above)
+    if direction == UP:
+        return direction, above + below, above[-1] if above else below[-1]
+    return direction, below[::-1] + above[::-1], below[0] if below else above[0]
+
+
+# Logic for shortest seek first, always the closest stop next. The served
+# stops are a range around the current floor, so the next one is always the
+# closest of the two stops next to that range
+def shortest_seek(current_floor, direction, below, above, first_floor, last_floor):
+    route = []
+    turn = None
+    position = current_floor
+    lower, upper = len(below) - 1, 0
+    while lower >= 0 or upper < len(above):
+        if upper == len(above) or (lower >= 0 and position - below[lower] < above[upper] - position):
+            floor = below[lower]
+            lower -= 1
+        else:
+            floor = above[upper]
+            upper += 1
+        if turn is None and route and (floor > position) != (route[0] > current_floor):
+            turn = position
+        route.append(floor)
+        position = floor
+    return (UP if route[0] > current_floor else DOWN), route, route[-1] if turn is None else turn
+
+
+POLICIES = {
+    'look': look,
+    'scan': scan,
+    'c_look': c_look,
+    'sstf': shortest_seek,
+}
+DEFAULT_POLICY = 'look'
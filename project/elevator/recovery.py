@@ -0,0 +1,86 @@
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import DatabaseError, connection
+
+from .destinations import get_destination_store
+from .instrumentation import cache
+from .models import ElevatorsModel, ElevatorStateModels, UserRequestModels
+from .registry import get_registry
+from .responses import get_response_cache
+from .scheduler import current_versions, install_scheduler
+from .state import ELEVATOR_COLUMNS, RUN_STATE_FIELDS, Elevator, elevator_key, run_state_key
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_state(overwrite=True):
+    """
+    Cold start: rebuilds the cached elevators and run state, the destinations,
+    the schedulers and the registry of every elevator from the database with
+    four queries, returns the number of elevators and of pending requests. Without overwrite
+    what a shared cache already holds is kept, another process may have newer
+    values than the ones just read.
+    """
+    elevators = [Elevator(*row) for row in ElevatorsModel.objects.values_list(*ELEVATOR_COLUMNS)]
+    floors = defaultdict(list)
+    for elevator_id, floor in UserRequestModels.objects.values_list('elevator_id', 'destination_floor'):
+        floors[elevator_id].append(floor)
+    states = {state[0]: state[1:] for state in ElevatorStateModels.objects.values_list('elevator_id', *RUN_STATE_FIELDS)}
+
+    values = {}
+    for elevator in elevators:
+        values[elevator_key(elevator.elevator_name)] = elevator
+        state = states.get(elevator.id, (None,) * len(RUN_STATE_FIELDS))
+        for field, value in zip(RUN_STATE_FIELDS, state):
+            values[run_state_key(field, elevator.elevator_name)] = value
+    if overwrite:
+        cache.set_many(values, timeout=None)
+    else:
+        for key, value in values.items():
+            cache.add(key, value, timeout=None)
+
+    store = get_destination_store()
+    versions = current_versions([elevator.id for elevator in elevators])
+    destinations = {} if overwrite else store.members_many(elevator.elevator_name for elevator in elevators if floors[elevator.id])
+    for elevator in elevators:
+        if overwrite:
+            store.replace(elevator.elevator_name, floors[elevator.id])
+        elif floors[elevator.id] and not destinations[elevator.elevator_name]:
+            store.add_many(elevator.elevator_name, floors[elevator.id])
+        install_scheduler(elevator.id, floors[elevator.id], versions[elevator.id])
+    get_registry().load()
+    get_response_cache().clear()
+
+    return len(elevators), sum(len(elevator_floors) for elevator_floors in floors.values())
+
+
+def warm_up():
+    """
+    rebuild_state for a starting server process, a database which isn't
+    migrated yet only logs a warning
+    """
+    try:
+        elevators, requests = rebuild_state(overwrite=False)
+    except DatabaseError as error:
+        logger.warning("elevator state not rebuilt: %s", error)
+        return
+    logger.info("elevator state rebuilt for %s elevators with %s pending requests", elevators, requests)
+
+
+def warm_up_in_thread():
+    """
+    warm_up in a thread of its own, for the servers importing the application
+    inside their event loop (uvicorn) where the ORM refuses to run. Returns
+    once the state is rebuilt.
+    """
+    def run():
+        try:
+            warm_up()
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run, name='elevator-warm-up')
+    thread.start()
+    thread.join()
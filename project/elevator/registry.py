@@ -0,0 +1,122 @@
+from threading import Lock
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .instrumentation import cache
+from .models import ElevatorsModel
+from .scheduler import new_version
+
+# What the user requests are validated against before anything else is read:
+# the floors every elevator stops at and whether it is under maintenance, for
+# the whole fleet in this process. It is loaded with one query and loaded
+# again once the version in the cache changed, every write to those columns
+# (and every install or delete) sets a new version when it commits, so the
+# registries of the other processes follow.
+
+REGISTRY_VERSION_KEY = 'elevator_registry_version'
+REGISTRY_COLUMNS = ('id', 'elevator_name', 'first_floor', 'last_floor', 'skipped_floors', 'maintenance')
+
+
+class ElevatorRecord:
+    """
+    Immutable metadata of one elevator, served is a bitmap of the floors it
+    stops at with one bit per floor from first_floor on
+    """
+    __slots__ = ('id', 'elevator_name', 'first_floor', 'last_floor', 'served', 'maintenance')
+
+    def __init__(self, id, elevator_name, first_floor, last_floor, skipped_floors, maintenance):
+        served = bytearray(b'\xff' * ((last_floor - first_floor) // 8 + 1)) if last_floor >= first_floor else bytearray()
+        for floor in skipped_floors or ():
+            if first_floor <= floor <= last_floor:
+                offset = floor - first_floor
+                served[offset >> 3] &= ~(1 << (offset & 7))
+        for name, value in zip(self.__slots__, (id, elevator_name, first_floor, last_floor, bytes(served), maintenance)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def serves(self, floor):
+        # bool is an int subclass, True isn't floor 1
+        if type(floor) is not int or not self.first_floor <= floor <= self.last_floor:
+            return False
+        offset = floor - self.first_floor
+        return bool(self.served[offset >> 3] >> (offset & 7) & 1)
+
+    def __repr__(self):
+        return f'<ElevatorRecord: {self.elevator_name}>'
+
+
+class ElevatorRegistry:
+
+    def __init__(self):
+        self.records = {}
+        self.version = None
+        self.lock = Lock()
+
+    def current_version(self, version):
+        # a cold cache gets a version, every process loads once for it
+        if version is None:
+            cache.add(REGISTRY_VERSION_KEY, new_version(), timeout=None)
+            version = cache.get(REGISTRY_VERSION_KEY)
+        return version
+
+    def load(self, version=None):
+        """
+        Reads the metadata of every elevator with one query
+        """
+        version = self.current_version(version if version is not None else cache.get(REGISTRY_VERSION_KEY))
+        records = {row[1]: ElevatorRecord(*row) for row in ElevatorsModel.objects.values_list(*REGISTRY_COLUMNS)}
+        with self.lock:
+            self.records, self.version = records, version
+        return len(records)
+
+    def get(self, elevator_name):
+        """
+        The record of the elevator, None if it doesn't exists
+        """
+        version = cache.get(REGISTRY_VERSION_KEY)
+        if version is None or version != self.version:
+            self.load(version)
+        return self.records.get(elevator_name) if isinstance(elevator_name, str) else None
+
+    def get_many(self, elevator_names):
+        """
+        {elevator_name: record} of the elevators which exist
+        """
+        self.get(None)
+        records = self.records
+        return {name: records[name] for name in elevator_names if name in records}
+
+
+_registry = ElevatorRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def lookup_elevator(elevator_name):
+    return _registry.get(elevator_name)
+
+
+def elevators_changed():
+    """
+    Every registry loads the fleet again once the current transaction
+    committed, for writes which send no model signal (update() and
+    bulk_create())
+    """
+    transaction.on_commit(lambda: cache.set(REGISTRY_VERSION_KEY, new_version(), timeout=None))
+
+
+def elevator_written(sender, **kwargs):
+    elevators_changed()
+
+
+def install():
+    post_save.connect(elevator_written, sender=ElevatorsModel, dispatch_uid='elevator_registry_save')
+    post_delete.connect(elevator_written, sender=ElevatorsModel, dispatch_uid='elevator_registry_delete')
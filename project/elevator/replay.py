@@ -0,0 +1,162 @@
+import heapq
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .benchmarks import Client, summarize
+from .engine import TickEngine
+from .models import ElevatorsModel, ElevatorStateModels, RequestArchiveModels, UserRequestModels
+from .recovery import rebuild_state
+from .traffic import FLEET, ROUTES
+
+# Re-executes a traffic log (see traffic.py) through the APIs on an empty
+# database, one call after the other in the order they were recorded, so two
+# replays of a log with the same code and policies end in the same state.
+# As fast as possible, or at the recorded timing scaled by speed, which shows
+# whether a latency spike comes back with the same traffic.
+
+FLEET_FIELDS = ('elevator_name', 'maintenance', 'current_floor', 'first_floor', 'last_floor', 'door', 'policy',
+                'skipped_floors')
+INSTALL_ACTION = 'InitializeElevators.install_elevator'
+# a call of a replay at the recorded timing starting later than this is late
+LATE_SECONDS = 0.001
+
+
+def restore_fleet(fleet, policy=None):
+    """
+    Installs the elevators of a fleet record with their pending floors and
+    run state (the logs written before it was recorded have none) and
+    rebuilds their state, policy replaces the policy of every elevator
+    """
+    ElevatorsModel.objects.bulk_create([
+        ElevatorsModel(**{field: elevator[field] for field in FLEET_FIELDS}) for elevator in with_policy(fleet, policy)])
+    ids = dict(ElevatorsModel.objects.values_list('elevator_name', 'id'))
+    UserRequestModels.objects.bulk_create([
+        UserRequestModels(elevator_id=ids[elevator['elevator_name']], destination_floor=floor)
+        for elevator in fleet for floor in elevator['pending']])
+    ElevatorStateModels.objects.bulk_create([
+        ElevatorStateModels(elevator_id=ids[elevator['elevator_name']], **elevator['state'])
+        for elevator in fleet if elevator.get('state')])
+    rebuild_state()
+
+
+def with_policy(body, policy):
+    """
+    The elevators of an install body (or of a fleet) with the policy, policy
+    None keeps theirs
+    """
+    if not policy:
+        return body
+    if isinstance(body, dict):
+        return {**body, 'policy': policy}
+    if isinstance(body, list):
+        return [with_policy(elevator, policy) for elevator in body]
+    return body
+
+
+class Replay:
+    """
+    speed 0 replays as fast as possible, 1 at the recorded timing, 2 twice as
+    fast. tick_seconds runs a tick of the engine every that many recorded
+    seconds, for logs of servers moving the cars with the tick engine.
+    """
+
+    def __init__(self, speed=0.0, policy=None, tick_seconds=0.0, slowest=10):
+        self.client = Client()
+        self.speed = speed
+        self.policy = policy
+        self.tick_seconds = tick_seconds
+        self.slowest = slowest
+        # rejected calls are part of the traffic, don't log every one of them
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    def call(self, logged):
+        method, path = ROUTES[logged.action]
+        if '{pk}' in path:
+            pk = ElevatorsModel.objects.filter(elevator_name=logged.elevator_name).values_list('id', flat=True).first()
+            if pk is None:
+                return None
+            path = path.format(pk=pk)
+        body = logged.body
+        if logged.action == INSTALL_ACTION:
+            body = with_policy(body, self.policy)
+        return self.client.generic(method, f'/api/{path}', json.dumps(body), content_type='application/json').status_code
+
+    def run(self, calls):
+        durations, queries, statuses = {}, {}, {}
+        slowest, lags = [], []
+        fleets = skipped_fleets = ticks = 0
+        engine = TickEngine() if self.tick_seconds > 0 else None
+        first_at = next_tick = None
+        calls_made = 0
+        started = time.perf_counter()
+
+        for logged in calls:
+            if logged.action == FLEET:
+                # every process appends the fleet it saw when it opened its log, only the first one is a starting point
+                if fleets or first_at is not None:
+                    skipped_fleets += 1
+                else:
+                    restore_fleet(logged.body, self.policy)
+                fleets += 1
+                continue
+
+            if first_at is None:
+                first_at, next_tick = logged.at, self.tick_seconds
+            offset = logged.at - first_at
+            while engine is not None and next_tick <= offset:
+                engine.tick()
+                ticks += 1
+                next_tick += self.tick_seconds
+            if self.speed > 0:
+                wait = offset / self.speed - (time.perf_counter() - started)
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    lags.append(-wait)
+
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                status = self.call(logged)
+                duration = time.perf_counter() - start
+            status = 'missing_elevator' if status is None else status
+            calls_made += 1
+            durations.setdefault(logged.action, []).append(duration)
+            queries[logged.action] = queries.get(logged.action, 0) + len(captured)
+            counts = statuses.setdefault(logged.action, {})
+            counts[status] = counts.get(status, 0) + 1
+            entry = (duration, offset, calls_made, logged.action, status)
+            if len(slowest) < self.slowest:
+                heapq.heappush(slowest, entry)
+            elif slowest and entry > slowest[0]:
+                heapq.heapreplace(slowest, entry)
+
+        elapsed = time.perf_counter() - started
+        actions = {}
+        for action, action_durations in durations.items():
+            actions[action] = summarize(action_durations, queries[action])
+            actions[action]["statuses"] = {str(status): count for status, count in sorted(statuses[action].items(), key=str)}
+        report = {
+            "calls": calls_made,
+            "seconds": round(elapsed, 3),
+            "calls_per_sec": round(calls_made / elapsed, 1) if elapsed else 0.0,
+            "recorded_seconds": round(offset, 3) if first_at is not None else 0.0,
+            "fleets_skipped": skipped_fleets,
+            "engine_ticks": ticks,
+            "actions": actions,
+            "slowest": [{"at": datetime.fromtimestamp(first_at + offset, timezone.utc).isoformat(), "action": action,
+                         "ms": round(duration * 1000, 3), "status": status}
+                        for duration, offset, _, action, status in sorted(slowest, reverse=True)],
+            "elevators": ElevatorsModel.objects.count(),
+            "pending_requests": UserRequestModels.objects.count(),
+            "served_requests": UserRequestModels.history.filter(served_at__isnull=False).count() + RequestArchiveModels.objects.count(),
+        }
+        if self.speed > 0:
+            ordered = sorted(lags) or [0.0]
+            report["late_calls"] = sum(lag > LATE_SECONDS for lag in lags)
+            report["lag_p99_ms"] = round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3)
+        return report
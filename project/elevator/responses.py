@@ -0,0 +1,148 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+# Read-through cache of the responses of the GET actions (get_current_floor,
+# check_maintenance_status, fetch_all_requests) per elevator, in this process.
+# Every write to an elevator drops its responses (publish_state and the
+# install views call invalidate_responses), the TTL bounds how long a
+# response stays stale after a write made by another process. Once
+# max_entries are held the least recently used response is evicted.
+
+CACHED_ACTIONS = ('get_current_floor', 'check_maintenance_status', 'fetch_all_requests')
+
+
+class ResponseCache:
+    """
+    Bounded LRU map of (action, elevator_name) -> response payload, every
+    payload expires after ttl seconds
+    """
+
+    def __init__(self, max_entries, ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # (action, elevator_name) -> (expires, payload)
+        self.lock = Lock()
+        self.stats = dict.fromkeys(('hits', 'misses', 'expired', 'evicted', 'invalidated'), 0)
+        # bumped by every invalidation, a response built while the state
+        # changed under it isn't kept
+        self.generation = 0
+
+    def get(self, action, elevator_name):
+        key = (action, elevator_name)
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, action, elevator_name, payload, generation=None):
+        key = (action, elevator_name)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (self.clock() + self.ttl, payload)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def invalidate(self, *elevator_names):
+        with self.lock:
+            self.generation += 1
+            for elevator_name in elevator_names:
+                for action in CACHED_ACTIONS:
+                    if self.entries.pop((action, elevator_name), None) is not None:
+                        self.stats['invalidated'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.stats['invalidated'] += len(self.entries)
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def render(self):
+        """
+        The size and the counters in the Prometheus text exposition format
+        """
+        with self.lock:
+            stats, entries = dict(self.stats), len(self.entries)
+        lines = [
+            "# HELP elevator_response_cache_entries Responses of the GET actions held in this process",
+            "# TYPE elevator_response_cache_entries gauge",
+            f"elevator_response_cache_entries {entries}",
+            "# HELP elevator_response_cache_max_entries Responses held before the least recently used one is evicted",
+            "# TYPE elevator_response_cache_max_entries gauge",
+            f"elevator_response_cache_max_entries {self.max_entries}",
+            "# HELP elevator_response_cache_total Lookups (hits, misses) and dropped responses (expired, evicted, invalidated)",
+            "# TYPE elevator_response_cache_total counter",
+        ]
+        lines += [f'elevator_response_cache_total{{result="{result}"}} {count}' for result, count in stats.items()]
+        return '\n'.join(lines) + '\n'
+
+
+_responses = None
+
+
+def get_response_cache():
+    global _responses
+    if _responses is None:
+        _responses = ResponseCache(settings.ELEVATOR_RESPONSE_CACHE_ENTRIES, settings.ELEVATOR_RESPONSE_CACHE_SECONDS)
+    return _responses
+
+
+def reset_response_cache():
+    global _responses
+    _responses = None
+
+
+def cached_response(action, elevator_name, build):
+    """
+    The payload of the action for the elevator from the cache, a miss calls
+    build(), only successful payloads are kept
+    """
+    if settings.ELEVATOR_RESPONSE_CACHE_SECONDS <= 0 or not isinstance(elevator_name, str):
+        return build()
+    responses = get_response_cache()
+    payload = responses.get(action, elevator_name)
+    if payload is None:
+        generation = responses.generation
+        payload = build()
+        if payload.get("success") is True:
+            responses.put(action, elevator_name, payload, generation)
+    return payload
+
+
+async def acached_response(action, elevator_name, build):
+    """
+    Async version of cached_response, build is a coroutine function
+    """
+    if settings.ELEVATOR_RESPONSE_CACHE_SECONDS <= 0 or not isinstance(elevator_name, str):
+        return await build()
+    responses = get_response_cache()
+    payload = responses.get(action, elevator_name)
+    if payload is None:
+        generation = responses.generation
+        payload = await build()
+        if payload.get("success") is True:
+            responses.put(action, elevator_name, payload, generation)
+    return payload
+
+
+def invalidate_responses(*elevator_names):
+    if _responses is not None:
+        _responses.invalidate(*elevator_names)
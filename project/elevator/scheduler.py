@@ -0,0 +1,179 @@
+import bisect
+import uuid
+from collections import namedtuple
+from threading import Lock
+
+from .instrumentation import cache
+from .models import UserRequestModels
+from .policies import DEFAULT_POLICY, POLICIES, split
+
+
+Plan = namedtuple('Plan', ['destinations', 'next_destination', 'final_destination',
+                           'moving_direction_final_destination', 'current_direction', 'pending'])
+
+
+class ElevatorScheduler:
+    """
+    Keeps the pending stops of one elevator in a sorted list so the next stop
+    is found with a binary search instead of re-reading the user requests
+    """
+
+    def __init__(self, floors=()):
+        self.stops = sorted(set(floors))
+        self.lock = Lock()
+        self.version = None
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __contains__(self, floor):
+        index = bisect.bisect_left(self.stops, floor)
+        return index < len(self.stops) and self.stops[index] == floor
+
+    def add_stop(self, floor):
+        with self.lock:
+            index = bisect.bisect_left(self.stops, floor)
+            if index == len(self.stops) or self.stops[index] != floor:
+                self.stops.insert(index, floor)
+
+    def remove_stop(self, floor):
+        with self.lock:
+            index = bisect.bisect_left(self.stops, floor)
+            if index < len(self.stops) and self.stops[index] == floor:
+                del self.stops[index]
+
+    def next_stop_up(self, floor):
+        index = bisect.bisect_right(self.stops, floor)
+        return self.stops[index] if index < len(self.stops) else None
+
+    def next_stop_down(self, floor):
+        index = bisect.bisect_left(self.stops, floor)
+        return self.stops[index - 1] if index else None
+
+    # Logic for planning the route from the current floor
+    def plan(self, current_floor, direction, first_floor, last_floor, policy=DEFAULT_POLICY):
+        with self.lock:
+            if not self.stops:
+                return Plan(None, None, None, None, 'stand_by', [])
+            below, above = split(self.stops, current_floor)
+
+        # the only stop is the current floor, it is served already
+        if not below and not above:
+            return Plan([], None, None, None, 'stand_by', [])
+
+        direction, route, turn = POLICIES[policy](current_floor, direction, below, above, first_floor, last_floor)
+        return Plan(route, route[0], route[-1], turn, direction, below + above)
+
+
+# The schedulers live in every process, a version counter per elevator in the
+# cache tells a process that another one changed the stops so it reloads them
+# from the user requests. The stops are only shared between processes when
+# the cache is (see CACHES in settings).
+_schedulers = {}
+_schedulers_lock = Lock()
+
+
+def stops_version_key(elevator_id):
+    return f'stops_version_{elevator_id}'
+
+
+def new_version():
+    # a random start, a counter created again after an eviction never comes
+    # back to a version a process still holds (62 bits fit a Redis integer)
+    return uuid.uuid4().int >> 66
+
+
+def current_versions(elevator_ids):
+    """
+    Returns the version of the stops of every elevator, the missing ones (a
+    cold cache) get a new version
+    """
+    keys = {elevator_id: stops_version_key(elevator_id) for elevator_id in elevator_ids}
+    versions = cache.get_many(list(keys.values()))
+    missing = [elevator_id for elevator_id, key in keys.items() if key not in versions]
+    for elevator_id in missing:
+        cache.add(keys[elevator_id], new_version(), timeout=None)
+    if missing:
+        versions.update(cache.get_many([keys[elevator_id] for elevator_id in missing]))
+    return {elevator_id: versions.get(key) for elevator_id, key in keys.items()}
+
+
+def install_scheduler(elevator_id, floors, version):
+    scheduler = ElevatorScheduler(floors)
+    scheduler.version = version
+    with _schedulers_lock:
+        _schedulers[elevator_id] = scheduler
+    return scheduler
+
+
+def is_current(scheduler, version):
+    return scheduler is not None and version is not None and scheduler.version == version
+
+
+def get_scheduler(elevator):
+    """
+    Returns the scheduler of the elevator, (re)loading its pending stops from
+    the user requests when this process hasn't got the latest ones
+    """
+    return get_schedulers([elevator])[0]
+
+
+def get_schedulers(elevators):
+    """
+    Returns the schedulers of many elevators, the ones which are missing or
+    outdated in this process are loaded together with one query
+    """
+    versions = current_versions([elevator.id for elevator in elevators])
+    schedulers = {elevator.id: _schedulers.get(elevator.id) for elevator in elevators}
+    outdated = [elevator_id for elevator_id, scheduler in schedulers.items() if not is_current(scheduler, versions[elevator_id])]
+    if outdated:
+        floors = {elevator_id: [] for elevator_id in outdated}
+        requests = UserRequestModels.objects.filter(elevator_id__in=outdated).values_list('elevator_id', 'destination_floor')
+        for elevator_id, floor in requests:
+            floors[elevator_id].append(floor)
+        for elevator_id, elevator_floors in floors.items():
+            schedulers[elevator_id] = install_scheduler(elevator_id, elevator_floors, versions[elevator_id])
+    return [schedulers[elevator.id] for elevator in elevators]
+
+
+def stops_changed(elevator, scheduler):
+    """
+    Publishes a new version of the stops once this process changed them. The
+    version is a counter bumped atomically, the scheduler stays current only
+    when the bump follows its own version, i.e. no other process changed the
+    stops in between.
+    """
+    key = stops_version_key(elevator.id)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # evicted, a new counter makes every process reload the stops
+        cache.add(key, new_version(), timeout=None)
+        return
+    if scheduler.version == version - 1:
+        scheduler.version = version
+
+
+def add_stops(elevator, floors):
+    scheduler = get_scheduler(elevator)
+    for floor in floors:
+        scheduler.add_stop(floor)
+    stops_changed(elevator, scheduler)
+
+
+def remove_stops(elevator, floors):
+    scheduler = get_scheduler(elevator)
+    for floor in floors:
+        scheduler.remove_stop(floor)
+    stops_changed(elevator, scheduler)
+
+
+def drop_scheduler(elevator_id):
+    with _schedulers_lock:
+        _schedulers.pop(elevator_id, None)
+    cache.delete(stops_version_key(elevator_id))
+
+
+def reset_schedulers():
+    with _schedulers_lock:
+        _schedulers.clear()
@@ -1,14 +1,79 @@
+from operator import attrgetter
+
 from rest_framework.serializers import ModelSerializer
 from rest_framework import serializers
 from .models import ElevatorsModel, DoorStatus, UserRequestModels
 
+
+class FieldPlan:
+    """
+    The concrete fields of a model compiled once into a single attrgetter,
+    dumps a model instance (or any object with the same attributes) to the
+    dict a ModelSerializer would return for plain columns
+    """
+    __slots__ = ('names', 'getter')
+
+    def __init__(self, model, exclude=()):
+        fields = [field for field in model._meta.concrete_fields if field.name not in exclude]
+        self.names = tuple(field.name for field in fields)
+        getter = attrgetter(*(field.attname for field in fields))
+        self.getter = getter if len(fields) > 1 else lambda instance: (getter(instance),)
+
+    def dump(self, instance):
+        return dict(zip(self.names, self.getter(instance)))
+
+    def dump_many(self, instances):
+        names, getter = self.names, self.getter
+        return [dict(zip(names, getter(instance))) for instance in instances]
+
+
+ELEVATOR_FIELDS = FieldPlan(ElevatorsModel, exclude=("version",))
+
+
+def validate_skipped_floors(attrs, instance=None):
+    """
+    The skipped floors should be integers between the first and the last
+    floor of the elevator, returned sorted without duplicates
+    """
+    skipped_floors = attrs.get('skipped_floors', getattr(instance, 'skipped_floors', []))
+    first_floor = attrs.get('first_floor', getattr(instance, 'first_floor', None))
+    last_floor = attrs.get('last_floor', getattr(instance, 'last_floor', None))
+    if not isinstance(skipped_floors, list) or not all(type(floor) is int for floor in skipped_floors):
+        raise serializers.ValidationError({"skipped_floors": ["skipped floors should be a list of floors"]})
+    if any(not first_floor <= floor <= last_floor for floor in skipped_floors):
+        raise serializers.ValidationError({"skipped_floors": [f"skipped floors should be between {first_floor} and {last_floor}"]})
+    if 'skipped_floors' in attrs:
+        attrs['skipped_floors'] = sorted(set(skipped_floors))
+    return attrs
+
+
 class ElevatorSerializer(ModelSerializer):
     """
-    Serializer for initializing the elevators
+    Serializer for initializing the elevators, the output goes through
+    ELEVATOR_FIELDS instead of the serializer fields
     """
     class Meta:
         model = ElevatorsModel
-        fields = "__all__"
+        exclude = ("version",)
+
+    def validate(self, attrs):
+        return validate_skipped_floors(attrs, self.instance)
+
+    def to_representation(self, instance):
+        return ELEVATOR_FIELDS.dump(instance)
+
+class ElevatorInstallSerializer(ModelSerializer):
+    """
+    Serializer for installing elevators in bulk, uniqueness of the names is
+    checked once for the whole batch instead of once per elevator
+    """
+    class Meta:
+        model = ElevatorsModel
+        exclude = ("version",)
+        extra_kwargs = {"elevator_name": {"validators": []}}
+
+    def validate(self, attrs):
+        return validate_skipped_floors(attrs)
 
 class DoorChoicesSerializer(ModelSerializer):
     """
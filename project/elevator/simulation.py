@@ -0,0 +1,245 @@
+import heapq
+import http.client
+import itertools
+import json
+import logging
+import random
+import statistics
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.urls import resolve
+
+from .dispatch import FLOOR_TRAVEL_TIME, STOP_TIME
+from .policies import DEFAULT_POLICY, POLICIES
+
+# Discrete-event simulation of passengers using the elevator APIs. Simulated
+# time jumps from event to event, so only the API calls cost real time: every
+# hall call goes through hall_call, every stop through next_destinations and
+# reach_next_destination and the floors chosen inside the car through
+# save_user_requests.
+
+PATTERNS = ('up_peak', 'down_peak', 'inter_floor', 'mixed')
+
+
+class InProcessTransport:
+    """
+    Calls the DRF views of the APIs straight away, no server needed. The
+    test client, the middleware and the JSON rendering of the response are
+    skipped, they cost a third of a call.
+    """
+
+    def __init__(self):
+        from rest_framework.test import APIRequestFactory
+        self.factory = APIRequestFactory()
+        self.matches = {}
+        # rejected calls are part of the traffic, don't log every one of them
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    def call(self, method, path, body):
+        path = f'/api/{path}'
+        match = self.matches.get(path)
+        if match is None:
+            match = self.matches[path] = resolve(path)
+        request = self.factory.generic(method, path, json.dumps(body), content_type='application/json')
+        request.resolver_match = match
+        response = match.func(request, *match.args, **match.kwargs)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{method} {path} failed with {response.status_code}")
+        return response.data
+
+
+class HttpTransport:
+    """
+    Calls the APIs of a running server over one keep-alive connection
+    """
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.prefix = url.path.rstrip('/')
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.netloc)
+
+    def call(self, method, path, body):
+        self.connection.request(method, f'{self.prefix}/api/{path}', json.dumps(body), {"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        data = response.read()
+        if response.status >= 500:
+            raise RuntimeError(f"{method} {path} failed with {response.status}")
+        return json.loads(data) if data else None
+
+
+class TimedTransport:
+    """
+    Records the latency of every call per API
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.latencies = defaultdict(list)
+
+    def call(self, method, path, body):
+        start = time.perf_counter()
+        data = self.transport.call(method, path, body)
+        self.latencies[path].append(time.perf_counter() - start)
+        return data
+
+
+def passengers(pattern, rate, count, floors, rng):
+    """
+    Poisson arrivals of (time, origin, destination), rate passengers per second
+    """
+    clock = 0.0
+    for _ in range(count):
+        clock += rng.expovariate(rate)
+        kind = rng.choice(('up_peak', 'down_peak', 'inter_floor')) if pattern == 'mixed' else pattern
+        if kind == 'up_peak':
+            origin, destination = 0, rng.randint(1, floors)
+        elif kind == 'down_peak':
+            origin, destination = rng.randint(1, floors), 0
+        else:
+            origin, destination = rng.sample(range(floors + 1), 2)
+        yield clock, origin, destination
+
+
+class Simulation:
+
+    def __init__(self, transport, elevators=8, floors=30, pattern='mixed', rate=1.0, count=1000, seed=0, prefix='sim',
+                 policy=DEFAULT_POLICY):
+        if pattern not in PATTERNS:
+            raise ValueError(f"pattern should be one of {', '.join(PATTERNS)}")
+        if policy not in POLICIES:
+            raise ValueError(f"policy should be one of {', '.join(POLICIES)}")
+        self.transport = TimedTransport(transport)
+        self.floors = floors
+        self.policy = policy
+        self.names = [f"{prefix}{index}" for index in range(elevators)]
+        self.arrivals = passengers(pattern, rate, count, floors, random.Random(seed))
+        self.events = []
+        self.sequence = itertools.count()
+        self.hall_calls = {}  # (floor, direction) -> elevator serving the lit hall call
+        self.waiting = defaultdict(list)  # (floor, direction) -> [(arrival time, destination)]
+        self.riders = {name: defaultdict(list) for name in self.names}  # destination -> [arrival time]
+        self.positions = {name: 0 for name in self.names}
+        self.busy = set()
+        self.waits, self.trips = [], []
+        self.travelled = 0
+        self.stalls = []
+
+    def schedule(self, at, kind, *payload):
+        heapq.heappush(self.events, (at, next(self.sequence), kind, payload))
+
+    def install(self):
+        self.transport.call('POST', 'install/install_elevator/', [
+            {"elevator_name": name, "current_floor": 0, "first_floor": 0, "last_floor": self.floors, "door": "CLOSE",
+             "policy": self.policy}
+            for name in self.names])
+
+    def next_arrival(self):
+        arrival = next(self.arrivals, None)
+        if arrival is not None:
+            self.schedule(arrival[0], 'arrival', arrival[1], arrival[2])
+
+    def arrival(self, now, origin, destination):
+        self.next_arrival()
+        key = (origin, 'up' if destination > origin else 'down')
+        self.waiting[key].append((now, destination))
+        if key in self.hall_calls:  # the button is already lit, nothing to send
+            return
+
+        response = self.transport.call('POST', 'userrequests/hall_call/', {"floor": origin, "direction": key[1]})
+        name = response["elevator_name"]
+        self.hall_calls[key] = name
+        self.wake(now, name)
+
+    def wake(self, now, name):
+        if name not in self.busy:
+            self.busy.add(name)
+            self.schedule(now, 'move', name)
+
+    def move(self, now, name):
+        # somebody is waiting at (or riding to) the floor the car is standing at
+        if self.serves(name, self.positions[name]):
+            self.transport.call('POST', 'elevator/destination_reached/', {"elevator_name": name, "current_floor": self.positions[name]})
+            return self.stop(now, name, self.positions[name])
+
+        plan = self.transport.call('POST', 'elevator/next_destinations/', {"elevator_name": name})
+        current_floor, next_destination = plan.get("current_floor"), plan.get("next_destination")
+
+        reached = self.transport.call('POST', 'elevator/reach_next_destination/', {"elevator_name": name})
+        if next_destination is not None and reached.get("success"):
+            self.travelled += abs(next_destination - current_floor)
+            return self.schedule(now + abs(next_destination - current_floor) * FLOOR_TRAVEL_TIME, 'stop', name, next_destination)
+
+        self.busy.discard(name)
+        if self.has_work(name):
+            # the API has no stop left for passengers the car still owes, a
+            # failure of the scheduler, the car only moves again for a new call
+            self.stalls.append({"simulated_seconds": round(now, 1), "elevator_name": name,
+                                "riders": sum(len(riders) for riders in self.riders[name].values())})
+
+    def stop(self, now, name, floor):
+        self.positions[name] = floor
+        for arrived in self.riders[name].pop(floor, ()):
+            self.trips.append(now - arrived)
+
+        boarded = []
+        for direction in ('up', 'down'):
+            key = (floor, direction)
+            if self.hall_calls.get(key) == name:
+                del self.hall_calls[key]
+                for arrived, destination in self.waiting.pop(key, ()):
+                    self.waits.append(now - arrived)
+                    self.riders[name][destination].append(arrived)
+                    boarded.append(destination)
+
+        if boarded:
+            self.transport.call('POST', 'userrequests/save_user_requests/',
+                                [{"elevator_name": name, "floor": destination} for destination in set(boarded)])
+
+        self.schedule(now + STOP_TIME, 'move', name)
+
+    def has_work(self, name):
+        return bool(self.riders[name]) or name in self.hall_calls.values()
+
+    def serves(self, name, floor):
+        return floor in self.riders[name] or name in (self.hall_calls.get((floor, 'up')), self.hall_calls.get((floor, 'down')))
+
+    def run(self):
+        self.install()
+        self.next_arrival()
+        started = time.perf_counter()
+        now = 0.0
+        while self.events:
+            now, _, kind, payload = heapq.heappop(self.events)
+            getattr(self, kind)(now, *payload)
+        return self.report(now, time.perf_counter() - started)
+
+    def report(self, simulated, elapsed):
+        calls = sum(len(latencies) for latencies in self.transport.latencies.values())
+
+        def percentile(values, fraction):
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+        return {
+            "passengers_served": len(self.trips),
+            "passengers_waiting": sum(len(waiting) for waiting in self.waiting.values()),
+            "passengers_riding": sum(len(riders) for cars in self.riders.values() for riders in cars.values()),
+            "average_wait_seconds": round(statistics.fmean(self.waits), 2) if self.waits else None,
+            "p95_wait_seconds": round(percentile(self.waits, 0.95), 2) if self.waits else None,
+            "average_trip_seconds": round(statistics.fmean(self.trips), 2) if self.trips else None,
+            "floors_travelled": self.travelled,
+            "simulated_seconds": round(simulated, 1),
+            "wall_seconds": round(elapsed, 2),
+            "api_calls": calls,
+            "api_calls_per_second": round(calls / elapsed, 1) if elapsed else None,
+            "stalls": self.stalls,
+            "api_latency_ms": {
+                path: {"calls": len(latencies),
+                       "p50": round(statistics.median(latencies) * 1000, 3),
+                       "p99": round(percentile(latencies, 0.99) * 1000, 3)}
+                for path, latencies in sorted(self.transport.latencies.items())
+            },
+        }
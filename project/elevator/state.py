@@ -0,0 +1,323 @@
+import zlib
+from operator import attrgetter
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .instrumentation import cache
+from .models import ElevatorsModel, ElevatorStateModels
+from .serializers import ELEVATOR_FIELDS
+
+# direction, next_destination and next_destinations of every elevator are
+# kept in the elevator state table and copied to the cache under the keys
+# the views always used (direction_e1, next_destination_e1, ...)
+RUN_STATE_FIELDS = ('direction', 'next_destination', 'next_destinations')
+MISSING = object()
+
+
+ELEVATOR_COLUMNS = tuple(field.attname for field in ElevatorsModel._meta.concrete_fields)
+# part of the cache key, an Elevator cached before a migration added or
+# removed a column is never read back into the new slots
+ELEVATOR_SCHEMA = zlib.crc32(' '.join(ELEVATOR_COLUMNS).encode())
+
+
+class Elevator:
+    """
+    One elevator row, what get_elevator caches and returns instead of a model
+    instance: the columns in slots, nothing else, so the cache pickles a
+    tuple instead of the instance and its ModelState
+    """
+    __slots__ = ELEVATOR_COLUMNS
+    columns = attrgetter(*ELEVATOR_COLUMNS)
+
+    def __init__(self, *values):
+        for name, value in zip(ELEVATOR_COLUMNS, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def of(cls, instance):
+        return cls(*cls.columns(instance))
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __getstate__(self):
+        return self.columns(self)
+
+    def __setstate__(self, values):
+        for name, value in zip(ELEVATOR_COLUMNS, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f'<Elevator: {self.elevator_name}>'
+
+
+def elevator_key(elevator_name):
+    return f'elevator_{ELEVATOR_SCHEMA:x}_{elevator_name}'
+
+
+def get_elevator(elevator_name, request=None):
+    """
+    Returns the elevator (an Elevator) by name from the request, then from the
+    cache and only then from the database, None if it doesn't exists
+    """
+    elevators = getattr(request, 'elevators', None) if request is not None else None
+    if elevators is not None and elevator_name in elevators:
+        return elevators[elevator_name]
+
+    elevator = cache.get(elevator_key(elevator_name))
+    if elevator is None:
+        row = ElevatorsModel.objects.filter(elevator_name=elevator_name).values_list(*ELEVATOR_COLUMNS).first()
+        elevator = Elevator(*row) if row is not None else None
+        if elevator is not None:
+            cache.set(elevator_key(elevator_name), elevator, timeout=None)
+
+    if request is not None:
+        if elevators is None:
+            elevators = request.elevators = {}
+        elevators[elevator_name] = elevator
+    return elevator
+
+
+async def aget_elevator(elevator_name):
+    """
+    Async version of get_elevator using the async cache and ORM
+    """
+    elevator = await cache.aget(elevator_key(elevator_name))
+    if elevator is None:
+        row = await ElevatorsModel.objects.filter(elevator_name=elevator_name).values_list(*ELEVATOR_COLUMNS).afirst()
+        elevator = Elevator(*row) if row is not None else None
+        if elevator is not None:
+            await cache.aset(elevator_key(elevator_name), elevator, timeout=None)
+    return elevator
+
+
+def update_elevator(elevator, request=None, claimed=False, **fields):
+    """
+    Writes the fields of one elevator with a single targeted UPDATE and keeps
+    the cached state in step with it. The cache gets the row the UPDATE
+    wrote, with what other requests committed since this one read the
+    elevator. Unless the caller holds the claim of the elevator (claimed, see
+    claim_elevator) the write is a new version, a transition holding the row
+    it read before retries.
+    """
+    for name, value in fields.items():
+        fields[name] = ElevatorsModel._meta.get_field(name).to_python(value)
+
+    row = write_elevator(elevator.pk, fields, new_version=not claimed)
+    if row is None:  # deleted meanwhile
+        for name, value in fields.items():
+            setattr(elevator, name, value)
+        transaction.on_commit(lambda: cache.delete(elevator_key(elevator.elevator_name)))
+        return elevator
+    for name, value in zip(ELEVATOR_COLUMNS, row):
+        setattr(elevator, name, value)
+
+    # inside a transaction the cache only changes once the rows are committed
+    transaction.on_commit(lambda: cache.set(elevator_key(elevator.elevator_name), elevator, timeout=None))
+    if getattr(request, 'elevators', None) is not None:
+        request.elevators[elevator.elevator_name] = elevator
+    return elevator
+
+
+def write_elevator(elevator_id, fields, new_version):
+    """
+    UPDATE of the fields of one elevator returning the whole row (in the
+    order of ELEVATOR_COLUMNS), one statement where the database has
+    UPDATE ... RETURNING. None when the elevator doesn't exist.
+    """
+    if not returns_from_update():
+        if new_version:
+            fields = {**fields, 'version': F('version') + 1}
+        if not ElevatorsModel.objects.filter(pk=elevator_id).update(**fields):
+            return None
+        return ElevatorsModel.objects.filter(pk=elevator_id).values_list(*ELEVATOR_COLUMNS).first()
+
+    quote = connection.ops.quote_name
+    model_fields = [ElevatorsModel._meta.get_field(name) for name in fields]
+    assignments = [f'{quote(field.column)} = %s' for field in model_fields]
+    if new_version:
+        assignments.append(f'{quote("version")} = {quote("version")} + 1')
+    columns = [ElevatorsModel._meta.get_field(name) for name in ELEVATOR_COLUMNS]
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {quote(ElevatorsModel._meta.db_table)} SET {", ".join(assignments)} '
+                       f'WHERE {quote(ElevatorsModel._meta.pk.column)} = %s '
+                       f'RETURNING {", ".join(quote(field.column) for field in columns)}',
+                       [field.get_db_prep_save(value, connection) for field, value in zip(model_fields, fields.values())] + [elevator_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return tuple(field.from_db_value(value, None, connection) if hasattr(field, 'from_db_value') else field.to_python(value)
+                 for field, value in zip(columns, row))
+
+
+def elevator_cache_keys(elevator_name):
+    """
+    Every cache key named after the elevator but the destinations (see
+    destinations.py), what a deleted elevator leaves behind
+    """
+    return [elevator_key(elevator_name), f'current_floor_{elevator_name}'] + [run_state_key(field, elevator_name)
+                                                                              for field in RUN_STATE_FIELDS]
+
+
+def invalidate_elevator(*elevator_names, request=None):
+    cache.delete_many([elevator_key(elevator_name) for elevator_name in elevator_names])
+    if getattr(request, 'elevators', None) is not None:
+        for elevator_name in elevator_names:
+            request.elevators.pop(elevator_name, None)
+
+
+class ElevatorBusy(Exception):
+    """
+    Another request moved the elevator on since this one read it
+    """
+
+
+def claim_elevator(elevator, request=None):
+    """
+    Compare-and-swap of the version of the elevator, the first statement of
+    the transaction of a state transition. The UPDATE holds the row until the
+    commit, so concurrent transitions of one elevator run one after the other
+    and the ones which read it before raise ElevatorBusy, other elevators are
+    never blocked by it. Returns the run state of the elevator, read by the
+    same statement where the database has UPDATE ... RETURNING.
+    """
+    if returns_from_update():
+        state = claim_returning_run_state(elevator)
+    elif ElevatorsModel.objects.filter(pk=elevator.pk, version=elevator.version).update(version=F('version') + 1):
+        state = read_run_state(elevator)
+    else:
+        state = None
+    if state is None:
+        raise ElevatorBusy(elevator.elevator_name)
+    elevator.version += 1
+
+    transaction.on_commit(lambda: cache.set(elevator_key(elevator.elevator_name), elevator, timeout=None))
+    if getattr(request, 'elevators', None) is not None:
+        request.elevators[elevator.elevator_name] = elevator
+    return state
+
+
+def returns_from_update():
+    # MariaDB returns rows from INSERT and DELETE only
+    return connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert
+
+
+def claim_returning_run_state(elevator):
+    """
+    The compare-and-swap of claim_elevator returning the run state of the
+    elevator, None when the version moved on
+    """
+    quote = connection.ops.quote_name
+    elevators, states = quote(ElevatorsModel._meta.db_table), quote(ElevatorStateModels._meta.db_table)
+    elevator_id, version = quote(ElevatorStateModels._meta.get_field('elevator').column), quote('version')
+    fields = [ElevatorStateModels._meta.get_field(field) for field in RUN_STATE_FIELDS]
+    returning = ', '.join(f'(SELECT {quote(field.column)} FROM {states} WHERE {elevator_id} = %s)' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {elevators} SET {version} = {version} + 1 '
+                       f'WHERE {quote(ElevatorsModel._meta.pk.column)} = %s AND {version} = %s RETURNING {returning}',
+                       [elevator.id, elevator.version] + [elevator.id] * len(fields))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return {field.name: field.from_db_value(value, None, connection) if hasattr(field, 'from_db_value') else value
+            for field, value in zip(fields, row)}
+
+
+def elevator_values(elevator):
+    """
+    The elevator as the dict QuerySet.values() would return, without a query
+    """
+    return ELEVATOR_FIELDS.dump(elevator)
+
+
+def run_state_key(field, elevator_name):
+    return f'{field}_{elevator_name}'
+
+
+def load_run_states(elevator_names):
+    """
+    Reads the run state of the elevators from the state table with one query
+    and caches it, elevators without a row get None for every field
+    """
+    states = {elevator_name: dict.fromkeys(RUN_STATE_FIELDS) for elevator_name in elevator_names}
+    rows = ElevatorStateModels.objects.filter(elevator__elevator_name__in=states).values_list('elevator__elevator_name', *RUN_STATE_FIELDS)
+    for elevator_name, *values in rows:
+        states[elevator_name] = dict(zip(RUN_STATE_FIELDS, values))
+
+    cache.set_many({run_state_key(field, elevator_name): value
+                    for elevator_name, state in states.items() for field, value in state.items()}, timeout=None)
+    return states
+
+
+def read_run_state(elevator):
+    """
+    The run state of a claimed elevator read from the state table, the copy in
+    the cache is only written once the previous transition committed
+    """
+    state = ElevatorStateModels.objects.filter(elevator_id=elevator.id).values(*RUN_STATE_FIELDS).first()
+    return state or dict.fromkeys(RUN_STATE_FIELDS)
+
+
+def get_run_state(elevator_name, field):
+    """
+    Returns one field of the run state of the elevator from the cache, a miss
+    (after a restart or on a new worker) is read from the state table
+    """
+    value = cache.get(run_state_key(field, elevator_name), MISSING)
+    if value is MISSING:
+        value = load_run_states([elevator_name])[elevator_name][field]
+    return value
+
+
+def get_run_states(elevator_names, field):
+    """
+    Returns {elevator_name: value} of one field for many elevators, only the
+    misses are read from the state table
+    """
+    values = cache.get_many([run_state_key(field, elevator_name) for elevator_name in elevator_names])
+    states = {elevator_name: values[run_state_key(field, elevator_name)]
+              for elevator_name in elevator_names if run_state_key(field, elevator_name) in values}
+    missing = [elevator_name for elevator_name in elevator_names if elevator_name not in states]
+    if missing:
+        for elevator_name, state in load_run_states(missing).items():
+            states[elevator_name] = state[field]
+    return states
+
+
+def set_run_state(elevator, **fields):
+    """
+    Writes fields of the run state of the elevator to the state table with
+    one upsert and then to the cache
+    """
+    ElevatorStateModels.objects.bulk_create([ElevatorStateModels(elevator_id=elevator.id, **fields)], update_conflicts=True,
+                                            unique_fields=['elevator'], update_fields=list(fields))
+    values = {run_state_key(field, elevator.elevator_name): value for field, value in fields.items()}
+    transaction.on_commit(lambda: cache.set_many(values, timeout=None))
+
+
+async def aget_run_state(elevator_name, field):
+    """
+    Async version of get_run_state
+    """
+    value = await cache.aget(run_state_key(field, elevator_name), MISSING)
+    if value is MISSING:
+        row = await ElevatorStateModels.objects.filter(elevator__elevator_name=elevator_name).values(*RUN_STATE_FIELDS).afirst()
+        state = row or dict.fromkeys(RUN_STATE_FIELDS)
+        await cache.aset_many({run_state_key(name, elevator_name): state[name] for name in RUN_STATE_FIELDS}, timeout=None)
+        value = state[field]
+    return value
+
+
+async def aset_run_state(elevator, **fields):
+    """
+    Async version of set_run_state
+    """
+    await ElevatorStateModels.objects.abulk_create([ElevatorStateModels(elevator_id=elevator.id, **fields)], update_conflicts=True,
+                                                   unique_fields=['elevator'], update_fields=list(fields))
+    await cache.aset_many({run_state_key(field, elevator.elevator_name): value for field, value in fields.items()}, timeout=None)
+
+
+def invalidate_run_state(*elevator_names):
+    cache.delete_many([run_state_key(field, elevator_name) for elevator_name in elevator_names for field in RUN_STATE_FIELDS])
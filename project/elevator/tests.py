@@ -1,5 +1,810 @@
-from django.test import TestCase
-from django_redis import get_redis_connection
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .benchmarks.async_views import asgi_get
+from .destinations import get_destination_store, reset_destination_store
+from .engine import TickEngine
+from .events import publish_state, publisher
+from .handlers import get_application
+from .idempotency import get_recent_keys, reset_recent_keys
+from .models import ElevatorsModel, ElevatorStateModels, RequestArchiveModels, UserRequestModels
+from .registry import lookup_elevator
+from .replay import restore_fleet
+from .responses import get_response_cache, reset_response_cache
+from .scheduler import ElevatorScheduler, _schedulers, add_stops, cache as scheduler_cache, get_scheduler, reset_schedulers
+from .state import RUN_STATE_FIELDS, elevator_cache_keys, elevator_key, get_elevator, update_elevator
+from .traffic import TrafficLog, fleet_snapshot
+
 # Create your tests here.
 
 
+def reset_process_state():
+    # the cache and the per process singletons outlive the test database
+    cache.clear()
+    reset_schedulers()
+    reset_destination_store()
+    reset_recent_keys()
+    reset_response_cache()
+
+
+class ElevatorAPITestCase(TestCase):
+    """
+    A fresh cache per test and helpers calling the APIs with JSON bodies
+    """
+
+    def setUp(self):
+        reset_process_state()
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_process_state()
+
+    def call(self, method, path, body):
+        # the test transaction never commits, run what the views defer to the commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.generic(method, f'/api/{path}', json.dumps(body), content_type='application/json')
+
+    def install(self, elevator_name, last_floor=10, **fields):
+        body = {"elevator_name": elevator_name, "current_floor": 0, "first_floor": 0, "last_floor": last_floor, "door": "CLOSE"}
+        response = self.call('POST', 'install/install_elevator/', {**body, **fields})
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+
+class BulkInstallTests(ElevatorAPITestCase):
+
+    def body(self, elevator_name, **fields):
+        return {"elevator_name": elevator_name, "current_floor": 0, "first_floor": 0, "last_floor": 10, "door": "CLOSE", **fields}
+
+    def test_invalid_items_are_reported_and_the_valid_ones_installed(self):
+        self.install('a0')
+        missing_last_floor = self.body('a2')
+        del missing_last_floor['last_floor']
+        response = self.call('POST', 'install/install_elevator/', [
+            self.body('a1'), missing_last_floor, self.body('a0'), self.body('a3', skipped_floors=[4, 2, 4]), self.body('a3'),
+            self.body('a4', skipped_floors=[20]), 'a5'])
+        self.assertEqual(response.status_code, 200)
+        results = response.data
+        self.assertEqual([result['message'] for result in results],
+                         ["Elevator is succesfully installed", "Elevator is not installed", "Elevator is not installed",
+                          "Elevator is succesfully installed", "Elevator is not installed", "Elevator is not installed",
+                          "Elevator is not installed"])
+        self.assertEqual(list(results[1]['errors']), ['last_floor'])
+        self.assertEqual(results[2]['errors'], {"elevator_name": ["elevator a0 already exists"]})
+        self.assertEqual(results[3]['data']['skipped_floors'], [2, 4])
+        self.assertEqual(results[4]['errors'], {"elevator_name": ["elevator a3 already exists"]})
+        self.assertEqual(list(results[5]['errors']), ['skipped_floors'])
+
+        self.assertEqual(sorted(ElevatorsModel.objects.values_list('elevator_name', flat=True)), ['a0', 'a1', 'a3'])
+        self.assertEqual(results[3]['data']['id'], ElevatorsModel.objects.get(elevator_name='a3').id)
+        # the registry follows the installs
+        response = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "a3", "floor": 4})
+        self.assertEqual((response.status_code, response.data['err_message']), (400, "user selected floor 4 is out of elevator floors"))
+        self.assertEqual(self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "a1", "floor": 4}).status_code, 200)
+
+    def test_queries_do_not_grow_with_the_list(self):
+        counts = []
+        for size in (3, 30):
+            body = [self.body(f'q{size}_{index}') for index in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.call('POST', 'install/install_elevator/', body).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(ElevatorsModel.objects.count(), 33)
+
+
+class BatchIngestionTests(ElevatorAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.install('i1')
+        self.install('i2', last_floor=5)
+
+    def save(self, body):
+        return self.call('POST', 'userrequests/save_user_requests/', body)
+
+    def pending(self):
+        return sorted(UserRequestModels.objects.values_list('elevator__elevator_name', 'destination_floor'))
+
+    def test_mixed_valid_and_invalid_items(self):
+        response = self.save([{"elevator_name": "i1", "floor": 3}, {"elevator_name": "i1", "floor": 30}, {"elevator_name": "i9", "floor": 1},
+                              {"elevator_name": "i2", "floor": 5}, {"elevator_name": "i1", "floor": "3"}, "i1"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['success'] for result in response.data['results']], [True, False, False, True, False, False])
+        self.assertEqual(response.data['results'][1]['err_message'], "user selected floor 30 is out of elevator floors")
+        self.assertEqual(response.data['results'][2]['err_message'], "elevator i9 doesn't exists")
+        self.assertEqual(response.data['destinations'], {"i1": [3], "i2": [5]})
+        self.assertEqual(self.pending(), [('i1', 3), ('i2', 5)])
+
+    def test_duplicates_are_written_once(self):
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "i1", "floor": 4})
+        response = self.save({"requests": [{"elevator_name": "i1", "floor": floor} for floor in (4, 6, 6)]})
+        self.assertEqual([result['success'] for result in response.data['results']], [True, True, True])
+        self.assertEqual(response.data['destinations'], {"i1": [4, 6]})
+        self.assertEqual(self.pending(), [('i1', 4), ('i1', 6)])
+
+    def test_retried_items_get_their_first_result(self):
+        body = [{"elevator_name": "i1", "floor": 2, "request_key": "p1"}, {"elevator_name": "i2", "floor": 9, "request_key": "p2"},
+                {"elevator_name": "i2", "floor": 1}]
+        first = self.save(body)
+        # the car served floor 2 before the panel retried
+        self.call('POST', 'elevator/destination_reached/', {"elevator_name": "i1", "current_floor": 2})
+        retry = self.save(body)
+        self.assertEqual(retry.data['results'], first.data['results'])
+        self.assertEqual(self.pending(), [('i2', 1)])
+        self.assertEqual(UserRequestModels.history.filter(destination_floor=2).count(), 1)
+        # the key of an item also answers its retry by the single request API
+        single = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "i1", "floor": 2, "request_key": "p1"})
+        self.assertEqual(single.data, first.data['results'][0])
+
+    def test_body_should_be_a_list(self):
+        for body in ({"elevator_name": "i1", "floor": 2}, "i1"):
+            self.assertEqual(self.save(body).status_code, 400)
+        self.assertEqual(self.pending(), [])
+
+
+class RegistryValidationTests(ElevatorAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.elevator = self.install('x1', skipped_floors=[3, 4])
+
+    def save(self, floor, elevator_name='x1'):
+        response = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": elevator_name, "floor": floor})
+        return response.status_code, response.data.get('err_message')
+
+    def test_floors_are_refused_without_queries(self):
+        # the registry loads the fleet once after the install
+        lookup_elevator('x1')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.save(3), (400, "user selected floor 3 is out of elevator floors"))
+            self.assertEqual(self.save(11), (400, "user selected floor 11 is out of elevator floors"))
+            self.assertEqual(self.save(-1), (400, "user selected floor -1 is out of elevator floors"))
+            self.assertEqual(self.save(None), (400, "user selected floor None is out of elevator floors"))
+            self.assertEqual(self.save(2, 'x9'), (400, "elevator x9 doesn't exists"))
+        self.assertEqual(self.save(5), (200, None))
+        self.assertEqual(list(UserRequestModels.objects.values_list('destination_floor', flat=True)), [5])
+
+    def test_registry_follows_the_edits(self):
+        self.call('PATCH', f'install/{self.elevator["id"]}/', {"skipped_floors": [5]})
+        self.assertEqual(self.save(5)[0], 400)
+        self.assertEqual(self.save(3)[0], 200)
+        self.call('PATCH', 'maintenance/set_maintenance/', {"elevator_name": "x1", "maintenance": True})
+        self.assertEqual(self.save(6), (400, "elevator x1 is under maintenance"))
+        self.call('DELETE', f'install/{self.elevator["id"]}/', {})
+        self.assertEqual(self.save(6), (400, "elevator x1 doesn't exists"))
+
+    def test_skipped_floors_are_validated_on_install(self):
+        for skipped_floors in ([11], [2, "4"], 4):
+            response = self.call('POST', 'install/install_elevator/', {"elevator_name": "x2", "current_floor": 0, "first_floor": 0,
+                                                                       "last_floor": 10, "door": "CLOSE", "skipped_floors": skipped_floors})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.call('PATCH', f'install/{self.elevator["id"]}/', {"last_floor": 2}).status_code, 400)
+        self.assertEqual(list(ElevatorsModel.objects.values_list('elevator_name', 'last_floor', 'skipped_floors')), [('x1', 10, [3, 4])])
+
+    def test_hall_call_skips_the_express_cars(self):
+        self.install('x2')
+        response = self.call('POST', 'userrequests/hall_call/', {"floor": 3, "direction": "up", "elevators": ["x1", "x2"]})
+        self.assertEqual((response.status_code, response.data['elevator_name']), (200, 'x2'))
+
+
+class HallCallTests(ElevatorAPITestCase):
+
+    def test_boolean_floor_is_rejected(self):
+        self.install('h1')
+        for floor in (True, False):
+            response = self.call('POST', 'userrequests/hall_call/', {"floor": floor, "direction": "up"})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.call('GET', 'userrequests/fetch_all_requests/', {"elevator_name": "h1"}).data['requests'], [])
+
+    def test_boolean_floor_is_not_served(self):
+        self.install('h1')
+        response = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "h1", "floor": True})
+        self.assertEqual(response.status_code, 400)
+
+
+class NextDestinationsTests(ElevatorAPITestCase):
+
+    def test_stop_at_the_current_floor_is_served(self):
+        self.install('n1')
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "n1", "floor": floor} for floor in (0, 4)])
+        response = self.call('POST', 'elevator/next_destinations/', {"elevator_name": "n1"})
+        self.assertEqual((response.data['destinations'], response.data['current_floor']), ([4], 0))
+
+        self.assertEqual(self.call('GET', 'userrequests/fetch_all_requests/', {"elevator_name": "n1"}).data['requests'], [4])
+        self.assertEqual(list(UserRequestModels.objects.values_list('destination_floor', flat=True)), [4])
+        self.assertTrue(UserRequestModels.history.filter(destination_floor=0, served_at__isnull=False).exists())
+        self.assertEqual(get_scheduler(ElevatorsModel.objects.get(elevator_name='n1')).stops, [4])
+        self.assertEqual(self.client.get('/api/fleet/snapshot/?fields=pending_requests').json()['elevators'][0]['pending_requests'], 1)
+
+
+class ElevatorCacheTests(ElevatorAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.install('w1')
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "w1", "floor": 5})
+
+    def test_door_written_after_a_transition_keeps_its_floor(self):
+        # the door request read the elevator before the arrival committed
+        stale = get_elevator('w1')
+        self.assertEqual(self.call('POST', 'elevator/destination_reached/', {"elevator_name": "w1", "current_floor": 5}).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_elevator(stale, door='OPEN')
+        self.assertEqual(self.call('GET', 'elevator/get_current_floor/', {"elevator_name": "w1"}).data['current_floor'], 5)
+        cached = get_elevator('w1')
+        self.assertEqual((cached.current_floor, cached.door), (5, 'OPEN'))
+
+    def test_transition_holding_the_elevator_read_before_a_door_write_retries(self):
+        stale = get_elevator('w1')
+        self.call('PATCH', 'door/open_or_close_door/', {"elevator_name": "w1", "door": "OPEN"})
+        # the arrival read the elevator before the door was written
+        cache.set(elevator_key('w1'), stale, timeout=None)
+        self.assertEqual(self.call('POST', 'elevator/destination_reached/', {"elevator_name": "w1", "current_floor": 5}).status_code, 200)
+        cached = get_elevator('w1')
+        self.assertEqual((cached.current_floor, cached.door), (5, 'OPEN'))
+        self.assertEqual(cached.version, ElevatorsModel.objects.get(elevator_name='w1').version)
+
+
+class DestinationStoreTests(ElevatorAPITestCase):
+
+    def test_planning_keeps_floors_pressed_meanwhile(self):
+        self.install('d1')
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "d1", "floor": floor} for floor in (3, 5)])
+        # a press whose bit is set while the route is planned, before its stop is added
+        get_destination_store().add('d1', 7)
+        self.assertEqual(self.call('POST', 'elevator/next_destinations/', {"elevator_name": "d1"}).status_code, 200)
+        self.assertEqual(get_destination_store().members('d1'), [3, 5, 7])
+
+    def test_floor_pressed_again_once_served(self):
+        self.install('d1')
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "d1", "floor": 4})
+        self.call('POST', 'elevator/next_destinations/', {"elevator_name": "d1"})
+        self.assertEqual(self.call('POST', 'elevator/reach_next_destination/', {"elevator_name": "d1"}).data['success'], True)
+        self.assertEqual(get_destination_store().members('d1'), [])
+
+        # the car left floor 4, pressing it again is a new request and a new stop
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "d1", "floor": 0})
+        response = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "d1", "floor": 4})
+        self.assertEqual(response.data['destinations'], [0, 4])
+        self.assertEqual(UserRequestModels.objects.filter(elevator__elevator_name='d1', destination_floor=4).count(), 1)
+        response = self.call('POST', 'elevator/destination_reached/', {"elevator_name": "d1", "current_floor": 4})
+        self.assertEqual(response.status_code, 200)
+
+
+# long enough for a response the writes don't drop to be served stale
+@override_settings(ELEVATOR_RESPONSE_CACHE_SECONDS=60)
+class ResponseInvalidationTests(ElevatorAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.elevator = self.install('r1')
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "r1", "floor": 5, "request_key": "k1"})
+
+    def read(self, action):
+        path = {'get_current_floor': 'elevator', 'fetch_all_requests': 'userrequests', 'check_maintenance_status': 'maintenance'}[action]
+        response = self.call('GET', f'{path}/{action}/', {"elevator_name": "r1"})
+        return response.status_code, response.data
+
+    def test_writes_drop_the_cached_responses(self):
+        self.assertEqual(self.read('get_current_floor')[1]['current_floor'], 0)
+        self.assertEqual(self.read('fetch_all_requests')[1]['requests'], [5])
+        self.assertEqual(self.read('check_maintenance_status')[1]['message'], "Elevator is working")
+        self.assertEqual(len(get_response_cache()), 3)
+
+        self.call('POST', 'elevator/destination_reached/', {"elevator_name": "r1", "current_floor": 5})
+        self.assertEqual(self.read('get_current_floor')[1]['current_floor'], 5)
+        self.assertEqual(self.read('fetch_all_requests')[1]['requests'], [])
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "r1", "floor": 2})
+        self.assertEqual(self.read('fetch_all_requests')[1]['requests'], [2])
+        self.call('PATCH', 'maintenance/set_maintenance/', {"elevator_name": "r1", "maintenance": True})
+        self.assertEqual(self.read('check_maintenance_status')[1]['message'], "Elevator is under maintenance")
+        self.call('PATCH', f'install/{self.elevator["id"]}/', {"maintenance": False, "current_floor": 8})
+        self.assertEqual(self.read('check_maintenance_status')[1]['message'], "Elevator is working")
+        self.assertEqual(self.read('get_current_floor')[1]['current_floor'], 8)
+
+    def test_destroy_removes_every_key(self):
+        self.call('POST', 'elevator/next_destinations/', {"elevator_name": "r1"})
+        self.read('get_current_floor')
+        generation = get_response_cache().generation
+        self.assertEqual(self.call('DELETE', f'install/{self.elevator["id"]}/', {}).status_code, 204)
+
+        self.assertEqual(get_destination_store().members('r1'), [])
+        self.assertNotIn(self.elevator['id'], _schedulers)
+        self.assertEqual(len(get_recent_keys()), 0)
+        self.assertEqual(cache.get_many(elevator_cache_keys('r1')), {})
+        self.assertEqual((len(get_response_cache()), get_response_cache().generation > generation), (0, True))
+        self.assertEqual(self.read('get_current_floor')[0], 400)
+
+        # an elevator installed again under the name starts afresh, the old request key is no retry of it
+        self.install('r1')
+        self.assertEqual(self.read('fetch_all_requests')[1]['requests'], [])
+        response = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "r1", "floor": 7, "request_key": "k1"})
+        self.assertEqual(response.data['destinations'], [7])
+        self.assertEqual(list(UserRequestModels.objects.values_list('destination_floor', flat=True)), [7])
+
+
+class RenameTests(ElevatorAPITestCase):
+
+    def test_renamed_elevator_keeps_its_destinations_and_request_keys(self):
+        elevator = self.install('b')
+        first = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "b", "floor": 4, "request_key": "k1"})
+        self.assertEqual(self.call('PATCH', f'install/{elevator["id"]}/', {"elevator_name": "b2"}).status_code, 200)
+
+        self.assertEqual(self.call('GET', 'userrequests/fetch_all_requests/', {"elevator_name": "b2"}).data['requests'], [4])
+        self.assertEqual(get_destination_store().members('b'), [])
+        retry = self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "b2", "floor": 4, "request_key": "k1"})
+        self.assertEqual(retry.data, first.data)
+        response = self.call('POST', 'elevator/destination_reached/', {"elevator_name": "b2", "current_floor": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(UserRequestModels.objects.exists())
+        self.assertEqual(get_scheduler(ElevatorsModel.objects.get(elevator_name='b2')).stops, [])
+
+
+class EngineCompactionTests(ElevatorAPITestCase):
+
+    def test_engine_moves_the_served_requests_to_the_archive(self):
+        self.install('t1')
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "t1", "floor": floor} for floor in (1, 2)])
+        results = []
+        # run() closes the old connections between ticks, the test transaction has to stay open
+        with self.captureOnCommitCallbacks(execute=True), mock.patch('elevator.engine.close_old_connections'):
+            TickEngine(compaction_seconds=1e-9).run(interval=0, ticks=3, report=lambda result, seconds: results.append(result))
+        self.assertEqual(sum(result.get('compacted', 0) for result in results), 2)
+        self.assertFalse(UserRequestModels.history.exists())
+        self.assertEqual(sorted(RequestArchiveModels.objects.values_list('destination_floor', flat=True)), [1, 2])
+
+
+class PolicyTests(SimpleTestCase):
+    """
+    Routes of the policies from floor 5 of a 0-10 shaft with stops at 2, 3, 7 and 9
+    """
+
+    def plan(self, policy, current_floor=5, direction='stand_by', stops=(2, 3, 7, 9)):
+        plan = ElevatorScheduler(stops).plan(current_floor, direction, 0, 10, policy)
+        return plan.current_direction, plan.destinations, plan.moving_direction_final_destination
+
+    def test_look(self):
+        self.assertEqual(self.plan('look'), ('moving up', [7, 9, 3, 2], 9))
+        self.assertEqual(self.plan('look', direction='moving down'), ('moving down', [3, 2, 7, 9], 2))
+        # nothing left ahead, the car turns around
+        self.assertEqual(self.plan('look', current_floor=9, direction='moving up'), ('moving down', [7, 3, 2], 2))
+
+    def test_scan_drives_to_the_end_of_the_shaft(self):
+        self.assertEqual(self.plan('scan'), ('moving up', [7, 9, 10, 3, 2], 10))
+        self.assertEqual(self.plan('scan', direction='moving down'), ('moving down', [3, 2, 0, 7, 9], 0))
+        self.assertEqual(self.plan('scan', current_floor=9, direction='moving up'), ('moving up', [10, 7, 3, 2], 10))
+        # no stop behind, no detour to the end
+        self.assertEqual(self.plan('scan', stops=(7, 9)), ('moving up', [7, 9], 9))
+        self.assertEqual(self.plan('scan', current_floor=10, direction='moving up', stops=(3,)), ('moving down', [3], 3))
+
+    def test_c_look_sweeps_in_one_direction(self):
+        self.assertEqual(self.plan('c_look'), ('moving up', [7, 9, 2, 3], 9))
+        self.assertEqual(self.plan('c_look', direction='moving down'), ('moving down', [3, 2, 9, 7], 2))
+        self.assertEqual(self.plan('c_look', current_floor=9, direction='moving up'), ('moving up', [2, 3, 7], 7))
+
+    def test_sstf_takes_the_closest_stop(self):
+        # 3 and 7 are as close, ties go up
+        self.assertEqual(self.plan('sstf', direction='moving down'), ('moving up', [7, 9, 3, 2], 9))
+        self.assertEqual(self.plan('sstf', current_floor=4, stops=(1, 3, 6, 10)), ('moving down', [3, 1, 6, 10], 1))
+
+    def test_stop_at_the_current_floor_is_served_already(self):
+        for policy in ('look', 'scan', 'c_look', 'sstf'):
+            self.assertEqual(self.plan(policy, stops=(5,)), ('stand_by', [], None))
+
+
+class TickEngineTests(ElevatorAPITestCase):
+
+    def run_engine(self, ticks):
+        with self.captureOnCommitCallbacks(execute=True), mock.patch('elevator.engine.close_old_connections'):
+            TickEngine(compaction_seconds=0).run(interval=0, ticks=ticks)
+
+    def test_scan_passes_the_end_of_the_shaft_without_a_request(self):
+        self.install('e1', current_floor=5, policy='scan')
+        self.install('e2', current_floor=4)
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "e1", "floor": 7}, {"elevator_name": "e1", "floor": 2},
+                                                               {"elevator_name": "e2", "floor": 9}])
+        with self.assertNoLogs('elevator.engine', 'ERROR'):
+            self.run_engine(ticks=15)
+        self.assertFalse(UserRequestModels.objects.exists())
+        # up to the end of the shaft before turning around for floor 2
+        self.assertEqual(dict(ElevatorsModel.objects.values_list('elevator_name', 'current_floor')), {'e1': 2, 'e2': 9})
+
+    def test_every_policy_serves_its_car_to_the_end(self):
+        for policy in ('look', 'scan', 'c_look', 'sstf'):
+            self.install(policy, current_floor=5, policy=policy)
+            self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": policy, "floor": floor} for floor in (2, 3, 7, 9)])
+        floors = {policy: [5] for policy in ('look', 'scan', 'c_look', 'sstf')}
+        engine = TickEngine(compaction_seconds=0)
+        for _ in range(20):
+            with self.captureOnCommitCallbacks(execute=True):
+                engine.tick()
+            for elevator_name, current_floor in ElevatorsModel.objects.values_list('elevator_name', 'current_floor'):
+                if floors[elevator_name][-1] != current_floor:
+                    floors[elevator_name].append(current_floor)
+
+        self.assertFalse(UserRequestModels.objects.exists())
+        self.assertEqual(UserRequestModels.history.filter(served_at__isnull=False).count(), 16)
+        there_and_back = [5, 6, 7, 8, 9, 8, 7, 6, 5, 4, 3, 2]
+        self.assertEqual(floors, {'look': there_and_back, 'c_look': there_and_back, 'sstf': there_and_back,
+                                  'scan': [5, 6, 7, 8, 9, 10, 9, 8, 7, 6, 5, 4, 3, 2]})
+
+    def test_a_car_failing_to_advance_does_not_stop_the_fleet(self):
+        self.install('e1', policy='scan')
+        self.install('e2')
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "e1", "floor": 3}, {"elevator_name": "e2", "floor": 3}])
+        with mock.patch.dict('elevator.scheduler.POLICIES', scan=mock.Mock(side_effect=RuntimeError)), \
+                self.assertLogs('elevator.engine', 'ERROR'):
+            self.run_engine(ticks=3)
+        self.assertEqual(list(UserRequestModels.objects.values_list('elevator__elevator_name', flat=True)), ['e1'])
+        self.assertEqual(ElevatorsModel.objects.get(elevator_name='e2').current_floor, 3)
+
+
+class SchedulerVersionTests(ElevatorAPITestCase):
+
+    def test_change_of_another_process_in_between_reloads_the_stops(self):
+        self.install('s1')
+        elevator = ElevatorsModel.objects.get(elevator_name='s1')
+        scheduler = get_scheduler(elevator)
+        incr = scheduler_cache.incr
+
+        def concurrent_incr(key, *args, **kwargs):
+            # another process adds floor 7 and publishes it after this one read its version
+            UserRequestModels.objects.create(elevator=elevator, destination_floor=7)
+            incr(key)
+            return incr(key, *args, **kwargs)
+
+        UserRequestModels.objects.create(elevator=elevator, destination_floor=4)
+        with mock.patch.object(scheduler_cache, 'incr', concurrent_incr):
+            add_stops(elevator, [4])
+        self.assertEqual(scheduler.stops, [4])
+        self.assertEqual(get_scheduler(elevator).stops, [4, 7])
+
+
+class TrafficLogTests(ElevatorAPITestCase):
+
+    def run_states(self):
+        return {elevator_name: state for elevator_name, *state in
+                ElevatorStateModels.objects.values_list('elevator__elevator_name', *RUN_STATE_FIELDS)}
+
+    def test_replay_restores_the_run_state_of_the_fleet(self):
+        self.install('r1')
+        self.install('r2')
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "r1", "floor": floor} for floor in (2, 6)])
+        self.call('POST', 'elevator/next_destinations/', {"elevator_name": "r1"})
+        fleet, states = fleet_snapshot(), self.run_states()
+        self.assertEqual(states['r1'][1], 2)
+
+        ElevatorsModel.objects.all().delete()
+        reset_process_state()
+        restore_fleet(json.loads(json.dumps(fleet)))
+        self.assertEqual(self.run_states(), states)
+        self.assertEqual(self.call('GET', 'userrequests/get_elevator_direction/', {"elevator_name": "r1"}).data['direction'],
+                         'moving up')
+
+    def test_full_buffer_logs_the_dropped_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = TrafficLog(os.path.join(directory, 'traffic.log'), flush_seconds=60, max_records=1)
+            with self.assertLogs('elevator.traffic', 'WARNING') as logged:
+                for floor in range(3):
+                    log.append('UserRequests.save_user_request', {"elevator_name": "r1", "floor": floor})
+            self.assertEqual(log.stats['dropped'], 2)
+            self.assertEqual(len(logged.output), 1)
+            self.assertIn('1 records dropped', logged.output[0])
+
+
+class FleetSnapshotTests(ElevatorAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name in ('f1', 'f2', 'f3'):
+            self.install(name)
+        self.call('POST', 'userrequests/save_user_requests/', [{"elevator_name": "f2", "floor": floor} for floor in (4, 6)])
+
+    def snapshot(self, query='', **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(f'/api/fleet/snapshot/{query}', **headers)
+
+    def test_fields_are_picked(self):
+        response = self.snapshot('?fields=destinations,pending_requests')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['elevators'][1], {"elevator_name": "f2", "destinations": [4, 6], "pending_requests": 2})
+        self.assertEqual(self.snapshot('?fields=current_floor,speed').status_code, 400)
+
+    def test_pages(self):
+        first, last = self.snapshot('?page_size=2&fields=door').json(), self.snapshot('?page=2&page_size=2&fields=door').json()
+        self.assertEqual(([elevator['elevator_name'] for elevator in first['elevators']], first['next_page']), (['f1', 'f2'], 2))
+        self.assertEqual(([elevator['elevator_name'] for elevator in last['elevators']], last['next_page']), (['f3'], None))
+        self.assertEqual(self.snapshot('?page=0').status_code, 400)
+        self.assertEqual(self.snapshot('?page_size=x').status_code, 400)
+
+    def test_unchanged_fleet_is_not_modified(self):
+        etag = self.snapshot()['ETag']
+        with self.assertNumQueries(0):
+            response = self.snapshot(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content, response['ETag']), (304, b'', etag))
+        # another page or other fields are another snapshot
+        self.assertEqual(self.snapshot('?fields=door', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_every_write_changes_the_etag(self):
+        writes = [
+            ('POST', 'userrequests/save_user_request/', {"elevator_name": "f1", "floor": 3}),
+            ('POST', 'elevator/next_destinations/', {"elevator_name": "f1"}),
+            ('POST', 'elevator/reach_next_destination/', {"elevator_name": "f1"}),
+            ('PATCH', 'door/open_or_close_door/', {"elevator_name": "f1", "door": "OPEN"}),
+            ('PATCH', 'maintenance/set_maintenance/', {"elevator_name": "f3", "maintenance": True}),
+            ('POST', 'install/install_elevator/', {"elevator_name": "f4", "current_floor": 0, "first_floor": 0, "last_floor": 5, "door": "CLOSE"}),
+        ]
+        for method, path, body in writes:
+            etag = self.snapshot()['ETag']
+            self.assertEqual(self.call(method, path, body).status_code, 200)
+            self.assertEqual(self.snapshot(HTTP_IF_NONE_MATCH=etag).status_code, 200, path)
+
+    def test_fleet_is_read_only(self):
+        elevator_id = ElevatorsModel.objects.get(elevator_name='f1').id
+        self.assertEqual(self.client.delete(f'/api/fleet/{elevator_id}/').status_code, 404)
+        self.assertEqual(self.call('PATCH', f'fleet/{elevator_id}/', {"current_floor": 7}).status_code, 404)
+        self.assertEqual(ElevatorsModel.objects.get(id=elevator_id).current_floor, 0)
+
+
+class QueriesPerActionTests(ElevatorAPITestCase):
+    """
+    SQL statements of every action once the elevator is cached, the
+    transactions of the state transitions are savepoints inside a TestCase
+    (SAVEPOINT and RELEASE count as two more)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.install('q1')
+        for floor in (3, 5):
+            self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "q1", "floor": floor})
+
+    def assertQueries(self, count, method, path, body):
+        with self.assertNumQueries(count):
+            response = self.call(method, path, body)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def test_save_user_request(self):
+        self.assertQueries(1, 'POST', 'userrequests/save_user_request/', {"elevator_name": "q1", "floor": 7})
+
+    def test_repeated_press_is_free(self):
+        self.assertQueries(0, 'POST', 'userrequests/save_user_request/', {"elevator_name": "q1", "floor": 3})
+
+    def test_next_destinations(self):
+        # the claim returning the run state and the run state upsert
+        self.assertQueries(4, 'POST', 'elevator/next_destinations/', {"elevator_name": "q1"})
+
+    def test_reach_next_destination(self):
+        self.call('POST', 'elevator/next_destinations/', {"elevator_name": "q1"})
+        # the claim, the served requests, the floor and the run state
+        self.assertQueries(6, 'POST', 'elevator/reach_next_destination/', {"elevator_name": "q1"})
+
+    def test_destination_reached(self):
+        # the claim, the served request and the floor
+        self.assertQueries(5, 'POST', 'elevator/destination_reached/', {"elevator_name": "q1", "current_floor": 5})
+
+    def test_get_current_floor(self):
+        self.assertQueries(0, 'GET', 'elevator/get_current_floor/', {"elevator_name": "q1"})
+
+    def test_open_or_close_door(self):
+        self.assertQueries(1, 'PATCH', 'door/open_or_close_door/', {"elevator_name": "q1", "door": "OPEN"})
+
+    def test_set_maintenance(self):
+        self.assertQueries(1, 'PATCH', 'maintenance/set_maintenance/', {"elevator_name": "q1", "maintenance": True})
+
+
+class ConcurrentTransitionTests(TransactionTestCase):
+    """
+    Threads racing the state transitions of one elevator with the real
+    commits: every request is served exactly once and every transition which
+    won its claim (any answer but a 409) is one bump of the version
+    """
+    threads = 4
+    floors = 12
+
+    def setUp(self):
+        reset_process_state()
+
+    def tearDown(self):
+        reset_process_state()
+
+    def race(self, ride):
+        outcomes, errors, lock = Counter(), [], threading.Lock()
+        # the threads start their calls together
+        start = threading.Barrier(self.threads)
+
+        def run(index):
+            client = APIClient()
+            try:
+                start.wait()
+                for path, status_code in ride(client, index):
+                    with lock:
+                        outcomes[path, status_code] += 1
+            except Exception as err:
+                errors.append(err)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=run, args=(index,)) for index in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        self.assertEqual({status_code for _, status_code in outcomes} - {200, 400, 409}, set())
+        return outcomes
+
+    def setUpElevator(self):
+        client = APIClient()
+        body = {"elevator_name": "c1", "current_floor": 0, "first_floor": 0, "last_floor": self.floors, "door": "CLOSE"}
+        client.post('/api/install/install_elevator/', body, format='json')
+        client.post('/api/userrequests/save_user_requests/',
+                    [{"elevator_name": "c1", "floor": floor} for floor in range(1, self.floors + 1)], format='json')
+        return ElevatorsModel.objects.get(elevator_name='c1')
+
+    def assertServedOnce(self, elevator, outcomes):
+        served = UserRequestModels.history.filter(elevator=elevator, served_at__isnull=False)
+        self.assertEqual(sorted(served.values_list('destination_floor', flat=True)), list(range(1, self.floors + 1)))
+        self.assertFalse(UserRequestModels.objects.filter(elevator=elevator).exists())
+        transitions = sum(count for (_, status_code), count in outcomes.items() if status_code != 409)
+        elevator_version = ElevatorsModel.objects.get(id=elevator.id).version
+        self.assertEqual(elevator_version - elevator.version, transitions)
+
+    def test_next_destinations_and_reach_next_destination(self):
+        elevator = self.setUpElevator()
+
+        def ride(client, index):
+            for _ in range(self.floors * 4):
+                for path in ('elevator/next_destinations/', 'elevator/reach_next_destination/'):
+                    response = client.post(f'/api/{path}', {"elevator_name": "c1"}, format='json')
+                    yield path, response.status_code
+                if not UserRequestModels.objects.filter(elevator=elevator).exists():
+                    return
+
+        outcomes = self.race(ride)
+        self.assertServedOnce(elevator, outcomes)
+
+    def test_destination_reached_of_the_same_floors(self):
+        elevator = self.setUpElevator()
+
+        def ride(client, index):
+            for floor in range(1, self.floors + 1):
+                response = client.post('/api/elevator/destination_reached/', {"elevator_name": "c1", "current_floor": floor},
+                                       format='json')
+                yield floor, response.status_code
+
+        outcomes = self.race(ride)
+        # one arrival per floor wins, the others find it served (400) or lose the claim (409)
+        self.assertEqual(sorted(floor for (floor, status_code), count in outcomes.items() for _ in range(count) if status_code == 200),
+                         list(range(1, self.floors + 1)))
+        self.assertServedOnce(elevator, outcomes)
+
+
+class AsgiStartupTests(TransactionTestCase):
+
+    def setUp(self):
+        reset_process_state()
+
+    def tearDown(self):
+        reset_process_state()
+
+    @override_settings(ELEVATOR_TICK_SECONDS=0)
+    def test_application_imported_inside_the_event_loop(self):
+        ElevatorsModel.objects.create(elevator_name='a1', current_floor=0, first_floor=0, last_floor=10)
+
+        async def serve():
+            # like uvicorn, which imports the application once its loop runs
+            sys.modules.pop('project.asgi', None)
+            return importlib.import_module('project.asgi').application
+
+        with self.assertLogs('elevator.recovery', 'INFO') as logged:
+            self.assertTrue(callable(asyncio.run(serve())))
+        self.assertIn('rebuilt for 1 elevators', logged.output[-1])
+
+
+class AsyncViewTests(ElevatorAPITestCase):
+    """
+    The async APIs of /api/async/ through AsyncClient, they answer like the
+    DRF actions of the same name
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.install('s1')
+        self.install('s2', last_floor=5)
+        self.call('POST', 'userrequests/save_user_request/', {"elevator_name": "s1", "floor": 5})
+
+    async def acall(self, method, path, body):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = await self.async_client.generic(method, f'/api/async/{path}', json.dumps(body),
+                                                       content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    async def test_reads(self):
+        self.assertEqual(await self.acall('GET', 'userrequests/fetch_all_requests/', {"elevator_name": "s1"}),
+                         (200, {"success": True, "requests": [5]}))
+        self.assertEqual(await self.acall('GET', 'elevator/get_current_floor/', {"elevator_name": "s1"}),
+                         (200, {"success": True, "current_floor": 0}))
+        self.assertEqual(await self.acall('GET', 'elevator/get_current_floor/', {"elevator_name": "s9"}),
+                         (400, {"success": False, "err_message": "elevator s9 doesn't exists"}))
+        self.assertEqual(await self.acall('GET', 'maintenance/check_maintenance_status/', {"elevator_name": "s2"}),
+                         (200, {"success": True, "message": "Elevator is working"}))
+        status_code, response = await self.acall('GET', 'userrequests/get_elevator_direction/', {"elevator_name": "s2"})
+        self.assertEqual((status_code, response), (200, {"success": True, "direction": "stand_by"}))
+
+    async def test_saves(self):
+        status_code, response = await self.acall('POST', 'userrequests/save_user_request/', {"elevator_name": "s2", "floor": 3})
+        self.assertEqual((status_code, response['success']), (200, True))
+        status_code, response = await self.acall('POST', 'userrequests/save_user_requests/',
+                                                 [{"elevator_name": "s2", "floor": 4}, {"elevator_name": "s2", "floor": 9}])
+        self.assertEqual(status_code, 200)
+        self.assertEqual([result['success'] for result in response['results']], [True, False])
+        self.assertEqual(await UserRequestModels.objects.filter(elevator__elevator_name='s2').acount(), 2)
+        self.assertEqual((await self.acall('GET', 'userrequests/fetch_all_requests/', {"elevator_name": "s2"}))[1]['requests'], [3, 4])
+
+    async def test_wrong_method(self):
+        self.assertEqual((await self.acall('POST', 'elevator/get_current_floor/', {"elevator_name": "s1"}))[0], 405)
+        self.assertEqual((await self.acall('GET', 'userrequests/save_user_request/', {"elevator_name": "s1", "floor": 2}))[0], 405)
+
+    async def test_stream_sends_the_latest_state_per_elevator(self):
+        response = await self.async_client.get('/api/async/stream/', {"elevators": "s1,s2"})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = response.streaming_content
+
+        def state(event):
+            self.assertTrue(event.startswith(b'event: state\ndata: '))
+            return json.loads(event.split(b'data: ', 1)[1])
+
+        self.assertEqual(await anext(content), b'retry: 1000\n\n')
+        snapshot = {event['elevator_name']: event for event in [state(await anext(content)), state(await anext(content))]}
+        self.assertEqual((snapshot['s1']['current_floor'], snapshot['s1']['destinations']), (0, [5]))
+        self.assertEqual(snapshot['s2']['current_floor'], 0)
+
+        # the client reads nothing while s1 moves three floors and s2 one
+        elevators = {elevator.elevator_name: elevator async for elevator in ElevatorsModel.objects.all()}
+        for elevator_name, floor in (('s1', 1), ('s1', 2), ('s2', 4), ('s1', 3)):
+            elevators[elevator_name].current_floor = floor
+            await sync_to_async(publish_state)(elevators[elevator_name])
+
+        sent = [state(await anext(content)), state(await anext(content))]
+        self.assertEqual(sorted((event['elevator_name'], event['current_floor']) for event in sent), [('s1', 3), ('s2', 4)])
+        subscription, = publisher.subscribers
+        self.assertEqual(subscription.pending, {})
+        self.assertFalse(subscription.ready.is_set())
+
+        # Django leaves closing the generator of the view to the garbage collector
+        await content.aclose()
+        publisher.unsubscribe(subscription)
+
+
+class AsyncHandlerTests(TransactionTestCase):
+
+    def setUp(self):
+        reset_process_state()
+
+    def tearDown(self):
+        reset_process_state()
+
+    async def test_async_api_skips_the_sync_middleware(self):
+        # the stack uvicorn runs, AsyncClient has its own handler
+        application = get_application()
+        with mock.patch('django.contrib.sessions.middleware.SessionMiddleware.process_request') as process_request:
+            status_code = await asgi_get(application, '/api/async/elevator/get_current_floor/', b'{"elevator_name": "s9"}')
+        self.assertEqual(status_code, 400)
+        process_request.assert_not_called()
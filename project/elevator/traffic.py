@@ -0,0 +1,279 @@
+import atexit
+import heapq
+import json
+import logging
+import os
+import struct
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import QueryDict
+
+from .idempotency import REQUEST_KEY_HEADER
+from .models import ElevatorsModel, ElevatorStateModels, UserRequestModels
+from .state import RUN_STATE_FIELDS
+
+try:
+    import orjson
+except ImportError:  # the log falls back to json.dumps
+    orjson = None
+
+# Append only binary log of the calls which change the elevators, to replay a
+# real day of traffic offline (manage.py replay_traffic). A logged call only
+# packs a record and appends it to a buffer in memory, a writer thread appends
+# the buffer to the file every ELEVATOR_TRAFFIC_LOG_FLUSH_SECONDS. A file
+# starts with the fleet (the elevators, their pending floors and run state) of
+# the process which opened it, so a replay rebuilds it on an empty database first.
+#
+# A record is its time (unix seconds, float64), the code of its action (its
+# index in ACTIONS, uint8), the length of its payload (uint32) and the payload,
+# the JSON of [body, elevator_name] where elevator_name is the target of the
+# detail routes (update and destroy), null for the others.
+
+MAGIC = b'ELEVLOG1'
+RECORD = struct.Struct('<dBI')
+FLEET = 'fleet'
+
+# the API of every logged action for the replay, new actions go at the end
+# since a record stores the position of its action
+ROUTES = {
+    'InitializeElevators.install_elevator': ('POST', 'install/install_elevator/'),
+    'InitializeElevators.update': ('PUT', 'install/{pk}/'),
+    'InitializeElevators.partial_update': ('PATCH', 'install/{pk}/'),
+    'InitializeElevators.destroy': ('DELETE', 'install/{pk}/'),
+    'UserRequests.save_user_request': ('POST', 'userrequests/save_user_request/'),
+    'UserRequests.save_user_requests': ('POST', 'userrequests/save_user_requests/'),
+    'UserRequests.hall_call': ('POST', 'userrequests/hall_call/'),
+    'ElevatorFunctions.next_destinations': ('POST', 'elevator/next_destinations/'),
+    'ElevatorFunctions.destination_reached': ('POST', 'elevator/destination_reached/'),
+    'ElevatorFunctions.reach_next_destination': ('POST', 'elevator/reach_next_destination/'),
+    'Maintenance.check_maintenance_status': ('GET', 'maintenance/check_maintenance_status/'),
+    'Maintenance.set_maintenance': ('PATCH', 'maintenance/set_maintenance/'),
+    'Door.open_or_close_door': ('PATCH', 'door/open_or_close_door/'),
+}
+ACTIONS = (FLEET,) + tuple(ROUTES)
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+# a full buffer logs its first dropped record and then every this many
+DROPPED_LOG_EVERY = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str, separators=(',', ':')).encode()
+
+
+def fleet_snapshot():
+    """
+    Every elevator with its pending floors and its run state (None before
+    its first planning), three queries
+    """
+    pending = {}
+    for elevator_id, floor in UserRequestModels.objects.values_list('elevator_id', 'destination_floor'):
+        pending.setdefault(elevator_id, []).append(floor)
+    states = {state[0]: dict(zip(RUN_STATE_FIELDS, state[1:]))
+              for state in ElevatorStateModels.objects.values_list('elevator_id', *RUN_STATE_FIELDS)}
+    fleet = []
+    for elevator in ElevatorsModel.objects.values('id', 'elevator_name', 'maintenance', 'current_floor', 'first_floor',
+                                                  'last_floor', 'door', 'policy', 'skipped_floors'):
+        elevator_id = elevator.pop('id')
+        elevator['pending'] = sorted(pending.get(elevator_id, ()))
+        elevator['state'] = states.get(elevator_id)
+        fleet.append(elevator)
+    return fleet
+
+
+class TrafficLog:
+    """
+    Buffered writer of one log file, append() only touches memory, the
+    buffer holds at most max_records and drops (counts and logs) the
+    records coming in while it is full
+    """
+
+    def __init__(self, path, flush_seconds, max_records, clock=time.time):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_records = max_records
+        self.clock = clock
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.flushing = threading.Lock()
+        self.stats = {'written': 0, 'dropped': 0}
+        self.fd = None
+        self.closed = threading.Event()
+        self.writer = None
+
+    def open(self, fleet):
+        """
+        Opens (or creates) the file and starts the writer thread, the fleet
+        is the first record this process appends
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # O_APPEND: the chunks of whole records several processes write never overlap
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(self.fd).st_size == 0:
+            os.write(self.fd, MAGIC)
+        self.append(FLEET, fleet)
+        self.writer = threading.Thread(target=self.run, name='elevator-traffic-log', daemon=True)
+        self.writer.start()
+
+    def append(self, action, body, elevator_name=None):
+        payload = dumps([body, elevator_name])
+        with self.lock:
+            if len(self.buffer) < self.max_records:
+                self.buffer.append(RECORD.pack(self.clock(), ACTION_CODES[action], len(payload)) + payload)
+                return
+            self.stats['dropped'] += 1
+            dropped = self.stats['dropped']
+        if dropped == 1 or dropped % DROPPED_LOG_EVERY == 0:
+            logger.warning("traffic log %s full (%s records), %s records dropped so far", self.path, self.max_records,
+                           dropped)
+
+    def flush(self):
+        with self.flushing:
+            with self.lock:
+                records, self.buffer = self.buffer, []
+            if records and self.fd is not None:
+                os.write(self.fd, b''.join(records))
+                with self.lock:
+                    self.stats['written'] += len(records)
+
+    def run(self):
+        while not self.closed.wait(self.flush_seconds):
+            self.flush()
+
+    def close(self):
+        self.closed.set()
+        self.flush()
+        if self.stats['dropped']:
+            logger.warning("traffic log %s closed, %s records written and %s dropped", self.path, self.stats['written'],
+                           self.stats['dropped'])
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def render(self):
+        """
+        The counters in the Prometheus text exposition format
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        lines = [
+            "# HELP elevator_traffic_log_records_total Calls appended to the traffic log (written) or lost to a full buffer (dropped)",
+            "# TYPE elevator_traffic_log_records_total counter",
+        ]
+        lines += [f'elevator_traffic_log_records_total{{result="{result}"}} {count}' for result, count in stats.items()]
+        return '\n'.join(lines) + '\n'
+
+
+_log = None
+_opening = threading.Lock()
+
+
+def get_traffic_log():
+    """
+    The log of this process, opened by its first logged call, None while
+    ELEVATOR_TRAFFIC_LOG is empty. A {pid} in the path gives every worker its
+    own file.
+    """
+    global _log
+    if _log is None and settings.ELEVATOR_TRAFFIC_LOG:
+        with _opening:
+            if _log is None:
+                log = TrafficLog(settings.ELEVATOR_TRAFFIC_LOG.format(pid=os.getpid()),
+                                 settings.ELEVATOR_TRAFFIC_LOG_FLUSH_SECONDS, settings.ELEVATOR_TRAFFIC_LOG_BUFFER)
+                log.open(fleet_snapshot())
+                atexit.register(log.close)
+                _log = log
+    return _log
+
+
+def reset_traffic_log():
+    global _log
+    if _log is not None:
+        _log.close()
+    _log = None
+
+
+def render_traffic_log():
+    """
+    The counters of the log of this process, nothing before it is opened
+    """
+    return _log.render() if _log is not None else ''
+
+
+def record_call(action, body, meta=None, elevator_name=None):
+    """
+    Appends a call to the traffic log, the Idempotency-Key header goes into
+    the body so the replay sends it as request_key
+    """
+    log = get_traffic_log()
+    if log is None:
+        return
+    if isinstance(body, QueryDict):
+        body = body.dict()
+    key = meta.get(REQUEST_KEY_HEADER) if meta is not None else None
+    if key and isinstance(body, dict) and 'request_key' not in body:
+        body = {**body, 'request_key': key}
+    log.append(action, body, elevator_name)
+
+
+async def arecord_call(action, body, meta=None):
+    """
+    Async version of record_call, the first call opens the log (reading the
+    fleet) off the event loop
+    """
+    if not settings.ELEVATOR_TRAFFIC_LOG:
+        return
+    if _log is None:
+        await sync_to_async(get_traffic_log)()
+    record_call(action, body, meta)
+
+
+class LoggedCall:
+    """
+    One record of a traffic log
+    """
+    __slots__ = ('at', 'action', 'body', 'elevator_name')
+
+    def __init__(self, at, action, body, elevator_name):
+        self.at = at
+        self.action = action
+        self.body = body
+        self.elevator_name = elevator_name
+
+    def __lt__(self, other):
+        return self.at < other.at
+
+
+def read_log(path):
+    """
+    The records of a log file in the order they were written, a record cut
+    short by a crash ends it
+    """
+    with open(path, 'rb') as log:
+        if log.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an elevator traffic log")
+        while True:
+            header = log.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            at, code, length = RECORD.unpack(header)
+            payload = log.read(length)
+            if len(payload) < length:
+                return
+            body, elevator_name = json.loads(payload)
+            yield LoggedCall(at, ACTIONS[code], body, elevator_name)
+
+
+def read_logs(paths):
+    """
+    The records of several logs (one per worker) merged by time
+    """
+    return heapq.merge(*(read_log(path) for path in paths))
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import *
 
 router = DefaultRouter()
@@ -8,8 +9,22 @@ router.register(r'maintenance', Maintenance, basename='maintanence')
 router.register(r'door', Door, basename='door')
 router.register(r'userrequests', UserRequests, basename='user requests')
 router.register(r'elevator', ElevatorFunctions, basename='elevator functions')
+router.register(r'fleet', Fleet, basename='fleet')
+
+# async versions of the read heavy and ingestion APIs, for the ASGI server
+async_urlpatterns = [
+    path('userrequests/fetch_all_requests/', async_views.fetch_all_requests, name='async-fetch-all-requests'),
+    path('userrequests/get_elevator_direction/', async_views.get_elevator_direction, name='async-get-elevator-direction'),
+    path('userrequests/save_user_request/', async_views.save_user_request, name='async-save-user-request'),
+    path('userrequests/save_user_requests/', async_views.save_user_requests, name='async-save-user-requests'),
+    path('elevator/get_current_floor/', async_views.get_current_floor, name='async-get-current-floor'),
+    path('maintenance/check_maintenance_status/', async_views.check_maintenance_status, name='async-check-maintenance-status'),
+    path('stream/', async_views.stream, name='async-stream'),
+]
 
 app_name='elevator'
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
+    path('metrics/', metrics, name='metrics'),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
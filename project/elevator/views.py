@@ -1,21 +1,66 @@
-from django.core.cache import cache
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 
 from .models import ElevatorsModel, UserRequestModels
-from .serializers import ElevatorSerializer, DoorChoicesSerializer, UserRequestSerialier
+from .instrumentation import InstrumentedJSONRenderer, action_name, cache, metrics as instrumentation_metrics
+from .idempotency import forget_request_keys
+from .destinations import get_destination_store
+from .events import fleet_changed, fleet_version, publish_state
+from .history import compact_requests
+from .registry import REGISTRY_VERSION_KEY, get_registry, elevators_changed
+from . import ingestion
+from .responses import cached_response, get_response_cache, invalidate_responses
+from .traffic import record_call, render_traffic_log
+from .dispatch import CALL_DIRECTIONS, STRATEGIES, build_car, choose_car
+from .scheduler import get_scheduler, get_schedulers, remove_stops, drop_scheduler
+from .state import (get_elevator, update_elevator, invalidate_elevator, elevator_values, get_run_state, get_run_states,
+                    set_run_state, invalidate_run_state, claim_elevator, elevator_cache_keys, ElevatorBusy)
+from .serializers import ElevatorSerializer, ElevatorInstallSerializer, DoorChoicesSerializer, UserRequestSerialier
 
 # Create your views here.
 
-class InitializeElevators(viewsets.ModelViewSet):
+# a state transition losing its claim on the elevator is retried this many times
+TRANSITION_ATTEMPTS = 5
+
+FLEET_FIELDS = ('current_floor', 'direction', 'door', 'maintenance', 'destinations', 'pending_requests')
+FLEET_PAGE_SIZE = 1000
+FLEET_MAX_PAGE_SIZE = 5000
+
+
+class TrafficLogged:
+    """
+    Appends the calls of the logged_actions to the traffic log (see
+    traffic.py) before they run
+    """
+    logged_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.logged_actions and settings.ELEVATOR_TRAFFIC_LOG:
+            # the ids of a replayed database differ, the detail routes are replayed by name
+            elevator_name = self.get_object().elevator_name if self.detail else None
+            record_call(f"{type(self).__name__}.{self.action}", request.data, request.META, elevator_name)
+
+
+class InitializeElevators(TrafficLogged, viewsets.ModelViewSet):
     """
     API for initializing the elevators
     """
     queryset = ElevatorsModel.objects.all()
     serializer_class = ElevatorSerializer
+    logged_actions = ('install_elevator', 'update', 'partial_update', 'destroy')
 
     # Logic for install elevator
     @action(detail=False, methods=['POST'])
@@ -29,24 +74,41 @@ class InitializeElevators(viewsets.ModelViewSet):
 
         # logic to handle for more than one elevator
         if isinstance(data, list):
-            responses = []
-            for elevator in data:
-                message, serialized_data = self.create_elevator(elevator)
-                response = {
-                    "message": message,
-                    "data": serialized_data
-                }
-                responses.append(response)
-
-            return Response(responses)
+            return Response(self.install_elevators(data))
 
         return Response({"message": "body should should be in dict or in list of dicts"})
 
     def update(self, request, *args, **kwargs):
-        return super().update(request, *args, **kwargs)
+        elevator = self.get_object()
+        elevator_name = elevator.elevator_name
+        response = super().update(request, *args, **kwargs)
+        new_name = response.data['elevator_name']
+        if new_name != elevator_name:
+            # the destinations are named after the elevator, they follow it to its new name
+            store = get_destination_store()
+            store.replace(new_name, UserRequestModels.objects.filter(elevator_id=elevator.id).values_list('destination_floor', flat=True))
+            store.clear(elevator_name)
+        invalidate_elevator(elevator_name, new_name)
+        invalidate_run_state(elevator_name, new_name)
+        invalidate_responses(elevator_name, new_name)
+        return response
+
+    def perform_update(self, serializer):
+        # an edited elevator is a new version, transitions holding the old one retry
+        serializer.save(version=F('version') + 1)
 
     def destroy(self, request, *args, **kwargs):
-        return super().destroy(request, *args, **kwargs)
+        elevator = self.get_object()
+        # the served requests go to the archive before the cascade deletes them
+        compact_requests(elevator_ids=[elevator.id])
+        response = super().destroy(request, *args, **kwargs)
+        drop_scheduler(elevator.id)
+        forget_request_keys(elevator.id)
+        get_destination_store().clear(elevator.elevator_name)
+        # every key named after a deleted elevator would stay in the cache for good
+        cache.delete_many(elevator_cache_keys(elevator.elevator_name))
+        invalidate_responses(elevator.elevator_name)
+        return response
 
     def create_elevator(self, data):
         serializer = self.get_serializer(data=data)
@@ -55,22 +117,61 @@ class InitializeElevators(viewsets.ModelViewSet):
         message = "Elevator is succesfully installed"
         return message, serializer.data
 
-
-class UserRequests(viewsets.ModelViewSet):
+    def install_elevators(self, data):
+        """
+        Installs a list of elevators with one validation pass, one uniqueness
+        query and one INSERT, invalid items are reported without aborting the rest
+        """
+        serializer = ElevatorInstallSerializer(many=True)
+        responses = [None] * len(data)
+        valid = {}
+
+        for index, elevator in enumerate(data):
+            try:
+                valid[index] = serializer.child.run_validation(elevator)
+            except ValidationError as err:
+                responses[index] = {"message": "Elevator is not installed", "errors": err.detail}
+
+        names = [elevator['elevator_name'] for elevator in valid.values()]
+        taken = set(ElevatorsModel.objects.filter(elevator_name__in=names).values_list('elevator_name', flat=True))
+
+        elevators = {}
+        for index, elevator in valid.items():
+            name = elevator['elevator_name']
+            if name in taken:
+                responses[index] = {"message": "Elevator is not installed",
+                                    "errors": {"elevator_name": [f"elevator {name} already exists"]}}
+                continue
+            taken.add(name)
+            elevators[index] = ElevatorsModel(**elevator)
+
+        with transaction.atomic():
+            ElevatorsModel.objects.bulk_create(elevators.values())
+            elevators_changed()
+
+        for index, elevator in elevators.items():
+            responses[index] = {"message": "Elevator is succesfully installed",
+                                "data": serializer.child.to_representation(elevator)}
+
+        return responses
+
+
+class UserRequests(TrafficLogged, viewsets.ModelViewSet):
     """
     API for user requests fetching requests, get and set elevator direction
     save user request.
     """
     queryset = ElevatorsModel.objects.all()
     serializer_class = ElevatorSerializer
+    logged_actions = ('save_user_request', 'save_user_requests', 'hall_call')
 
     # Logic for get all user request
     @action(detail=False, methods=['GET'])
     def fetch_all_requests(self, request, *args, **kwargs):
         data = request.data
         elevator_name = data['elevator_name']
-        user_requests = cache.get(f'destinations_{elevator_name}')
-        return Response({"success": True, "requests": user_requests})
+        return Response(cached_response('fetch_all_requests', elevator_name, lambda: {
+            "success": True, "requests": get_destination_store().members(elevator_name)}))
 
     # Logic for get elevator direction
     @action(detail=False, methods=['GET'])
@@ -78,7 +179,7 @@ class UserRequests(viewsets.ModelViewSet):
         data = request.data
         elevator_name = data['elevator_name']
 
-        direction = cache.get(f"direction_{elevator_name}")
+        direction = get_run_state(elevator_name, 'direction')
 
         if direction is None:
             direction = "stand_by"
@@ -89,44 +190,66 @@ class UserRequests(viewsets.ModelViewSet):
 
 
     def set_elevator_direction(self, direction, elevator_name, *args, **kwargs):
-        cache.set(f'direction_{elevator_name}', direction, timeout=None)
+        set_run_state(get_elevator(elevator_name), direction=direction)
 
     # Logic for save user request
     @action(detail=False, methods=['POST'])
     def save_user_request(self, request, *args, **kwargs):
-        elevator_name = request.data['elevator_name']
-        user_request = request.data['floor']
-        destinations = cache.get(f'destinations_{elevator_name}')
+        response, status_code = ingestion.save_user_request(request, request.data)
+        return Response(response, status=status_code)
 
-        elevator = self.queryset.filter(elevator_name=elevator_name).first()
-        min_floor = elevator.first_floor
-        max_floor = elevator.last_floor
+    # Logic for assigning a hall call to the best elevator of the group
+    @action(detail=False, methods=['POST'])
+    def hall_call(self, request, *args, **kwargs):
+        data = request.data
+        floor = data.get('floor')
+        call_direction = data.get('direction')
+        strategy = data.get('strategy', 'eta')
 
-        if elevator.maintenance:
-            return Response({"success": False, "err_message": f"elevator {elevator_name} is under maintenance"}, status=status.HTTP_400_BAD_REQUEST)
+        if type(floor) is not int:  # true and false aren't floors
+            return Response({"success": False, "err_message": "floor should be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if call_direction not in CALL_DIRECTIONS:
+            return Response({"success": False, "err_message": f"direction should be one of {', '.join(CALL_DIRECTIONS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if strategy not in STRATEGIES:
+            return Response({"success": False, "err_message": f"strategy should be one of {', '.join(STRATEGIES)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        elevators = self.queryset.filter(maintenance=False, first_floor__lte=floor, last_floor__gte=floor)
+        if data.get('elevators'):
+            elevators = elevators.filter(elevator_name__in=data['elevators'])
+        # express cars which skip the floor can't take the call
+        records = get_registry().get_many(elevator.elevator_name for elevator in elevators)
+        elevators = [elevator for elevator in elevators if elevator.elevator_name in records and records[elevator.elevator_name].serves(floor)]
 
-        if user_request in range(min_floor, max_floor+1):
-            if destinations is None:
-                cache.set(f'destinations_{elevator_name}', {user_request}, timeout=None)
-                UserRequestModels.objects.create(elevator_id=elevator.id, destination_floor=user_request)
+        directions = get_run_states([elevator.elevator_name for elevator in elevators], 'direction')
+        cars = [build_car(elevator, directions.get(elevator.elevator_name), scheduler)
+                for elevator, scheduler in zip(elevators, get_schedulers(elevators))]
 
-            else:
-                destinations.add(user_request)
-                cache.set(f'destinations_{elevator_name}', set(destinations), timeout=None)
-                UserRequestModels.objects.create(elevator_id=elevator.id, destination_floor=user_request)
+        car = choose_car(cars, floor, call_direction, strategy)
+        if car is None:
+            return Response({"success": False, "err_message": f"no elevator is available for floor {floor}"}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({"success": True, "data": request.data, "destinations": cache.get(f'destinations_{elevator_name}')})
+        elevator = elevators[cars.index(car)]
+        destinations, added = ingestion.add_destination(elevator, floor)
+        instrumentation_metrics.count_user_requests(action_name(request), 'written' if added else 'pending_floor')
+        return Response({"success": True, "elevator_name": elevator.elevator_name, "destinations": destinations})
 
-        raise Exception(f"user selected floor {user_request} is out of elevator floors")
+    # Logic for save many user requests in one call
+    @action(detail=False, methods=['POST'])
+    def save_user_requests(self, request, *args, **kwargs):
+        response, status_code = ingestion.save_user_requests(request, request.data)
+        return Response(response, status=status_code)
 
 
-class ElevatorFunctions(viewsets.ModelViewSet):
+class ElevatorFunctions(TrafficLogged, viewsets.ModelViewSet):
     """
     API for functioning of elevator
     """
 
     queryset = UserRequestModels.objects.all()
     serializer_class = UserRequestSerialier
+    logged_actions = ('next_destinations', 'destination_reached', 'reach_next_destination')
 
     # Logic for checking next destinations
     @action(detail=False, methods=['POST'])
@@ -135,175 +258,114 @@ class ElevatorFunctions(viewsets.ModelViewSet):
             data = request.data
             elevator_name = data['elevator_name']
 
-        direction = cache.get(f'direction_{elevator_name}')
-        elevator = ElevatorsModel.objects.filter(elevator_name=elevator_name).first()
-        elevator_id = elevator.id
-        maintenance = elevator.maintenance
-        current_floor = elevator.current_floor
-
-        next_floors, next_destination, final_destination, next_final_destination = None, None, None, None
+        return self.transition(request, elevator_name, self.plan_destinations)
 
-        if maintenance:
+    def plan_destinations(self, elevator, request, state):
+        elevator_name = elevator.elevator_name
+        if elevator.maintenance:
             return Response({"Success": True, "message": "elevator is under maintenance"})
 
-        all_destinations = self.queryset.filter(elevator_id=elevator_id).values('destination_floor')
-        destinations = set()
-        for destination in all_destinations:
-            destinations.add(destination['destination_floor'])
-
-        destinations = list(sorted(destinations)) if destinations else []
-
+        direction = state['direction']
         direction = 'stand_by' if direction is None else direction
 
-        # logic for checking no pending requests
-        if len(destinations) == 0:
-            cache.set(f'direction_{elevator_name}', 'stand_by', timeout=None)
-            cache.set(f'next_destination_{elevator_name}', None, timeout=None)
-            return Response({"success":True, "destinations": next_floors, "next_destination": next_destination,
-                             "final_destination": final_destination, "current_floor": current_floor,
-                             "moving_direction_final_destination": next_final_destination, "current_direction": direction})
-
-        max_floor = elevator.last_floor
-        min_floor = elevator.first_floor
-        if current_floor == max_floor:
-            direction = "moving down"
-        elif current_floor == min_floor:
-            direction = "moving up"
-
-        request_max_floor = destinations[-1]
-        request_min_floor = destinations[0]
-
-        destinations.append(current_floor)
-        destinations = list(sorted(set(destinations)))
-
-        # Logic for if elevator is in stand_by
-        if direction == "stand_by":
-            direction = 'moving up' if (abs(current_floor - request_max_floor)) < (abs(current_floor - request_min_floor)) else 'moving down'
-            cache.set(f'direction_{elevator_name}', direction, timeout=None)
-
-        current_floor_index = destinations.index(current_floor)
-
-        # Logic for elevator is moving down
-        if direction == 'moving down':
-            next_floors, next_destination, final_destination, next_final_destination, direction = self.moving_down(current_floor, max_floor, min_floor,
-                                                                                                                    destinations, current_floor_index,
-                                                                                                                    elevator_id, direction, elevator_name)
-
-            return Response({"success":True, "destinations": next_floors, "next_destination": next_destination,
-                             "final_destination": final_destination, "current_floor": current_floor,
-                             "moving_direction_final_destination": next_final_destination, "current_direction": direction})
-
-
-        # Logic for elevator is moving up
-        if direction == 'moving up':
-            next_floors, next_destination, final_destination, next_final_destination, direction = self.moving_up(current_floor, max_floor, min_floor,
-                                                                                                                    destinations, current_floor_index,
-                                                                                                                    elevator_id, direction, elevator_name)
-            return Response({"success":True, "destinations": next_floors, "next_destination": next_destination,
-                             "final_destination": final_destination, "current_floor": current_floor,
-                             "moving_direction_final_destination": next_final_destination, "current_direction": direction})
-
-        return Response({"success": True, "destinations": next_floors, "next_destination": next_destination,
-                         "final_destination": final_destination, "current_floor": current_floor,
-                         "moving_direction_final_destination": next_final_destination, "current_direction": direction})
-
-    def moving_up(self, current_floor, max_floor, min_floor, destinations, current_floor_index, elevator_id, direction, elevator_name):
-        next_floors = []
-        next_destination, final_destination, next_final_destination = None, None, None
-
-        if current_floor != max_floor:
-            next_floors = destinations[current_floor_index + 1:]
-            next_final_destination = max_floor
-            final_destination = min_floor if current_floor > min_floor else max_floor
-
-            next_destination = next_floors[0] if len(next_floors) else None
-
-            if len(destinations[:current_floor_index]):
-                next_floors += destinations[:current_floor_index]
-
-        elif current_floor == max_floor:  # if elevator is already in top floor
-            if len(destinations) == 1:
-                direction = 'stand_by'
-            else:
-                direction = 'moving down'
-                next_floors += destinations[::-1]
-                next_final_destination = None
-                final_destination = min_floor
-
-                next_floors.remove(current_floor)
-                next_destination = next_floors[0] if len(next_floors) else None
-
-
-        destinations.remove(current_floor)
-        cache.set(f'next_destination_{elevator_name}', next_destination, timeout=None)
-        cache.set(f'direction_{elevator_name}', direction, timeout=None)
-        cache.set(f'destinations_{elevator_name}', set(destinations), timeout=None)
-        cache.set(f'next_destinations_{elevator_name}', destinations, timeout=None)
-
-        return next_floors, next_destination, final_destination, next_final_destination, direction
-
-    def moving_down(self, current_floor, max_floor, min_floor, destinations, current_floor_index, elevator_id, direction, elevator_name):
-        next_floors = []
-        next_destination, final_destination, next_final_destination = None, None, None
-
-        if current_floor != min_floor:
-            next_floors += destinations[:current_floor_index][::-1]
-
-            next_final_destination = min_floor
-            final_destination = min_floor if current_floor > max_floor else max_floor
-
-            next_destination = next_floors[0] if len(next_floors) else None
-
-            if len(destinations[current_floor_index + 1:]):
-                next_floors += destinations[current_floor_index + 1:]
-
-        elif current_floor == min_floor:  # if elevator is already in down floor
-            if len(destinations) == 1:
-                direction = 'stand_by'
-            else:
-                direction = 'moving up'
-                next_floors += destinations
-                next_final_destination = None
-                final_destination = max_floor
-
-                next_floors.remove(current_floor)
-                next_destination = next_floors[0] if len(next_floors) else None
-
-        destinations.remove(current_floor)
-
-        cache.set(f'direction_{elevator_name}', direction, timeout=None)
-        cache.set(f'next_destination_{elevator_name}', next_destination, timeout=None)
-        cache.set(f'destinations_{elevator_name}', set(destinations), timeout=None)
-        cache.set(f'next_destinations_{elevator_name}', destinations, timeout=None)
-
-        return next_floors, next_destination, final_destination, next_final_destination, direction
+        scheduler = get_scheduler(elevator)
+        plan = scheduler.plan(elevator.current_floor, direction, elevator.first_floor, elevator.last_floor, elevator.policy)
 
+        # logic for checking no pending requests
+        if plan.destinations is None:
+            set_run_state(elevator, direction='stand_by', next_destination=None)
+        else:
+            # reach_next_destination follows the route in the order of the policy
+            set_run_state(elevator, direction=plan.current_direction, next_destination=plan.next_destination,
+                          next_destinations=plan.destinations)
+        # a stop at the current floor is served on the spot, like an arrival
+        # there. Every other floor of the store is kept in step by add and
+        # remove (replacing it with the plan would drop a floor pressed since
+        # the plan was read)
+        if elevator.current_floor in scheduler:
+            self.arrive(elevator, elevator.current_floor, [elevator.current_floor], request)
+        transaction.on_commit(lambda: publish_state(elevator))
+
+        return Response({"success": True, "destinations": plan.destinations, "next_destination": plan.next_destination,
+                         "final_destination": plan.final_destination, "current_floor": elevator.current_floor,
+                         "moving_direction_final_destination": plan.moving_direction_final_destination,
+                         "current_direction": plan.current_direction})
+
+    def transition(self, request, elevator_name, step):
+        """
+        Runs step(elevator, request, state) in one transaction holding the
+        claim on the elevator (state is its run state, read by the claim), so
+        the state transitions of one elevator never interleave. Losing the
+        claim to a concurrent request retries with the elevator it left
+        """
+        for _ in range(TRANSITION_ATTEMPTS):
+            elevator = get_elevator(elevator_name, request)
+            if elevator is None:
+                return Response({"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                with transaction.atomic():
+                    state = claim_elevator(elevator, request)
+                    return step(elevator, request, state)
+            except ElevatorBusy:
+                invalidate_elevator(elevator_name, request=request)
+
+        return Response({"success": False, "err_message": f"elevator {elevator_name} is busy, try again"}, status=status.HTTP_409_CONFLICT)
 
     @action(detail=False, methods=['POST'])
     def destination_reached(self, request, *args, **kwargs):
         data = request.data
         elevator_name = data['elevator_name']
         current_floor = data['current_floor']
-        destinations = cache.get(f'destinations_{elevator_name}')
 
-        elevator = ElevatorsModel.objects.filter(elevator_name=elevator_name).first()
-        if elevator is None:
-            return Response({"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status=status.HTTP_400_BAD_REQUEST)
+        if type(current_floor) is not int:
+            if get_elevator(elevator_name, request) is None:
+                return Response({"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"success": False, "err_message": "No such destinations in user request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return self.transition(request, elevator_name, lambda elevator, request, state: self.reach_floor(elevator, current_floor, request, state))
+
+    def reach_floor(self, elevator, current_floor, request, state):
+        elevator_name = elevator.elevator_name
+        store = get_destination_store()
 
-        if destinations is None or current_floor not in destinations:
+        # removing the floor from the destinations is also the check, so two
+        # arrivals at the same floor can never both succeed
+        if not store.remove(elevator_name, current_floor):
             return Response({"success": False, "err_message": "No such destinations in user request"}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.queryset.filter(elevator_id=elevator.id, destination_floor=current_floor).delete()
-        ElevatorsModel.objects.update(elevator_name=elevator_name, current_floor=current_floor)
-        destinations.remove(current_floor)
+        try:
+            self.arrive(elevator, current_floor, [current_floor], request)
+        except Exception:
+            store.add(elevator_name, current_floor)
+            raise
 
-        next_destination = cache.get(f'next_destination_{elevator_name}')
+        next_destination = state['next_destination']
 
         cache.set(f'current_floor_{elevator_name}', next_destination, timeout=None)
-        cache.set(f'destinations_{elevator_name}', set(destinations), timeout=None)
+        transaction.on_commit(lambda: publish_state(elevator))
 
         return Response({"success": True, "next_destination": next_destination, "current_floor": current_floor})
 
+    def arrive(self, elevator, current_floor, served_floors, request=None):
+        """
+        Moves the elevator to current_floor and marks its served requests (see
+        history.py), both change in one transaction and only this elevator's
+        row is written (not at all when it stands at current_floor already). The served floors leave the destinations first, so a
+        press of one of them from then on is a new request.
+        """
+        store = get_destination_store()
+        removed = [floor for floor in served_floors if store.remove(elevator.elevator_name, floor)]
+        try:
+            with transaction.atomic(savepoint=False):
+                self.queryset.filter(elevator_id=elevator.id, destination_floor__in=served_floors).update(served_at=timezone.now())
+                if current_floor != elevator.current_floor:
+                    update_elevator(elevator, request, claimed=True, current_floor=current_floor)
+        except Exception:
+            store.add_many(elevator.elevator_name, removed)
+            raise
+
+        remove_stops(elevator, served_floors)
 
     # Logic for reach next destination
     @action(detail=False, methods=['POST'])
@@ -312,29 +374,27 @@ class ElevatorFunctions(viewsets.ModelViewSet):
         elevator_name = data['elevator_name']
         # self.next_destinations(elevator_name=elevator_name)
 
-        current_floor = ElevatorsModel.objects.filter(elevator_name=elevator_name).first().current_floor
-        next_destinations = cache.get(f'next_destinations_{elevator_name}')
-        next_destination = cache.get(f'next_destination_{elevator_name}')
+        return self.transition(request, elevator_name, self.move_to_next_destination)
 
-        elevator = ElevatorsModel.objects.filter(elevator_name=elevator_name).first()
-        if elevator is None:
-            return Response({"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status=status.HTTP_400_BAD_REQUEST)
+    def move_to_next_destination(self, elevator, request, state):
+        current_floor = elevator.current_floor
+        next_destinations = state['next_destinations'] or []
+        next_destination = state['next_destination']
 
         if next_destination is not None:
-            self.queryset.filter(elevator_id=elevator.id, destination_floor=current_floor).delete()
-
+            self.arrive(elevator, next_destination, [current_floor, next_destination], request)
             current_floor = next_destination
-            self.queryset.filter(elevator_id=elevator.id, destination_floor=current_floor).delete()
-            ElevatorsModel.objects.filter(elevator_name=elevator_name).update(current_floor=current_floor)
 
-            next_destinations.remove(current_floor)
+            if current_floor in next_destinations:
+                next_destinations.remove(current_floor)
             next_destination = next_destinations[0] if next_destinations else None
-            cache.set(f"next_destination_{elevator_name}", next_destination, timeout=None)
-            cache.set(f"next_destinations_{elevator_name}", next_destinations, timeout=None)
+            set_run_state(elevator, next_destination=next_destination, next_destinations=next_destinations)
+            transaction.on_commit(lambda: publish_state(elevator))
 
             return Response({"success": True, "message": "destination reached successfully", "next_destination": next_destination})
 
-        cache.set(f"direction_{elevator_name}", "stand_by", timeout=None)
+        set_run_state(elevator, direction="stand_by")
+        transaction.on_commit(lambda: publish_state(elevator))
         return Response({"success": False, "err_message": "no more pending requests"})
 
 
@@ -342,38 +402,47 @@ class ElevatorFunctions(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'])
     def get_current_floor(self, request, *args, **kwargs):
         elevator_name = request.data['elevator_name']
-        elevator = ElevatorsModel.objects.filter(elevator_name=elevator_name).first()
+        payload = cached_response('get_current_floor', elevator_name, lambda: self.current_floor(elevator_name, request))
+        return Response(payload, status=status.HTTP_200_OK if payload["success"] else status.HTTP_400_BAD_REQUEST)
+
+    def current_floor(self, elevator_name, request=None):
+        elevator = get_elevator(elevator_name, request)
 
         if elevator is None:
-            return Response({"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status=status.HTTP_400_BAD_REQUEST)
+            return {"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}
 
         current_floor = elevator.current_floor
-        return Response({"success": True, "current_floor": current_floor})
+        return {"success": True, "current_floor": current_floor}
 
 
-class Maintenance(viewsets.ModelViewSet):
+class Maintenance(TrafficLogged, viewsets.ModelViewSet):
     """
     API for setting the elevator under maintenance
     """
     queryset = ElevatorsModel.objects.all()
     serializer_class = ElevatorSerializer
+    logged_actions = ('check_maintenance_status', 'set_maintenance')
 
     # to check the status of the elevator under maintenance or not
     @action(detail=False, methods=['GET'])
     def check_maintenance_status(self, request, *args, **kwargs):
         elevator_name = request.data.get('elevator_name')
+        payload = cached_response('check_maintenance_status', elevator_name, lambda: self.maintenance_status(elevator_name, request))
+        return Response(payload, status=status.HTTP_200_OK if payload["success"] else status.HTTP_400_BAD_REQUEST)
 
-        elevator_maintenance_status = self.queryset.filter(elevator_name=elevator_name).first()
+    def maintenance_status(self, elevator_name, request=None):
+        elevator_maintenance_status = get_elevator(elevator_name, request)
 
         if elevator_maintenance_status is None:
-            raise Exception(f"Elevator with the {elevator_name} dosen't exists")
+            return {"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}
 
         if elevator_maintenance_status.maintenance is False:
-            status = "Elevator is working"
+            message = "Elevator is working"
         else:
-            cache.set(f'direction_{elevator_name}', 'stand_by', timeout=None)
-            status = "Elevator is under maintenance"
-        return Response({"success": True, "message":status})
+            set_run_state(elevator_maintenance_status, direction='stand_by')
+            fleet_changed()
+            message = "Elevator is under maintenance"
+        return {"success": True, "message": message}
 
 
     # Set the state of the elevator to be working or maintenance
@@ -382,21 +451,24 @@ class Maintenance(viewsets.ModelViewSet):
         data = request.data
         elevator_name = data['elevator_name']
         maintenance = data["maintenance"]
-        elevator = self.queryset.filter(elevator_name=elevator_name).first()
+        elevator = get_elevator(elevator_name, request)
 
         if elevator is None:
             return Response({"success": False, "err_message": f"elevator {elevator_name} doesn't exists"}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.queryset.filter(elevator_name=elevator_name).update(maintenance=maintenance)
-        return Response({"success": True, "data": self.queryset.filter(elevator_name=elevator_name).values()})
+        update_elevator(elevator, request, maintenance=maintenance)
+        elevators_changed()
+        publish_state(elevator)
+        return Response({"success": True, "data": [elevator_values(elevator)]})
 
 
-class Door(viewsets.ModelViewSet):
+class Door(TrafficLogged, viewsets.ModelViewSet):
     """
     API for elevator door close/open door
     """
     queryset = ElevatorsModel.objects.all()
     serializer_class = DoorChoicesSerializer
+    logged_actions = ('open_or_close_door',)
 
     # Logic for open or close door
     @action(detail=False, methods=['PUT', 'PATCH'])
@@ -408,11 +480,106 @@ class Door(viewsets.ModelViewSet):
         data = serializer.data
         elevator_name = data['elevator_name']
         door = data['door']
-        elevator = self.queryset.filter(elevator_name = elevator_name).first()
+        elevator = get_elevator(elevator_name, request)
 
+        updated_data = []
         if elevator is not None:
-            self.queryset.filter(elevator_name=elevator_name).update(door=door)
+            update_elevator(elevator, request, door=door)
+            publish_state(elevator)
+            updated_data.append(elevator_values(elevator))
 
-        updated_data = self.queryset.filter(elevator_name=elevator_name).values()
         return Response({"success": True, "data": updated_data})
 
+
+
+class Fleet(viewsets.GenericViewSet):
+    """
+    API for the live state of every elevator in one response, read only
+    """
+    queryset = ElevatorsModel.objects.all()
+
+    # Logic for the snapshot of the whole fleet
+    @action(detail=False, methods=['GET'])
+    def snapshot(self, request, *args, **kwargs):
+        params = request.query_params
+        fields = params.get('fields')
+        fields = FLEET_FIELDS if not fields else tuple(field for field in fields.split(',') if field)
+        unknown = sorted(set(fields) - set(FLEET_FIELDS))
+        if unknown:
+            return Response({"success": False, "err_message": f"unknown fields {', '.join(unknown)}, choose from {', '.join(FLEET_FIELDS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page = int(params.get('page', 1))
+            page_size = int(params.get('page_size', FLEET_PAGE_SIZE))
+        except ValueError:
+            return Response({"success": False, "err_message": "page and page_size should be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or not 1 <= page_size <= FLEET_MAX_PAGE_SIZE:
+            return Response({"success": False, "err_message": f"page should be at least 1 and page_size between 1 and {FLEET_MAX_PAGE_SIZE}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # the versions are read before the snapshot, a change while it is
+        # built gives the next request a new tag, an unchanged fleet is
+        # revalidated without reading or rendering it
+        etag = self.fleet_etag(fields, page, page_size)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            elevators, has_next = self.fleet_page(page, page_size)
+            response = HttpResponse(InstrumentedJSONRenderer().render({
+                "success": True,
+                "page": page,
+                "next_page": page + 1 if has_next else None,
+                "elevators": self.fleet_state(elevators, fields),
+            }), content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def fleet_etag(self, fields, page, page_size):
+        # the registry version follows the installs, edits and deletes, the
+        # fleet version every published state
+        registry_version = get_registry().current_version(cache.get(REGISTRY_VERSION_KEY))
+        tag = f"{registry_version}:{fleet_version()}:{','.join(fields)}:{page}:{page_size}"
+        return quote_etag(hashlib.md5(tag.encode(), usedforsecurity=False).hexdigest())
+
+    def fleet_page(self, page, page_size):
+        # one extra row tells whether there is a next page without a COUNT
+        rows = list(self.queryset.order_by('id').values_list('id', 'elevator_name', 'current_floor', 'door', 'maintenance')
+                    [(page - 1) * page_size:page * page_size + 1])
+        return rows[:page_size], len(rows) > page_size
+
+    def fleet_state(self, elevators, fields):
+        names = [elevator[1] for elevator in elevators]
+        directions = get_run_states(names, 'direction') if 'direction' in fields else {}
+
+        pending = {}
+        if 'pending_requests' in fields and elevators:
+            # the page is a range of ids, so one grouped query over the range counts for every elevator of it
+            counts = (UserRequestModels.objects.filter(elevator_id__gte=elevators[0][0], elevator_id__lte=elevators[-1][0])
+                      .values_list('elevator_id').annotate(count=Count('id')).order_by())
+            pending = dict(counts)
+
+        destinations = get_destination_store().members_many(names) if 'destinations' in fields else {}
+        state = []
+        for elevator_id, elevator_name, current_floor, door, maintenance in elevators:
+            values = {"elevator_name": elevator_name}
+            for field in fields:
+                if field == 'current_floor':
+                    values[field] = current_floor
+                elif field == 'direction':
+                    values[field] = directions.get(elevator_name) or 'stand_by'
+                elif field == 'door':
+                    values[field] = door
+                elif field == 'maintenance':
+                    values[field] = maintenance
+                elif field == 'destinations':
+                    values[field] = destinations[elevator_name]
+                else:
+                    values[field] = pending.get(elevator_id, 0)
+            state.append(values)
+        return state
+
+# Logic for exposing the instrumentation of the sampled requests to Prometheus
+def metrics(request):
+    return HttpResponse(instrumentation_metrics.render() + get_response_cache().render() + render_traffic_log(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+# /api/async/ skips the sync middleware of the other APIs, see elevator/handlers.py
+from elevator.handlers import get_application  # noqa: E402
+application = get_application()
+
+# every worker starts with the elevator state rebuilt from the database, uvicorn
+# imports this module inside its event loop so the ORM runs in another thread
+from elevator.recovery import warm_up_in_thread  # noqa: E402
+warm_up_in_thread()
+
+# the elevators move by themselves, the states reach the streams of this worker
+from django.conf import settings  # noqa: E402
+if settings.ELEVATOR_TICK_SECONDS > 0:
+    from elevator.engine import start_engine  # noqa: E402
+    start_engine(settings.ELEVATOR_TICK_SECONDS)
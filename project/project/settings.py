@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from environs import Env
 import os
+import tempfile
 
 env = Env()
 env.read_env()
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'elevator.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,12 +83,57 @@ WSGI_APPLICATION = 'project.wsgi.app'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# seconds a connection is kept for the next requests of its thread, 0 opens
+# one per request
+CONN_MAX_AGE = env.int("CONN_MAX_AGE", default=60)
+
+# a Postgres server is used when POSTGRES_DB is set, SQLite otherwise
+POSTGRES_DB = env.str("POSTGRES_DB", default="")
+
+if POSTGRES_DB:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': POSTGRES_DB,
+            'USER': env.str("POSTGRES_USER", default="postgres"),
+            'PASSWORD': env.str("POSTGRES_PASSWORD", default=""),
+            'HOST': env.str("POSTGRES_HOST", default="127.0.0.1"),
+            'PORT': env.int("POSTGRES_PORT", default=5432),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer in transaction pooling mode hands every transaction
+            # to any server connection, server side cursors don't survive that
+            'DISABLE_SERVER_SIDE_CURSORS': env.bool("POSTGRES_POOLER", default=False),
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # seconds a write waits for the lock of another one instead of failing
+            'OPTIONS': {'timeout': 20},
+            # a file, the threads of the concurrency tests write at once and an
+            # in memory database locks whole tables instead of waiting
+            'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'elevator_test.sqlite3')},
+        }
+    }
+
+# run on every new SQLite connection (see elevator/database.py), an empty
+# value keeps the SQLite defaults (rollback journal, synchronous FULL)
+if env.bool("SQLITE_TUNED", default=True):
+    ELEVATOR_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        # with WAL a commit no longer syncs, a power loss can only lose the last commits
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB, 64 MiB
+        'temp_store': 'MEMORY',
+    }
+else:
+    ELEVATOR_SQLITE_PRAGMAS = {}
 
 
 # Password validation
@@ -134,12 +181,68 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "127.0.0.1:8000",
+# the local memory cache belongs to one process, run several workers with a
+# shared cache by setting REDIS_URL (redis://127.0.0.1:6379/0)
+REDIS_URL = env.str("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "127.0.0.1:8000",
+            # a handful of keys per elevator, the default of 300 keys evicts them for big fleets
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }
     }
-}
 
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
+
+# the only middleware of the async APIs (elevator/handlers.py), they must be
+# async native, any other one sends every request to the thread of the sync code
+ELEVATOR_ASYNC_MIDDLEWARE = [
+    "elevator.instrumentation.InstrumentationMiddleware",
+]
+
+# share of the requests recorded by the elevator instrumentation, 0 turns it off
+ELEVATOR_METRICS_SAMPLE_RATE = env.float("ELEVATOR_METRICS_SAMPLE_RATE", default=0.0)
+
+# seconds between two ticks of the elevator engine run by the ASGI server, 0
+# leaves moving the elevators to the clients (or to manage.py run_engine)
+ELEVATOR_TICK_SECONDS = env.float("ELEVATOR_TICK_SECONDS", default=0.0)
+
+# seconds between two compactions of the served requests by the tick engine
+# (0 turns it off), without the engine run manage.py compact_requests from cron
+ELEVATOR_COMPACTION_SECONDS = env.float("ELEVATOR_COMPACTION_SECONDS", default=300.0)
+
+# how long the response to a request key is sent again to the retries of a
+# save_user_request, and how many keys of every elevator are kept in process
+ELEVATOR_REQUEST_KEY_SECONDS = env.float("ELEVATOR_REQUEST_KEY_SECONDS", default=60.0)
+ELEVATOR_REQUEST_KEYS_PER_ELEVATOR = env.int("ELEVATOR_REQUEST_KEYS_PER_ELEVATOR", default=256)
+
+# seconds the responses of get_current_floor, check_maintenance_status and
+# fetch_all_requests are served from memory (0 turns it off), writes in this
+# process drop them straight away, and how many responses are kept
+ELEVATOR_RESPONSE_CACHE_SECONDS = env.float("ELEVATOR_RESPONSE_CACHE_SECONDS", default=1.0)
+ELEVATOR_RESPONSE_CACHE_ENTRIES = env.int("ELEVATOR_RESPONSE_CACHE_ENTRIES", default=10000)
+
+# file the calls changing the elevators are appended to for manage.py
+# replay_traffic (empty turns it off, {pid} is replaced by the process id),
+# seconds between two writes of the buffer and the records it holds at most
+ELEVATOR_TRAFFIC_LOG = env.str("ELEVATOR_TRAFFIC_LOG", default="")
+ELEVATOR_TRAFFIC_LOG_FLUSH_SECONDS = env.float("ELEVATOR_TRAFFIC_LOG_FLUSH_SECONDS", default=0.5)
+ELEVATOR_TRAFFIC_LOG_BUFFER = env.int("ELEVATOR_TRAFFIC_LOG_BUFFER", default=100000)
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'elevator.instrumentation.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
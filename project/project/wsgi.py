@@ -14,4 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 # application = get_wsgi_application()
-app = get_wsgi_application()
\ No newline at end of file
+app = get_wsgi_application()
+
+# every worker starts with the elevator state rebuilt from the database
+from elevator.recovery import warm_up  # noqa: E402
+warm_up()